@@ -0,0 +1,203 @@
+"""Watch config.json and the configuration fragments for changes.
+
+The files are watched with inotify, called through libc, so that an edit
+is noticed right away without polling. Editors and configuration tools
+often replace a file rather than write it, hence the directories holding
+the files are watched as well and the watches are renewed after each
+change. Where inotify is unavailable, the modification time and size of
+the files are compared every CONFIG_POLL_INTERVAL instead.
+
+The writes of an edit are coalesced, the change is reported once no
+other change followed for CONFIG_RELOAD_DELAY.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import os
+import struct
+from typing import TYPE_CHECKING
+
+from app.utils import (
+    CONFIG_FRAGMENTS_DIR,
+    CONFIG_JSON_PATH,
+    CONFIG_POLL_INTERVAL,
+    CONFIG_RELOAD_DELAY,
+    config_files,
+    get_logger,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from pathlib import Path
+
+_LOGGER = get_logger("config_watch")
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+DIRECTORY_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+# struct inotify_event: wd, mask, cookie, len, followed by the name
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+def is_config_path(path: Path) -> bool:
+    """Check that a path is config.json, the fragments directory or a fragment.
+
+    :param path: path reported as changed
+    :type path: Path
+    :return: True if the change may affect the configuration
+    :rtype: bool
+    """
+    return path in (CONFIG_JSON_PATH, CONFIG_FRAGMENTS_DIR) or (
+        path.parent == CONFIG_FRAGMENTS_DIR and path.suffix == ".json"
+    )
+
+
+class Inotify:
+    """Non-blocking inotify instance."""
+
+    def __init__(self) -> None:
+        """Create the instance.
+
+        :raises OSError: If inotify is not available
+        """
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watches: dict[int, Path] = {}
+
+    def watch(self, path: Path, mask: int) -> None:
+        """Watch a file or directory, or renew its watch.
+
+        A path that does not exist is skipped.
+
+        :param path: file or directory
+        :type path: Path
+        :param mask: events to report
+        :type mask: int
+        """
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd >= 0:
+            self._watches[wd] = path
+
+    def read(self) -> list[Path]:
+        """Read the pending events.
+
+        :return: paths changed, for a directory the entries changed in it
+        :rtype: list[Path]
+        """
+        try:
+            data = os.read(self.fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+        paths, offset = [], 0
+        while offset < len(data):
+            wd, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if (path := self._watches.get(wd)) is not None:
+                paths.append(path / os.fsdecode(name) if name else path)
+        return paths
+
+    def close(self) -> None:
+        """Close the instance, its watches are removed."""
+        os.close(self.fd)
+
+
+def _watch_files(inotify: Inotify) -> None:
+    """Watch the configuration files and the directories holding them.
+
+    :param inotify: inotify instance
+    :type inotify: Inotify
+    """
+    # A file bind mounted into the container only reports on itself
+    inotify.watch(CONFIG_JSON_PATH, FILE_MASK)
+    inotify.watch(CONFIG_JSON_PATH.parent, DIRECTORY_MASK)
+    inotify.watch(CONFIG_FRAGMENTS_DIR, DIRECTORY_MASK)
+
+
+def _stat_files() -> dict[Path, tuple[int, int]]:
+    """Return the modification time and size of the configuration files.
+
+    :return: nanoseconds and bytes, by path
+    :rtype: dict[Path, tuple[int, int]]
+    """
+    stats = {}
+    for path in config_files():
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stats[path] = (stat.st_mtime_ns, stat.st_size)
+    return stats
+
+
+async def _poll_config(on_change: Callable[[], None]) -> None:
+    """Report changes of the configuration files found by polling them.
+
+    :param on_change: called after the files changed
+    :type on_change: Callable[[], None]
+    """
+    last = _stat_files()
+    while True:
+        await asyncio.sleep(CONFIG_POLL_INTERVAL)
+        if (current := _stat_files()) != last:
+            last = current
+            on_change()
+
+
+async def watch_config(on_change: Callable[[], None]) -> None:
+    """Report changes of config.json and the fragments, until cancelled.
+
+    :param on_change: called once per edit of the files
+    :type on_change: Callable[[], None]
+    """
+    try:
+        inotify = Inotify()
+    except (OSError, AttributeError):
+        _LOGGER.warning(
+            "inotify unavailable, checking the configuration every %.0f s",
+            CONFIG_POLL_INTERVAL,
+        )
+        await _poll_config(on_change)
+        return
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def _on_readable() -> None:
+        if any(is_config_path(path) for path in inotify.read()):
+            changed.set()
+
+    loop.add_reader(inotify.fd, _on_readable)
+    try:
+        while True:
+            _watch_files(inotify)
+            await changed.wait()
+            # Wait for the edit to settle
+            while changed.is_set():
+                changed.clear()
+                try:
+                    await asyncio.wait_for(changed.wait(), CONFIG_RELOAD_DELAY)
+                except TimeoutError:
+                    break
+            _LOGGER.debug("Configuration files changed")
+            on_change()
+    finally:
+        loop.remove_reader(inotify.fd)
+        inotify.close()
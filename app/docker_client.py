@@ -0,0 +1,290 @@
+"""Docker Engine API helpers.
+
+This part talks HTTP/1.1 directly over the Docker unix socket,
+so that the orchestrator does not need to fork the docker CLI.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Any
+from urllib.parse import quote
+
+from app.trace import trace_command
+from app.utils import DOCKER_SOCKET, USE_SIMULATION, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from app.simulated import SimulatedDockerClient
+
+_LOGGER = get_logger("docker_client")
+
+HTTP_OK = 200
+HTTP_NOT_FOUND = 404
+
+
+async def _read_response_head(
+    reader: asyncio.StreamReader,
+) -> tuple[int, dict[str, str]]:
+    """Read the HTTP status line and headers of a response.
+
+    :param reader: stream connected to the Docker socket
+    :type reader: asyncio.StreamReader
+    :return: HTTP status code and lower-cased response headers
+    :rtype: tuple[int, dict[str, str]]
+    :raises ConnectionResetError: if the connection is closed early
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        msg = "Docker daemon closed the connection"
+        raise ConnectionResetError(msg)
+    status = int(status_line.split()[1])
+
+    headers: dict[str, str] = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def _iter_chunks(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Yield the payload of a chunked transfer-encoded response body.
+
+    :param reader: stream positioned right after the response headers
+    :type reader: asyncio.StreamReader
+    :yield: chunk payloads as they arrive
+    :raises ConnectionResetError: if the connection is closed early
+    """
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            msg = "Docker daemon closed the connection"
+            raise ConnectionResetError(msg)
+        size = int(size_line.split(b";")[0].strip(), 16)
+        if size == 0:
+            await reader.readline()  # Trailing CRLF
+            return
+        chunk = await reader.readexactly(size)
+        await reader.readline()  # CRLF after every chunk
+        yield chunk
+
+
+async def _iter_stream(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Yield a non-chunked response body until the connection closes.
+
+    :param reader: stream positioned right after the response headers
+    :type reader: asyncio.StreamReader
+    :yield: raw body data as it arrives
+    """
+    while data := await reader.read(65536):
+        yield data
+
+
+async def stream_events(
+    filters: dict[str, list[str]], since: str | None = None
+) -> AsyncIterator[dict[str, Any]]:
+    """Subscribe to the Docker events stream.
+
+    The Docker daemon keeps the connection open and pushes one JSON
+    document per event. The generator ends only when the daemon closes
+    the stream.
+
+    :param filters: Docker event filters, e.g. {"type": ["container"]}
+    :type filters: dict[str, list[str]]
+    :param since: Optional, replay events since this timestamp
+    :type since: str | None
+    :yield: decoded Docker event
+    :raises ConnectionError: if the daemon refuses the subscription
+    """
+    path = f"/events?filters={quote(json.dumps(filters))}"
+    if since:
+        path = f"{path}&since={since}"
+
+    reader, writer = await asyncio.open_unix_connection(str(DOCKER_SOCKET))
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: docker\r\n\r\n".encode())
+        await writer.drain()
+
+        status, headers = await _read_response_head(reader)
+        if status != HTTP_OK:
+            msg = f"Docker events subscription failed with HTTP {status}"
+            raise ConnectionError(msg)
+
+        chunks: AsyncIterator[bytes]
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = _iter_chunks(reader)
+        else:
+            chunks = _iter_stream(reader)
+
+        buffer = b""
+        async for chunk in chunks:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+    finally:
+        writer.close()
+
+
+@dataclass
+class Container:
+    """A running container as listed by the Docker daemon."""
+
+    id: str
+    name: str
+    pid: int = 0  # Looked up on first use
+
+
+class DockerClient:
+    """Docker Engine API client reusing a single keep-alive connection.
+
+    The running containers are listed once per reconcile pass with
+    refresh(), lookups by name are then served from that index.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the client, the connection is opened on first use."""
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+        self._containers: dict[str, Container] = {}
+
+    def close(self) -> None:
+        """Close the connection to the Docker daemon."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _request(self, path: str) -> tuple[int, Any]:
+        """Send a GET request on the current connection.
+
+        :param path: API path including the query string
+        :type path: str
+        :return: HTTP status code and decoded JSON body
+        :rtype: tuple[int, Any]
+        """
+        if self._reader is None or self._writer is None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                str(DOCKER_SOCKET)
+            )
+        self._writer.write(f"GET {path} HTTP/1.1\r\nHost: docker\r\n\r\n".encode())
+        await self._writer.drain()
+
+        status, headers = await _read_response_head(self._reader)
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b"".join([chunk async for chunk in _iter_chunks(self._reader)])
+        else:
+            body = await self._reader.readexactly(
+                int(headers.get("content-length", "0"))
+            )
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, json.loads(body) if body.strip() else None
+
+    async def get(self, path: str) -> tuple[int, Any]:
+        """Send a GET request, reconnecting once if the connection was dropped.
+
+        :param path: API path including the query string
+        :type path: str
+        :return: HTTP status code and decoded JSON body
+        :rtype: tuple[int, Any]
+        """
+        with trace_command("docker", ["GET", path]) as trace:
+            async with self._lock:
+                try:
+                    status, body = await self._request(path)
+                except (OSError, asyncio.IncompleteReadError):
+                    # The daemon closes idle keep-alive connections
+                    self.close()
+                    try:
+                        status, body = await self._request(path)
+                    except BaseException:
+                        self.close()
+                        raise
+            trace.returncode = status
+        return status, body
+
+    async def refresh(self) -> dict[str, Container]:
+        """List the running containers and index them by name.
+
+        :return: running containers by name
+        :rtype: dict[str, Container]
+        :raises ConnectionError: if the daemon fails to list the containers
+        """
+        status, body = await self.get("/containers/json")
+        if status != HTTP_OK:
+            msg = f"Listing Docker containers failed with HTTP {status}"
+            raise ConnectionError(msg)
+        self._containers = {
+            name.lstrip("/"): Container(id=entry["Id"], name=name.lstrip("/"))
+            for entry in body
+            for name in entry.get("Names", [])
+        }
+        return self._containers
+
+    def container(self, name: str) -> Container | None:
+        """Return a running container from the last listing.
+
+        :param name: container name
+        :type name: str
+        :return: the container, None if it was not running
+        :rtype: Container | None
+        """
+        return self._containers.get(name)
+
+    async def get_pid(self, name: str) -> int:
+        """Return the PID of a running container's init process.
+
+        :param name: container name
+        :type name: str
+        :return: PID of the container
+        :rtype: int
+        :raises ValueError: if the container is not running
+        """
+        if (container := self.container(name)) is None:
+            msg = f"Container {name} is not running"
+            raise ValueError(msg)
+        if not container.pid:
+            status, body = await self.get(f"/containers/{container.id}/json")
+            if status == HTTP_NOT_FOUND or not (body or {}).get("State", {}).get("Pid"):
+                msg = f"Failed to get the PID of container {name}"
+                raise ValueError(msg)
+            container.pid = body["State"]["Pid"]
+        return container.pid
+
+    async def events(
+        self, filters: dict[str, list[str]], since: str | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Subscribe to the Docker events stream, over a dedicated connection.
+
+        :param filters: Docker event filters, e.g. {"type": ["container"]}
+        :type filters: dict[str, list[str]]
+        :param since: Optional, replay events since this timestamp
+        :type since: str | None
+        :yield: decoded Docker event
+        """
+        async for event in stream_events(filters, since):
+            yield event
+
+
+@cache
+def get_docker_client() -> DockerClient | SimulatedDockerClient:
+    """Return the client shared by all callers.
+
+    :return: Docker Engine API client, simulated if USE_SIMULATION is set
+    :rtype: DockerClient | SimulatedDockerClient
+    """
+    if USE_SIMULATION:
+        # Imported here, the simulation builds on the Container of this module
+        from app.simulated import (  # noqa: PLC0415
+            SimulatedDockerClient,
+            get_simulated_network,
+        )
+
+        return SimulatedDockerClient(get_simulated_network())
+    return DockerClient()
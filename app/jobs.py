@@ -0,0 +1,167 @@
+"""Background job queue for the mutation API.
+
+Mutation requests can be handed over to a single worker instead of being
+applied while the HTTP connection is held open. The worker applies jobs
+one after another in submission order, each job still takes the locks of
+its resources and its own OVS transaction like a synchronous request would.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from functools import cache
+from typing import TYPE_CHECKING, Any
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from app.metrics import JOB_FAILURES
+from app.trace import TRACE_ORIGIN
+from app.utils import JOB_HISTORY, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+_LOGGER = get_logger("jobs")
+
+
+@dataclass
+class Job:
+    """A mutation request waiting for, or applied by, the job worker."""
+
+    operation: str
+    apply: Callable[[], Awaitable[dict]] = field(repr=False)
+    id: str = field(default_factory=lambda: uuid4().hex)
+    status: str = "queued"  # queued, running, done or failed
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    result: dict | None = None  # Response body of the synchronous endpoint
+    detail: str = ""
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the job status as reported by the API.
+
+        :return: job status
+        :rtype: dict[str, Any]
+        """
+        return {
+            "job_id": self.id,
+            "operation": self.operation,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "detail": self.detail,
+        }
+
+
+class JobQueue:
+    """FIFO work queue drained by a single background worker.
+
+    Finished jobs are kept so that clients can poll for their outcome,
+    only the last JOB_HISTORY jobs are remembered.
+    """
+
+    def __init__(self, history: int = JOB_HISTORY) -> None:
+        """Initialize an empty queue, the worker is started with start().
+
+        :param history: number of jobs to remember
+        :type history: int
+        """
+        self._history = history
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._jobs: dict[str, Job] = {}
+        self._worker: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start the background worker."""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background worker, queued jobs are not applied."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            _LOGGER.info("Job worker cancelled during shutdown.")
+        self._worker = None
+
+    def submit(self, operation: str, apply: Callable[[], Awaitable[dict]]) -> Job:
+        """Queue a mutation for the background worker.
+
+        :param operation: name of the API operation, e.g. add_bridge
+        :type operation: str
+        :param apply: applies the mutation and returns the response body
+        :type apply: Callable[[], Awaitable[dict]]
+        :return: the queued job
+        :rtype: Job
+        """
+        job = Job(operation=operation, apply=apply)
+        self._jobs[job.id] = job
+        self._forget_old_jobs()
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Return a job by ID.
+
+        :param job_id: job ID
+        :type job_id: str
+        :return: the job, None if unknown or forgotten
+        :rtype: Job | None
+        """
+        return self._jobs.get(job_id)
+
+    def _forget_old_jobs(self) -> None:
+        """Drop the oldest finished jobs beyond the history size."""
+        excess = len(self._jobs) - self._history
+        if excess <= 0:
+            return
+        for job_id in [job.id for job in self._jobs.values() if job.done.is_set()]:
+            del self._jobs[job_id]
+            excess -= 1
+            if not excess:
+                return
+
+    async def _run(self) -> None:
+        """Apply queued jobs one at a time.
+
+        Any error of a job fails that job only, the worker goes on with
+        the next one.
+        """
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started = time.time()
+            TRACE_ORIGIN.set(f"job:{job.id}")
+            try:
+                job.result = await job.apply()
+                job.status = "done"
+            except Exception as exc:
+                _LOGGER.exception("Job %s (%s) failed", job.id, job.operation)
+                job.status = "failed"
+                JOB_FAILURES.inc(operation=job.operation)
+                job.detail = (
+                    str(exc.detail) if isinstance(exc, HTTPException) else str(exc)
+                )
+            finally:
+                job.finished = time.time()
+                job.done.set()
+
+
+@cache
+def get_job_queue() -> JobQueue:
+    """Return the job queue shared by all routers.
+
+    :return: job queue
+    :rtype: JobQueue
+    """
+    return JobQueue()
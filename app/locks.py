@@ -0,0 +1,186 @@
+"""Locks serializing changes to the same bridges, containers and veth pairs.
+
+An operation holds the locks of the resources it changes exclusively and
+those of the bridges it attaches to shared, so that attaching interfaces
+of different containers to the same bridge runs in parallel, while adding
+or changing that bridge waits for them. A full reconcile pass holds all
+resources at once.
+
+Locks are always acquired in the same order, the global lock first and
+then by resource key, hence two operations can never wait for each other.
+At most MAX_CONCURRENCY operations hold their locks at the same time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import cache
+from typing import TYPE_CHECKING
+
+from app.metrics import LOCK_HELD_SECONDS, LOCK_WAIT_SECONDS
+from app.utils import MAX_CONCURRENCY
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator, Iterable
+
+# Key of the lock held shared by every operation and exclusively by full passes
+GLOBAL_KEY = ""
+
+
+class SharedLock:
+    """Lock held either by any number of sharers or by a single owner.
+
+    Waiting owners are served before new sharers, so that a stream of
+    sharers cannot starve them.
+    """
+
+    def __init__(self) -> None:
+        """Create a free lock."""
+        self.sharers = 0
+        self.owned = False
+        self._waiting_owners = 0
+        self._waiting_sharers = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, *, exclusive: bool) -> None:
+        """Wait for the lock.
+
+        :param exclusive: own the lock rather than share it
+        :type exclusive: bool
+        """
+        async with self._changed:
+            if exclusive:
+                self._waiting_owners += 1
+                try:
+                    await self._changed.wait_for(
+                        lambda: not self.owned and not self.sharers
+                    )
+                finally:
+                    self._waiting_owners -= 1
+                self.owned = True
+                return
+            self._waiting_sharers += 1
+            try:
+                await self._changed.wait_for(
+                    lambda: not self.owned and not self._waiting_owners
+                )
+            finally:
+                self._waiting_sharers -= 1
+            self.sharers += 1
+
+    async def release(self, *, exclusive: bool) -> None:
+        """Release the lock.
+
+        :param exclusive: the lock was owned rather than shared
+        :type exclusive: bool
+        """
+        async with self._changed:
+            if exclusive:
+                self.owned = False
+            else:
+                self.sharers -= 1
+            self._changed.notify_all()
+
+    def is_free(self) -> bool:
+        """Check that nobody holds or waits for the lock.
+
+        :return: True if the lock is free
+        :rtype: bool
+        """
+        return not (
+            self.owned or self.sharers or self._waiting_owners or self._waiting_sharers
+        )
+
+
+class LockManager:
+    """Locks keyed by resource, created on first use."""
+
+    def __init__(self, limit: int = MAX_CONCURRENCY) -> None:
+        """Initialize the manager.
+
+        :param limit: operations allowed to hold their locks at the same time
+        :type limit: int
+        """
+        self._locks: dict[str, SharedLock] = {}
+        self._slots = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def _hold(self, modes: dict[str, bool], name: str) -> AsyncIterator[None]:
+        """Hold locks in key order.
+
+        :param modes: whether each key is held exclusively
+        :type modes: dict[str, bool]
+        :param name: metric label of the acquisition
+        :type name: str
+        :yield: once all locks are held
+        """
+        start = time.perf_counter()
+        acquired_at: float | None = None
+        held: list[tuple[str, bool]] = []
+        try:
+            for key in sorted(modes):
+                lock = self._locks.setdefault(key, SharedLock())
+                await lock.acquire(exclusive=modes[key])
+                held.append((key, modes[key]))
+            acquired_at = time.perf_counter()
+            LOCK_WAIT_SECONDS.observe(acquired_at - start, lock=name)
+            yield
+        finally:
+            if acquired_at is not None:
+                LOCK_HELD_SECONDS.observe(time.perf_counter() - acquired_at, lock=name)
+            for key, exclusive in reversed(held):
+                await self._locks[key].release(exclusive=exclusive)
+                # Forget the locks of resources that come and go
+                if key != GLOBAL_KEY and self._locks[key].is_free():
+                    del self._locks[key]
+
+    @asynccontextmanager
+    async def hold(
+        self,
+        *,
+        bridges: Iterable[str] = (),
+        containers: Iterable[str] = (),
+        veth_pairs: Iterable[str] = (),
+        uses: Iterable[str] = (),
+    ) -> AsyncIterator[None]:
+        """Hold the locks of the resources an operation changes.
+
+        :param bridges: Optional, bridges added or changed
+        :type bridges: Iterable[str]
+        :param containers: Optional, containers whose interfaces are changed
+        :type containers: Iterable[str]
+        :param veth_pairs: Optional, veth pairs added or changed
+        :type veth_pairs: Iterable[str]
+        :param uses: Optional, bridges attached to, held shared
+        :type uses: Iterable[str]
+        :yield: once the locks are held
+        """
+        modes = {GLOBAL_KEY: False}
+        modes.update({f"bridge:{bridge}": False for bridge in uses})
+        modes.update({f"bridge:{bridge}": True for bridge in bridges})
+        modes.update({f"container:{name}": True for name in containers})
+        modes.update({f"veth:{prefix}": True for prefix in veth_pairs})
+        # Waiting for a lock does not take a slot from unrelated operations
+        async with self._hold(modes, "resources"), self._slots:
+            yield
+
+    @asynccontextmanager
+    async def hold_all(self) -> AsyncIterator[None]:
+        """Hold all resources, e.g. for a full reconcile pass.
+
+        :yield: once no other operation holds a lock
+        """
+        async with self._hold({GLOBAL_KEY: True}, "global"):
+            yield
+
+
+@cache
+def get_lock_manager() -> LockManager:
+    """Return the lock manager shared by the API and the reconcile loop.
+
+    :return: lock manager
+    :rtype: LockManager
+    """
+    return LockManager()
@@ -0,0 +1,314 @@
+"""Runtime metrics exposed in the Prometheus text format.
+
+The collectors are plain in-process counters, gauges and fixed-bucket
+histograms, recording a sample costs a dict lookup and a bisect, so they
+stay enabled in production. The text is only rendered when /metrics is
+scraped.
+"""
+
+from __future__ import annotations
+
+import inspect
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import TYPE_CHECKING, Any, TypeVar, cast
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+F = TypeVar("F", bound="Callable[..., Any]")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_METRICS: list[Counter | Histogram] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    """Format a label set, e.g. {command="ovs-vsctl"}.
+
+    :param names: label names
+    :type names: tuple[str, ...]
+    :param values: label values, in the same order
+    :type values: tuple[str, ...]
+    :return: label set, empty if there are no labels
+    :rtype: str
+    """
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values, strict=True):
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()) -> None:
+        """Create and register a counter.
+
+        :param name: metric name
+        :type name: str
+        :param doc: help text
+        :type doc: str
+        :param labels: label names
+        :type labels: tuple[str, ...]
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        _METRICS.append(self)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter.
+
+        :param amount: Optional, increment
+        :type amount: float
+        :param labels: label values
+        :type labels: str
+        """
+        key = tuple(labels[name] for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        """Yield the sample lines of the counter.
+
+        :yield: sample lines
+        """
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Gauge(Counter):
+    """A value that can go up and down, per label set."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge.
+
+        :param value: new value
+        :type value: float
+        :param labels: label values
+        :type labels: str
+        """
+        self._values[tuple(labels[name] for name in self.labels)] = value
+
+
+class Histogram:
+    """Observation counts in fixed buckets, plus their sum, per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        """Create and register a histogram.
+
+        :param name: metric name
+        :type name: str
+        :param doc: help text
+        :type doc: str
+        :param labels: label names
+        :type labels: tuple[str, ...]
+        :param buckets: Optional, sorted bucket upper bounds
+        :type buckets: tuple[float, ...]
+        """
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: count per bucket (the last one is +Inf) and sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        _METRICS.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record an observation.
+
+        :param value: observed value, e.g. seconds
+        :type value: float
+        :param labels: label values
+        :type labels: str
+        """
+        key = tuple(labels[name] for name in self.labels)
+        if (entry := self._values.get(key)) is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time spent in a block, even if it raises.
+
+        :param labels: label values
+        :type labels: str
+        :yield: once the clock is started
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        """Yield the sample lines of the histogram.
+
+        :yield: sample lines
+        """
+        names = (*self.labels, "le")
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                cumulative += count
+                labels = _format_labels(names, (*key, str(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {total[0]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+def timed(histogram: Histogram) -> Callable[[F], F]:
+    """Observe the duration of every call, labelled with the function name.
+
+    :param histogram: histogram with a single "operation" label
+    :type histogram: Histogram
+    :return: decorator for sync and async functions
+    :rtype: Callable[[F], F]
+    """
+
+    def decorator(func: F) -> F:
+        operation = func.__name__
+
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+                with histogram.time(operation=operation):
+                    return await func(*args, **kwargs)
+
+            return cast("F", async_wrapper)
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            with histogram.time(operation=operation):
+                return func(*args, **kwargs)
+
+        return cast("F", wrapper)
+
+    return decorator
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text format.
+
+    :return: exposition text
+    :rtype: str
+    """
+    lines = []
+    for metric in _METRICS:
+        lines.append(f"# HELP {metric.name} {metric.doc}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+RECONCILE_SECONDS = Histogram(
+    "raikou_reconcile_duration_seconds",
+    "Duration of reconcile passes, full sweeps, Docker event batches or "
+    "configuration changes.",
+    ("kind",),
+)
+RECONCILE_PHASE_SECONDS = Histogram(
+    "raikou_reconcile_phase_duration_seconds",
+    "Duration of the observe, plan and apply phases of a full sweep.",
+    ("phase",),
+)
+RECONCILE_OPERATIONS = Counter(
+    "raikou_reconcile_operations_total",
+    "Operations planned and applied by full sweeps and configuration changes.",
+    ("action",),
+)
+TIME_TO_READY_SECONDS = Gauge(
+    "raikou_time_to_ready_seconds",
+    "Time from start-up to the end of the first successful full sweep.",
+)
+RECONCILE_DELAY_SECONDS = Gauge(
+    "raikou_reconcile_delay_seconds",
+    "Wait before the next full sweep, unless woken up earlier.",
+)
+RECONCILE_FAILURES = Counter(
+    "raikou_reconcile_failures_total",
+    "Reconcile passes aborted by an error.",
+)
+ITEM_FAILURES = Counter(
+    "raikou_item_failures_total",
+    "Failed operations on bridges, container interfaces and veth pairs.",
+    ("kind",),
+)
+QUARANTINED_ITEMS = Gauge(
+    "raikou_quarantined_items",
+    "Items no longer retried until released through the API.",
+)
+COMMAND_SECONDS = Histogram(
+    "raikou_command_duration_seconds",
+    "Duration of external commands run by run_command.",
+    ("command",),
+)
+SUBPROCESSES = Counter(
+    "raikou_subprocesses_total",
+    "Subprocesses started by run_command.",
+    ("command",),
+)
+COMMAND_FAILURES = Counter(
+    "raikou_command_failures_total",
+    "External commands that failed or timed out.",
+    ("command",),
+)
+OVS_OPERATION_SECONDS = Histogram(
+    "raikou_ovs_operation_duration_seconds",
+    "Duration of bridge and port operations in ovs_lib.",
+    ("operation",),
+)
+LOCK_WAIT_SECONDS = Histogram(
+    "raikou_lock_wait_seconds",
+    "Time spent waiting to acquire a lock.",
+    ("lock",),
+)
+LOCK_HELD_SECONDS = Histogram(
+    "raikou_lock_held_seconds",
+    "Time a lock was held once acquired.",
+    ("lock",),
+)
+JOB_FAILURES = Counter(
+    "raikou_job_failures_total",
+    "Background jobs that failed.",
+    ("operation",),
+)
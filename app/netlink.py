@@ -0,0 +1,753 @@
+"""Netlink (rtnetlink) backend for link, address and route operations.
+
+This part speaks rtnetlink over a reused AF_NETLINK socket, so that
+creating veth pairs, setting links up and managing addresses does not
+fork an iproute2 process per operation.
+
+The calls are synchronous and run on the event loop thread, by design.
+The kernel answers a request from the same system call, in microseconds,
+and handing each one to a thread would cost more than it saves. Entering
+a container namespace only switches the calling thread, and no await
+ever happens while it is switched, so no other coroutine can observe the
+switch. A reply that does not arrive within NETLINK_TIMEOUT raises
+TimeoutError, so the loop is never held up for longer than that.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ipaddress
+import os
+import socket
+import struct
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from app.trace import trace_command
+from app.utils import NETLINK_TIMEOUT, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+_LOGGER = get_logger("netlink")
+
+# Netlink message types and flags (linux/netlink.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NLM_F_DUMP = 0x300
+
+# rtnetlink message types (linux/rtnetlink.h)
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_SETLINK = 19
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+_MESSAGE_NAMES = {
+    RTM_NEWLINK: "RTM_NEWLINK",
+    RTM_DELLINK: "RTM_DELLINK",
+    RTM_GETLINK: "RTM_GETLINK",
+    RTM_SETLINK: "RTM_SETLINK",
+    RTM_NEWADDR: "RTM_NEWADDR",
+    RTM_DELADDR: "RTM_DELADDR",
+    RTM_GETADDR: "RTM_GETADDR",
+    RTM_NEWROUTE: "RTM_NEWROUTE",
+}
+
+# Link attributes (linux/if_link.h)
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_OPERSTATE = 16
+IFLA_LINKINFO = 18
+IFLA_AF_SPEC = 26
+IFLA_NET_NS_FD = 28
+IFLA_EXT_MASK = 29
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+IFLA_BR_VLAN_FILTERING = 7
+VETH_INFO_PEER = 1
+IFLA_BRIDGE_VLAN_INFO = 2
+BRIDGE_VLAN_INFO_PVID = 0x2
+BRIDGE_VLAN_INFO_UNTAGGED = 0x4
+RTEXT_FILTER_BRVLAN = 0x2
+
+# Address and route attributes (linux/if_addr.h, linux/rtnetlink.h)
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+RTA_GATEWAY = 5
+RT_TABLE_MAIN = 254
+RTPROT_BOOT = 3
+RTN_UNICAST = 1
+
+IFF_UP = 0x1
+CLONE_NEWNET = 0x40000000
+OPERSTATES = ("unknown", "notpresent", "down", "lowerlayerdown", "testing")
+OPERSTATES += ("dormant", "up")
+
+_NLMSGHDR = struct.Struct("=LHHLL")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTMSG = struct.Struct("=BBBBBBBBI")
+_RTATTR = struct.Struct("=HH")
+_NLMSGERR = struct.Struct("=i")
+_BRIDGE_VLAN_INFO = struct.Struct("=HH")
+_RECV_SIZE = 1 << 18
+
+
+@dataclass
+class Link:
+    """A network interface as reported by the kernel."""
+
+    index: int
+    name: str
+    up: bool
+    kind: str = ""
+    master: int = 0
+    address: str = ""
+    mtu: int = 0
+    operstate: str = "unknown"
+
+
+def _setns(fd: int) -> None:
+    """Move the calling thread into the network namespace of a file descriptor.
+
+    :param fd: open network namespace file descriptor
+    :type fd: int
+    :raises OSError: if the namespace cannot be entered
+    """
+    if hasattr(os, "setns"):  # Python 3.12+
+        os.setns(fd, CLONE_NEWNET)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+
+@contextmanager
+def netns(fd: int) -> Iterator[None]:
+    """Run a block inside another network namespace.
+
+    Only the calling thread switches namespace, it is moved back when the
+    block exits. Sockets and /proc/sys/net files opened in the block stay
+    bound to the entered namespace.
+
+    :param fd: open network namespace file descriptor, e.g. of /proc/<pid>/ns/net
+    :type fd: int
+    :yield: once the namespace is entered
+    """
+    own_fd = os.open("/proc/thread-self/ns/net", os.O_RDONLY)
+    try:
+        _setns(fd)
+        try:
+            yield
+        finally:
+            _setns(own_fd)
+    finally:
+        os.close(own_fd)
+
+
+def _align(length: int) -> int:
+    """Round a length up to the 4 byte netlink alignment.
+
+    :param length: length in bytes
+    :type length: int
+    :return: aligned length
+    :rtype: int
+    """
+    return (length + 3) & ~3
+
+
+def _attr(attr_type: int, payload: bytes) -> bytes:
+    """Encode a netlink attribute.
+
+    :param attr_type: attribute type
+    :type attr_type: int
+    :param payload: attribute payload, may be nested attributes
+    :type payload: bytes
+    :return: encoded and padded attribute
+    :rtype: bytes
+    """
+    length = _RTATTR.size + len(payload)
+    return (_RTATTR.pack(length, attr_type) + payload).ljust(_align(length), b"\0")
+
+
+def _str_attr(attr_type: int, value: str) -> bytes:
+    """Encode a NUL terminated string attribute.
+
+    :param attr_type: attribute type
+    :type attr_type: int
+    :param value: attribute value
+    :type value: str
+    :return: encoded attribute
+    :rtype: bytes
+    """
+    return _attr(attr_type, value.encode() + b"\0")
+
+
+def _parse_attrs(data: bytes) -> Iterator[tuple[int, bytes]]:
+    """Decode a stream of netlink attributes.
+
+    :param data: encoded attributes
+    :type data: bytes
+    :yield: attribute type (without flags) and payload
+    """
+    offset = 0
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            return
+        yield attr_type & 0x3FFF, data[offset + _RTATTR.size : offset + length]
+        offset += _align(length)
+
+
+class NetlinkBackend:
+    """Link, address and route operations over a reused rtnetlink socket."""
+
+    def __init__(self, netns_fd: int | None = None) -> None:
+        """Initialize the backend, the socket is opened on first use.
+
+        :param netns_fd: Optional, network namespace file descriptor to
+                         operate in, default is the current namespace
+        :type netns_fd: int | None
+        """
+        self._netns_fd = netns_fd
+        self._sock: socket.socket | None = None
+        self._seq = 0
+
+    def _socket(self) -> socket.socket:
+        """Return the rtnetlink socket, opening it if needed.
+
+        A socket stays bound to the namespace it was opened in, hence the
+        namespace only has to be entered while opening it.
+
+        :return: rtnetlink socket
+        :rtype: socket.socket
+        """
+        if self._sock is None:
+            if self._netns_fd is None:
+                self._sock = socket.socket(
+                    socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+                )
+            else:
+                with netns(self._netns_fd):
+                    self._sock = socket.socket(
+                        socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+                    )
+            self._sock.bind((0, 0))
+            self._sock.settimeout(NETLINK_TIMEOUT)
+        return self._sock
+
+    def close(self) -> None:
+        """Close the rtnetlink socket."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def for_netns(self, netns_fd: int) -> NetlinkBackend:
+        """Return a backend operating in another network namespace.
+
+        :param netns_fd: open network namespace file descriptor
+        :type netns_fd: int
+        :return: new backend, to be closed by the caller
+        :rtype: NetlinkBackend
+        """
+        return NetlinkBackend(netns_fd)
+
+    @staticmethod
+    def open_netns(pid: int) -> int:
+        """Open the network namespace of a process.
+
+        :param pid: process ID, e.g. of a container's init process
+        :type pid: int
+        :return: namespace file descriptor, see close_netns()
+        :rtype: int
+        """
+        return os.open(f"/proc/{pid}/ns/net", os.O_RDONLY)
+
+    @staticmethod
+    def close_netns(netns_fd: int) -> None:
+        """Close a namespace opened with open_netns().
+
+        :param netns_fd: namespace file descriptor
+        :type netns_fd: int
+        """
+        os.close(netns_fd)
+
+    @staticmethod
+    def is_netns_of(pid: int, netns_fd: int) -> bool:
+        """Check that a process still lives in an opened network namespace.
+
+        :param pid: process ID
+        :type pid: int
+        :param netns_fd: namespace file descriptor
+        :type netns_fd: int
+        :return: False if the process went away or was replaced
+        :rtype: bool
+        """
+        try:
+            current = Path(f"/proc/{pid}/ns/net").stat()
+        except OSError:
+            return False
+        opened = os.fstat(netns_fd)
+        return (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino)
+
+    def enable_ipv6(self, name: str) -> None:
+        """Enable IPv6 on a link, container images often disable it.
+
+        :param name: interface name
+        :type name: str
+        """
+        setting = Path(f"/proc/sys/net/ipv6/conf/{name}/disable_ipv6")
+        if self._netns_fd is None:
+            setting.write_text("0")
+            return
+        # /proc/sys/net shows the namespace of the calling thread
+        with netns(self._netns_fd):
+            setting.write_text("0")
+
+    def _request(
+        self, msg_type: int, flags: int, body: bytes
+    ) -> list[tuple[int, bytes]]:
+        """Send a request and collect the replies until it is complete.
+
+        :param msg_type: rtnetlink message type
+        :type msg_type: int
+        :param flags: netlink flags besides NLM_F_REQUEST, either NLM_F_DUMP
+                      or NLM_F_ACK so that the end of the reply is known
+        :type flags: int
+        :param body: message payload
+        :type body: bytes
+        :return: type and payload of the messages received
+        :rtype: list[tuple[int, bytes]]
+        :raises OSError: if the kernel rejects the request
+        """
+        argv = [_MESSAGE_NAMES.get(msg_type, str(msg_type))]
+        argv.append("dump" if flags & NLM_F_DUMP == NLM_F_DUMP else "ack")
+        if self._netns_fd is not None:
+            argv.append("netns")
+        with trace_command("netlink", argv) as trace:
+            sock = self._socket()
+            self._seq += 1
+            sock.send(
+                _NLMSGHDR.pack(
+                    _NLMSGHDR.size + len(body),
+                    msg_type,
+                    flags | NLM_F_REQUEST,
+                    self._seq,
+                    0,
+                )
+                + body
+            )
+
+            replies: list[tuple[int, bytes]] = []
+            while True:
+                data = sock.recv(_RECV_SIZE)
+                offset = 0
+                while offset < len(data):
+                    length, reply_type, _, seq, _ = _NLMSGHDR.unpack_from(data, offset)
+                    payload = data[offset + _NLMSGHDR.size : offset + length]
+                    offset += _align(length)
+                    if seq != self._seq:
+                        continue  # Stale reply of an earlier, interrupted request
+                    if reply_type == NLMSG_DONE:
+                        trace.returncode = 0
+                        return replies
+                    if reply_type == NLMSG_ERROR:
+                        (error,) = _NLMSGERR.unpack_from(payload)
+                        trace.returncode = -error
+                        if error:
+                            raise OSError(-error, os.strerror(-error))
+                        return replies  # Acknowledgement
+                    replies.append((reply_type, payload))
+
+    @staticmethod
+    def _parse_link(payload: bytes) -> Link:
+        """Decode an RTM_NEWLINK message.
+
+        :param payload: message payload
+        :type payload: bytes
+        :return: decoded link
+        :rtype: Link
+        """
+        _, _, index, flags, _ = _IFINFOMSG.unpack_from(payload)
+        link = Link(index=index, name="", up=bool(flags & IFF_UP))
+        for attr_type, value in _parse_attrs(payload[_IFINFOMSG.size :]):
+            if attr_type == IFLA_IFNAME:
+                link.name = value.rstrip(b"\0").decode()
+            elif attr_type == IFLA_MASTER:
+                (link.master,) = struct.unpack("=I", value)
+            elif attr_type == IFLA_ADDRESS:
+                link.address = ":".join(f"{byte:02x}" for byte in value)
+            elif attr_type == IFLA_MTU:
+                (link.mtu,) = struct.unpack("=I", value)
+            elif attr_type == IFLA_OPERSTATE and value[0] < len(OPERSTATES):
+                link.operstate = OPERSTATES[value[0]]
+            elif attr_type == IFLA_LINKINFO:
+                for info_type, info in _parse_attrs(value):
+                    if info_type == IFLA_INFO_KIND:
+                        link.kind = info.rstrip(b"\0").decode()
+        return link
+
+    def links(self) -> list[Link]:
+        """Return all links in a single dump.
+
+        :return: links of the network namespace
+        :rtype: list[Link]
+        """
+        replies = self._request(
+            RTM_GETLINK, NLM_F_DUMP, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+        )
+        return [
+            self._parse_link(payload)
+            for msg_type, payload in replies
+            if msg_type == RTM_NEWLINK
+        ]
+
+    def link(self, name: str) -> Link | None:
+        """Return a link by name.
+
+        :param name: interface name
+        :type name: str
+        :return: the link, None if it does not exist
+        :rtype: Link | None
+        """
+        body = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + _str_attr(
+            IFLA_IFNAME, name
+        )
+        try:
+            replies = self._request(RTM_GETLINK, NLM_F_ACK, body)
+        except OSError:
+            return None
+        return self._parse_link(replies[0][1]) if replies else None
+
+    def _index(self, name: str) -> int:
+        """Return the interface index of a link.
+
+        :param name: interface name
+        :type name: str
+        :return: interface index
+        :rtype: int
+        :raises OSError: if the link does not exist
+        """
+        if (link := self.link(name)) is None:
+            msg = f"Cannot find device {name}"
+            raise OSError(msg)
+        return link.index
+
+    def add_veth(
+        self,
+        name: str,
+        peer: str,
+        *,
+        peer_netns: int | None = None,
+        peer_address: str | None = None,
+    ) -> None:
+        """Create a veth pair.
+
+        :param name: name of the first end
+        :type name: str
+        :param peer: name of the peer end
+        :type peer: str
+        :param peer_netns: Optional, network namespace file descriptor to
+                           create the peer end in directly
+        :type peer_netns: int | None
+        :param peer_address: Optional, MAC address of the peer end
+        :type peer_address: str | None
+        """
+        peer_info = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0) + _str_attr(
+            IFLA_IFNAME, peer
+        )
+        if peer_netns is not None:
+            peer_info += _attr(IFLA_NET_NS_FD, struct.pack("=I", peer_netns))
+        if peer_address:
+            peer_info += _attr(
+                IFLA_ADDRESS, bytes.fromhex(peer_address.replace(":", ""))
+            )
+        link_info = _str_attr(IFLA_INFO_KIND, "veth") + _attr(
+            IFLA_INFO_DATA, _attr(VETH_INFO_PEER, peer_info)
+        )
+        self._request(
+            RTM_NEWLINK,
+            NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL,
+            _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            + _str_attr(IFLA_IFNAME, name)
+            + _attr(IFLA_LINKINFO, link_info),
+        )
+
+    def add_bridge(self, name: str) -> None:
+        """Create a Linux bridge.
+
+        :param name: bridge name
+        :type name: str
+        """
+        self._request(
+            RTM_NEWLINK,
+            NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL,
+            _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            + _str_attr(IFLA_IFNAME, name)
+            + _attr(IFLA_LINKINFO, _str_attr(IFLA_INFO_KIND, "bridge")),
+        )
+
+    def delete_link(self, name: str) -> None:
+        """Delete a link, if it exists.
+
+        :param name: interface name
+        :type name: str
+        """
+        if (link := self.link(name)) is None:
+            return
+        self._request(
+            RTM_DELLINK,
+            NLM_F_ACK,
+            _IFINFOMSG.pack(socket.AF_UNSPEC, 0, link.index, 0, 0),
+        )
+
+    def set_link(
+        self,
+        name: str,
+        *,
+        up: bool | None = None,
+        master: str | None = None,
+        vlan_filtering: bool | None = None,
+    ) -> None:
+        """Change the state of a link.
+
+        :param name: interface name
+        :type name: str
+        :param up: Optional, bring the link up (True) or down (False)
+        :type up: bool | None
+        :param master: Optional, bridge to enslave the link to, empty to release it
+        :type master: str | None
+        :param vlan_filtering: Optional, toggle VLAN filtering of a Linux bridge
+        :type vlan_filtering: bool | None
+        """
+        flags = change = 0
+        if up is not None:
+            flags, change = (IFF_UP if up else 0), IFF_UP
+
+        attrs = b""
+        if master is not None:
+            master_index = self._index(master) if master else 0
+            attrs += _attr(IFLA_MASTER, struct.pack("=I", master_index))
+        if vlan_filtering is not None:
+            attrs += _attr(
+                IFLA_LINKINFO,
+                _str_attr(IFLA_INFO_KIND, "bridge")
+                + _attr(
+                    IFLA_INFO_DATA,
+                    _attr(IFLA_BR_VLAN_FILTERING, struct.pack("=B", vlan_filtering)),
+                ),
+            )
+
+        self._request(
+            RTM_NEWLINK,
+            NLM_F_ACK,
+            _IFINFOMSG.pack(socket.AF_UNSPEC, 0, self._index(name), flags, change)
+            + attrs,
+        )
+
+    def bridge_vlans(self, name: str) -> list[int]:
+        """Return the VLAN ids configured on a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :return: VLAN ids, empty if the port has no VLAN or does not exist
+        :rtype: list[int]
+        """
+        if (link := self.link(name)) is None:
+            return []
+        return self.all_bridge_vlans().get(link.index, [])
+
+    def all_bridge_vlans(self) -> dict[int, list[int]]:
+        """Return the VLAN ids of all Linux bridge ports in a single dump.
+
+        :return: VLAN ids by interface index, ports without VLAN are left out
+        :rtype: dict[int, list[int]]
+        """
+        replies = self._request(
+            RTM_GETLINK,
+            NLM_F_DUMP,
+            _IFINFOMSG.pack(socket.AF_BRIDGE, 0, 0, 0, 0)
+            + _attr(IFLA_EXT_MASK, struct.pack("=I", RTEXT_FILTER_BRVLAN)),
+        )
+        vlans: dict[int, list[int]] = {}
+        for msg_type, payload in replies:
+            if msg_type != RTM_NEWLINK:
+                continue
+            _, _, index, _, _ = _IFINFOMSG.unpack_from(payload)
+            for attr_type, value in _parse_attrs(payload[_IFINFOMSG.size :]):
+                if attr_type != IFLA_AF_SPEC:
+                    continue
+                vlans.setdefault(index, []).extend(
+                    _BRIDGE_VLAN_INFO.unpack_from(info)[1]
+                    for info_type, info in _parse_attrs(value)
+                    if info_type == IFLA_BRIDGE_VLAN_INFO
+                )
+        return {index: vids for index, vids in vlans.items() if vids}
+
+    def _bridge_vlan_request(
+        self, msg_type: int, name: str, vid: int, flags: int
+    ) -> None:
+        """Add or delete a VLAN of a Linux bridge port.
+
+        :param msg_type: RTM_SETLINK to add or RTM_DELLINK to delete
+        :type msg_type: int
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        :param flags: BRIDGE_VLAN_INFO_* flags
+        :type flags: int
+        """
+        self._request(
+            msg_type,
+            NLM_F_ACK,
+            _IFINFOMSG.pack(socket.AF_BRIDGE, 0, self._index(name), 0, 0)
+            + _attr(
+                IFLA_AF_SPEC,
+                _attr(IFLA_BRIDGE_VLAN_INFO, _BRIDGE_VLAN_INFO.pack(flags, vid)),
+            ),
+        )
+
+    def add_bridge_vlan(self, name: str, vid: int, *, pvid: bool = False) -> None:
+        """Add a VLAN to a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        :param pvid: Optional, make it the untagged native VLAN of the port
+        :type pvid: bool
+        """
+        flags = BRIDGE_VLAN_INFO_PVID | BRIDGE_VLAN_INFO_UNTAGGED if pvid else 0
+        self._bridge_vlan_request(RTM_SETLINK, name, vid, flags)
+
+    def del_bridge_vlan(self, name: str, vid: int) -> None:
+        """Remove a VLAN from a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        """
+        self._bridge_vlan_request(RTM_DELLINK, name, vid, 0)
+
+    def addresses(
+        self, name: str | None = None, family: int = socket.AF_UNSPEC
+    ) -> list[tuple[int, str]]:
+        """Return addresses in a single dump.
+
+        :param name: Optional, only return the addresses of this interface
+        :type name: str | None
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        :return: interface index and "address/prefix" pairs
+        :rtype: list[tuple[int, str]]
+        """
+        index = None
+        if name is not None:
+            if (link := self.link(name)) is None:
+                return []
+            index = link.index
+
+        result = []
+        replies = self._request(
+            RTM_GETADDR, NLM_F_DUMP, _IFADDRMSG.pack(family, 0, 0, 0, 0)
+        )
+        for msg_type, payload in replies:
+            if msg_type != RTM_NEWADDR:
+                continue
+            addr_family, prefix, _, _, addr_index = _IFADDRMSG.unpack_from(payload)
+            if index is not None and addr_index != index:
+                continue
+            attrs = dict(_parse_attrs(payload[_IFADDRMSG.size :]))
+            if (raw := attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))) is None:
+                continue
+            address = socket.inet_ntop(addr_family, raw)
+            result.append((addr_index, f"{address}/{prefix}"))
+        return result
+
+    def _address_request(
+        self, msg_type: int, flags: int, index: int, addr: str
+    ) -> None:
+        """Add or delete an address.
+
+        :param msg_type: RTM_NEWADDR or RTM_DELADDR
+        :type msg_type: int
+        :param flags: netlink flags
+        :type flags: int
+        :param index: interface index
+        :type index: int
+        :param addr: address with prefix, e.g. "10.1.1.1/24"
+        :type addr: str
+        """
+        interface = ipaddress.ip_interface(addr)
+        family = (
+            socket.AF_INET
+            if isinstance(interface, ipaddress.IPv4Interface)
+            else socket.AF_INET6
+        )
+        raw = interface.ip.packed
+        self._request(
+            msg_type,
+            flags,
+            _IFADDRMSG.pack(family, interface.network.prefixlen, 0, 0, index)
+            + _attr(IFA_LOCAL, raw)
+            + _attr(IFA_ADDRESS, raw),
+        )
+
+    def add_address(self, name: str, addr: str) -> None:
+        """Add an address to a link.
+
+        :param name: interface name
+        :type name: str
+        :param addr: address with prefix, e.g. "10.1.1.1/24"
+        :type addr: str
+        """
+        self._address_request(
+            RTM_NEWADDR,
+            NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL,
+            self._index(name),
+            addr,
+        )
+
+    def flush_addresses(self, name: str, family: int = socket.AF_UNSPEC) -> None:
+        """Remove all addresses of a link, if it exists.
+
+        :param name: interface name
+        :type name: str
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        """
+        for index, addr in self.addresses(name, family):
+            self._address_request(RTM_DELADDR, NLM_F_ACK, index, addr)
+
+    def add_default_route(self, gateway: str) -> None:
+        """Add a default route through a gateway.
+
+        :param gateway: IPv4 or IPv6 gateway address
+        :type gateway: str
+        """
+        address = ipaddress.ip_address(gateway)
+        family = (
+            socket.AF_INET
+            if isinstance(address, ipaddress.IPv4Address)
+            else socket.AF_INET6
+        )
+        self._request(
+            RTM_NEWROUTE,
+            NLM_F_ACK | NLM_F_CREATE | NLM_F_EXCL,
+            _RTMSG.pack(family, 0, 0, 0, RT_TABLE_MAIN, RTPROT_BOOT, 0, RTN_UNICAST, 0)
+            + _attr(RTA_GATEWAY, address.packed),
+        )
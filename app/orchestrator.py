@@ -7,43 +7,177 @@ Need to ensure that the dockerr.socket is mounted else the program must close.
 from __future__ import annotations
 
 import asyncio
+import copy
 import ipaddress
+import itertools
+import socket
 import sys
-import traceback
-from subprocess import CalledProcessError
-from typing import Literal, cast
-
+from dataclasses import dataclass
+from functools import cache, partial
+from typing import TYPE_CHECKING, Any, Literal, cast
+
+from app.config_watch import watch_config
+from app.docker_client import get_docker_client
+from app.locks import get_lock_manager
+from app.metrics import (
+    RECONCILE_DELAY_SECONDS,
+    RECONCILE_FAILURES,
+    RECONCILE_OPERATIONS,
+    RECONCILE_PHASE_SECONDS,
+    RECONCILE_SECONDS,
+    TIME_TO_READY_SECONDS,
+)
 from app.ovs_lib import (
+    add_container_port,
     add_iface_to_linux_bridge,
     add_iface_to_ovs_bridge,
     check_interface_exists,
     check_sys_module,
     configure_container_vlan,
     create_bridge,
+    del_container_port,
+    delete_bridge,
+    get_container_links,
     get_interface_ip,
+    get_link_backend,
+    ovs_transaction,
+    remove_iface_from_bridge,
+    run_after_commit,
+    take_snapshot,
     veth_exists,
 )
+from app.planner import (
+    ATTACH_CONTAINER_IFACE,
+    ATTACH_PARENT,
+    CONFIGURE_CONTAINER_VLAN,
+    CREATE_VETH_PAIR,
+    DETACH_CONTAINER_IFACE,
+    DETACH_PARENT,
+    INIT_BRIDGE,
+    REMOVAL_ACTIONS,
+    REMOVE_CONTAINER_IFACE,
+    REMOVE_STALE_PORT,
+    REMOVE_VETH_PAIR,
+    Operation,
+    plan,
+    plan_changes,
+    plan_dependencies,
+)
+from app.retry import backoff_delay, get_failure_tracker, item_key
+from app.scheduler import run_graph
+from app.snapshot import use_snapshot
+from app.trace import TRACE_ORIGIN
 from app.utils import (
     DOCKER_SOCKET,
-    EVENT_LOCK,
-    MAX_FAIL_COUNT,
+    FULL_SYNC_INTERVAL,
+    MAX_CONCURRENCY,
+    MIN_SYNC_INTERVAL,
     USE_LINUX_BRIDGE,
+    USE_SIMULATION,
     BridgeInfoDict,
     ContainerInfoDict,
     IfaceInfoDict,
     auto_allocate_ip,
-    check_container_exists,
     get_config,
     get_db,
+    get_db_store,
+    get_ip_allocator,
     get_logger,
     get_usb_interface,
-    run_command,
+    load_config,
+    save_config,
+    save_db,
+    update_config,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+    from app.netlink import Link
+
 _LOGGER = get_logger("orchestrator")
 
+# Numbers the reconcile passes, for the command trace
+_PASSES = itertools.count(1)
+
+# Docker container lifecycle events that trigger a targeted reconcile
+CONTAINER_EVENTS = ("start", "restart", "die", "destroy")
+# Action of the queue items that ask for a full pass, see request_reconcile()
+WAKE_ACTION = "reconcile"
+# Action of the queue items that ask for the files to be read again
+RELOAD_ACTION = "reload"
+EVENT_RETRY_DELAY = 5
+
+
+@dataclass
+class ContainerHandle:
+    """Identity and network namespace of a running container."""
+
+    id: str
+    pid: int
+    netns_fd: int  # Open /proc/<pid>/ns/net
+
+    def is_current(self) -> bool:
+        """Check that the PID still belongs to the namespace that was opened.
+
+        :return: False if the container process went away or was replaced
+        :rtype: bool
+        """
+        return get_link_backend().is_netns_of(self.pid, self.netns_fd)
+
+
+# Container handles by name, kept across reconcile passes
+_CONTAINER_HANDLES: dict[str, ContainerHandle] = {}
+
 
-def _add_iface_to_bridge(bridge_name: str, parent_info: IfaceInfoDict) -> None:
+def invalidate_container(container_name: str) -> None:
+    """Drop the cached handle of a container.
+
+    The namespace file descriptor is closed, otherwise it would keep the
+    network namespace of a stopped container, and its veth ends, alive.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    """
+    if (handle := _CONTAINER_HANDLES.pop(container_name, None)) is not None:
+        get_link_backend().close_netns(handle.netns_fd)
+        _LOGGER.debug("Dropped cached handle of container %s", container_name)
+
+
+async def get_container_handle(container_name: str) -> ContainerHandle | None:
+    """Return the cached handle of a running container, resolving it if needed.
+
+    The handle is resolved again if the container was re-created under
+    the same name or if its PID no longer matches the opened namespace.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :return: the container handle, None if the container is not running
+    :rtype: ContainerHandle | None
+    """
+    docker = get_docker_client()
+    if (container := docker.container(container_name)) is None:
+        _LOGGER.debug("Container %s does not exist!", container_name)
+        invalidate_container(container_name)
+        return None
+
+    handle = _CONTAINER_HANDLES.get(container_name)
+    if handle is not None and (handle.id != container.id or not handle.is_current()):
+        invalidate_container(container_name)
+        handle = None
+
+    if handle is None:
+        pid = await docker.get_pid(container_name)
+        handle = ContainerHandle(
+            id=container.id,
+            pid=pid,
+            netns_fd=get_link_backend().open_netns(pid),
+        )
+        _CONTAINER_HANDLES[container_name] = handle
+    return handle
+
+
+async def _add_iface_to_bridge(bridge_name: str, parent_info: IfaceInfoDict) -> None:
     """Add a network interface to an OVS bridge.
 
     :param bridge_name: The name of the OVS bridge.
@@ -56,37 +190,32 @@ def _add_iface_to_bridge(bridge_name: str, parent_info: IfaceInfoDict) -> None:
         return
 
     if "usb:" in parent:
-        parent_info["iface"] = get_usb_interface(parent.split(":")[-1])
+        parent = parent_info["iface"] = get_usb_interface(parent.split(":")[-1])
 
     _LOGGER.debug("Trying to bring up parent %s for bridge %s", parent, bridge_name)
-    run_command(f"ip link set {parent} up")
+    get_link_backend().set_link(parent, up=True)
 
     if USE_LINUX_BRIDGE:
-        add_iface_to_linux_bridge(bridge_name, parent_info)
+        await add_iface_to_linux_bridge(bridge_name, parent_info)
     else:
-        add_iface_to_ovs_bridge(bridge_name, parent_info)
-
+        await add_iface_to_ovs_bridge(bridge_name, parent_info)
 
-def init_bridge(bridge_name: str, info: BridgeInfoDict) -> None:
-    """Create an OVS/Linux bridge if it does not exist.
 
-    If a parent interface is provided as part of the OVS bridge info,
-    then it shall be a member of the bridge.
+async def _configure_bridge_ip(bridge_name: str, info: BridgeInfoDict) -> None:
+    """Assign the configured IPv4/IPv6 addresses to a bridge.
 
-    The trunk and native VLAN details are associated to the parent port in OVS.
+    The addresses are reserved right away, so that containers attached in
+    the same pass allocate around them. They are set on the bridge device,
+    which only shows up once a new OVS bridge is committed, after commit.
 
-    :param bridge_name: OVS bridge name
+    :param bridge_name: OVS/Linux bridge name
     :type bridge_name: str
     :param info: OVS/Linux bridge details
     :type info: BridgeInfoDict
     :raises ValueError: If IP address is already allocated/incorrect.
     """
-    _LOGGER.debug("################## OVS BRIDGES #####################")
     db_cache = get_db(bridge_name)
 
-    # Create the Linux/OVS bridge
-    create_bridge(bridge_name)
-
     # Update bridge specific IP address range and Host details
     for range_key, ip_addr in (
         ("iprange", info.get("ipaddress")),
@@ -100,25 +229,26 @@ def init_bridge(bridge_name: str, info: BridgeInfoDict) -> None:
             db_cache[range_key] = ip_range
             db_cache[f"{range_key}_hosts"] = {}
 
-        hosts = db_cache.setdefault(f"{range_key}_hosts", {})
-        family = "-4" if range_key == "iprange" else "-6"
+        allocator = get_ip_allocator(bridge_name, range_key.removesuffix("range"))
+        family = socket.AF_INET if range_key == "iprange" else socket.AF_INET6
 
         if not ip_addr:
             # If ip_addr is not requested, simply flush and continue
             _LOGGER.debug("Flusing IP address for %s", bridge_name)
 
-            hosts.pop(bridge_name, None)
-            run_command(f"ip {family} addr flush dev {bridge_name}", check=False)
+            allocator.release(bridge_name)
+            await run_after_commit(
+                partial(_set_bridge_address, bridge_name, family, None, flush=True)
+            )
             continue
 
         set_ip, cache_changed = False, False
 
-        if ip_addr != hosts.get(bridge_name):
+        if ip_addr != allocator.hosts.get(bridge_name):
             # If ipaddress has changed, update the the cache.
             # Will check if the new IP is not in conflict with any other host
             # before assigning to the bridge.
-            hosts.pop(bridge_name, None)
-            run_command(f"ip {family} addr flush dev {bridge_name}", check=False)
+            allocator.release(bridge_name)
             set_ip, cache_changed = True, True
 
         elif ip_addr not in get_interface_ip(bridge_name):
@@ -127,7 +257,7 @@ def init_bridge(bridge_name: str, info: BridgeInfoDict) -> None:
             set_ip = True
 
         if set_ip:
-            if cache_changed and ip_addr in hosts.values():
+            if cache_changed and allocator.is_allocated(ip_addr):
                 msg_set_ip_err = (
                     f"IP {ip_addr} already allocated to someone else. ",
                     f"Cannot assign request address to bridge {bridge_name}",
@@ -142,16 +272,66 @@ def init_bridge(bridge_name: str, info: BridgeInfoDict) -> None:
                 msg = f"{ip_addr} does not fall under the range {ip_range}"
                 raise ValueError(msg)
 
-            hosts[bridge_name] = ip_addr
-            run_command(f"ip addr add {ip_addr} dev {bridge_name}")
-            _LOGGER.info("Updated IP address for %s to %s", bridge_name, ip_addr)
+            allocator.reserve(bridge_name, ip_addr)
+            await run_after_commit(
+                partial(
+                    _set_bridge_address,
+                    bridge_name,
+                    family,
+                    ip_addr,
+                    flush=cache_changed,
+                )
+            )
+
+
+async def _set_bridge_address(
+    bridge_name: str, family: int, ip_addr: str | None, *, flush: bool
+) -> None:
+    """Set the address of a bridge device.
+
+    :param bridge_name: OVS/Linux bridge name
+    :type bridge_name: str
+    :param family: AF_INET or AF_INET6
+    :type family: int
+    :param ip_addr: address with prefix to add, None to only flush
+    :type ip_addr: str | None
+    :param flush: remove the addresses of the family first
+    :type flush: bool
+    """
+    links = get_link_backend()
+    if flush:
+        links.flush_addresses(bridge_name, family)
+    if ip_addr:
+        links.add_address(bridge_name, ip_addr)
+        _LOGGER.info("Updated IP address for %s to %s", bridge_name, ip_addr)
+
+
+async def init_bridge(bridge_name: str, info: BridgeInfoDict) -> None:
+    """Create an OVS/Linux bridge if it does not exist.
+
+    If a parent interface is provided as part of the OVS bridge info,
+    then it shall be a member of the bridge.
+
+    The trunk and native VLAN details are associated to the parent port in OVS.
+
+    :param bridge_name: OVS bridge name
+    :type bridge_name: str
+    :param info: OVS/Linux bridge details
+    :type info: BridgeInfoDict
+    :raises ValueError: If IP address is already allocated/incorrect.
+    """
+    _LOGGER.debug("################## OVS BRIDGES #####################")
+
+    # Create the Linux/OVS bridge
+    await create_bridge(bridge_name)
+    await _configure_bridge_ip(bridge_name, info)
 
     # Add parent interfaces
     for parent_info in info.get("parents", []):
-        _add_iface_to_bridge(bridge_name=bridge_name, parent_info=parent_info)
+        await _add_iface_to_bridge(bridge_name=bridge_name, parent_info=parent_info)
 
 
-def create_veth_pair(
+async def create_veth_pair(
     on_bridge: str, prefix: str, vlan_map: str = ":", trunk: Literal["yes", "no"] = "no"
 ) -> None:
     """Create a veth pair and attach it to OVS bridges.
@@ -192,9 +372,10 @@ def create_veth_pair(
     # We will always check the C-VLAN veth endpoint.
     if not veth_exists(veth0):
         # Create veth pair
-        run_command(f"ip link add {veth0} type veth peer name {veth1}")
-        run_command(f"ip link set dev {veth0} up")
-        run_command(f"ip link set dev {veth1} up")
+        links = get_link_backend()
+        links.add_veth(veth0, veth1)
+        links.set_link(veth0, up=True)
+        links.set_link(veth1, up=True)
 
         _LOGGER.info("VETH pair created: %s <--> %s", veth0, veth1)
     else:
@@ -217,26 +398,45 @@ def create_veth_pair(
     # Always attach the first veth (veth0) to the bridge
     _LOGGER.debug("Attaching %s to bridge %s", veth0, on_bridge)
     if trunk == "yes":
-        add_function(on_bridge, {"iface": veth0, "trunk": source_vlan})
+        await add_function(on_bridge, {"iface": veth0, "trunk": source_vlan})
     else:
-        add_function(on_bridge, {"iface": veth0, "vlan": source_vlan})
+        await add_function(on_bridge, {"iface": veth0, "vlan": source_vlan})
     log_method("VETH %s attached to bridge %s", veth0, on_bridge)
 
     if dest_vlan:
         _LOGGER.debug("Attaching %s to bridge %s", veth1, on_bridge)
         if trunk == "yes":
-            add_function(on_bridge, {"iface": veth1, "trunk": dest_vlan})
+            await add_function(on_bridge, {"iface": veth1, "trunk": dest_vlan})
         else:
-            add_function(on_bridge, {"iface": veth1, "vlan": dest_vlan})
+            await add_function(on_bridge, {"iface": veth1, "vlan": dest_vlan})
         log_method("VETH %s attached to bridge %s", veth1, on_bridge)
     else:
         _LOGGER.debug("No VLAN configuration for veth1: %s", veth1)
         log_method("VETH %s is dangling!", veth1)
 
 
-def add_iface_to_container(  # noqa: C901
+async def remove_veth_pair(on_bridge: str, prefix: str) -> None:
+    """Detach a veth pair from its bridge and delete it.
+
+    :param on_bridge: bridge the veth pair is attached to
+    :type on_bridge: str
+    :param prefix: prefix name of the veth interfaces
+    :type prefix: str
+    """
+    veth0 = f"v0_{prefix}"
+    for veth in (veth0, f"v1_{prefix}"):
+        await remove_iface_from_bridge(on_bridge, veth)
+        get_db(on_bridge).pop(veth, None)
+    # Deleting one end deletes its peer as well
+    if veth_exists(veth0):
+        get_link_backend().delete_link(veth0)
+    _LOGGER.info("VETH pair %s removed from bridge %s", prefix, on_bridge)
+
+
+async def add_iface_to_container(  # noqa: C901
     container_name: str,
     info: ContainerInfoDict,
+    links: dict[str, Link] | None = None,
 ) -> None:
     """Attach a container to a target OVS bridge.
 
@@ -244,21 +444,28 @@ def add_iface_to_container(  # noqa: C901
     :type container_name: str
     :param info: Container interface details
     :type info: ContainerInfoDict
+    :param links: Optional, interfaces of the container if already read
+    :type links: dict[str, Link] | None
     :raises ValueError: If ipaddress syntax is incorrect.
     """
     _LOGGER.debug("###################ADD IFACE TO CONTAINERS######################")
 
-    util = "ovs-docker" if not USE_LINUX_BRIDGE else "lxbr-docker"
     bridge = info["bridge"]  # Mandatory
     iface = info["iface"]  # Mandatory
     db_cache = get_db(bridge)
     cc_cache = db_cache.setdefault(container_name, {})
-    cmd = f"{util} add-port {bridge} {iface} {container_name}"
-    cc_cache.setdefault(iface, {})
+    port_info: ContainerInfoDict = {"bridge": bridge, "iface": iface}
+    iface_cache = cc_cache.setdefault(iface, {})
 
     # Check if container exists, skip if it does not exist.
-    if (not check_container_exists(container_name)) or check_interface_exists(
-        bridge, container_name, iface, util
+    if (
+        handle := await get_container_handle(container_name)
+    ) is None or await check_interface_exists(
+        bridge,
+        container_name,
+        iface,
+        handle.netns_fd,
+        get_container_links(handle.netns_fd) if links is None else links,
     ):
         # If interface already exists, we exit
         # Note: Need to add checks for IP address too before exiting.
@@ -267,14 +474,14 @@ def add_iface_to_container(  # noqa: C901
     for prefix in ("ip", "ip6"):
         address_key = f"{prefix}address"
         range_key = f"{prefix}range"
-        hosts = db_cache.get(f"{range_key}_hosts", {})
         if not (ipaddr := info.get(address_key)):
             # If ipaddress is not provided, but the bridge has an iprange defined
             # The container will be provided with an IP address from  bridge's
             # ip range.
             if db_cache.get(range_key):
-                ip = auto_allocate_ip(bridge, container_name, prefix)
-                cmd = f"{cmd} --{address_key}={ip}"
+                port_info[address_key] = auto_allocate_ip(
+                    bridge, container_name, prefix
+                )
             continue
 
         if ipaddr == "No-IP":  # If the user explicitly specifies "No-IP"
@@ -284,79 +491,762 @@ def add_iface_to_container(  # noqa: C901
             msg_no_prefix = f"{container_name}: ip {ipaddr} must have a prefix mask"
             raise ValueError(msg_no_prefix)
 
-        if ipaddr != hosts.get(container_name):
-            hosts.pop(container_name, None)
-            if ipaddr in hosts.values():
-                msg_ip_exists = (
-                    f"IP {ipaddr} already allocated to someone else.",
-                    f"Failed to assign addr to container: {container_name}",
-                )
-                raise ValueError(msg_ip_exists)
-
-        hosts[container_name] = ipaddr
-        cmd = f"{cmd} --{address_key}={ipaddr}"
-
-    for key in ["macaddress", "gateway", "gateway6"]:
+        try:
+            get_ip_allocator(bridge, prefix).reserve(container_name, ipaddr)
+        except ValueError as exc:
+            msg_ip_exists = (
+                f"IP {ipaddr} already allocated to someone else.",
+                f"Failed to assign addr to container: {container_name}",
+            )
+            raise ValueError(msg_ip_exists) from exc
+        port_info[address_key] = ipaddr
+
+    for key in ["macaddress", "gateway", "gateway6", "vlan", "trunk"]:
         # Note: add a check here to ensure that
         if value := info.get(key, ""):
-            cmd = f"{cmd} --{key}={value}"
+            port_info[key] = value
 
-    run_command(cmd)
+    # The port is created with its VLAN settings in the same transaction
+    await add_container_port(container_name, port_info, handle.netns_fd)
+    for vlan_mode in ("vlan", "trunk"):
+        if value := info.get(vlan_mode):
+            iface_cache["vlan_mode"] = value
     _LOGGER.info(
         "Interface %s connected to bridge:%s added to container %s",
         iface,
         bridge,
         container_name,
     )
-    configure_container_vlan(container_name, info)
 
 
-async def main() -> None:  # noqa: C901
-    """Runner function that runs in a loop."""
-    # Initial Check if docker socket is loaded.
-    if not DOCKER_SOCKET.exists():
-        _LOGGER.error("Need to mount Docker socket!!")
-        sys.exit(1)
+async def _attempt(item: str, action: Callable[[], Awaitable[None]]) -> None:
+    """Apply an item, recording its failure rather than raising it.
 
-    check_sys_module()
+    :param item: item name, see item_key()
+    :type item: str
+    :param action: coroutine function applying the item
+    :type action: Callable[[], Awaitable[None]]
+    """
+    try:
+        await action()
+    except Exception as exc:  # noqa: BLE001
+        get_failure_tracker().failed(item, exc)
+    else:
+        get_failure_tracker().succeeded(item)
+
+
+async def detach_container(container_name: str) -> None:
+    """Remove the bridge ports of a container that is no longer running.
+
+    The container end of each veth pair disappears with the container's
+    network namespace, this drops the stale bridge side as well.
+
+    :param container_name: Name of the stopped/removed container
+    :type container_name: str
+    """
+    for info in get_config()["container"].get(container_name, []):
+        await _attempt(
+            item_key("container", container_name, info["iface"]),
+            partial(del_container_port, container_name, info["iface"]),
+        )
+    _LOGGER.info("Detached stale interfaces of container %s", container_name)
+
+
+async def remove_container_iface(container_name: str, info: ContainerInfoDict) -> None:
+    """Remove an interface dropped from the configuration of a container.
+
+    The addresses of the container on the bridge are released, unless
+    another of its interfaces is attached to the same bridge.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :param info: Container interface details, as configured until now
+    :type info: ContainerInfoDict
+    """
+    bridge, iface = info["bridge"], info["iface"]
+    await del_container_port(container_name, iface)
+    db_cache = get_db(bridge)
+    if (cc_cache := db_cache.get(container_name)) is not None:
+        cc_cache.pop(iface, None)
+        if not cc_cache:
+            del db_cache[container_name]
+    if not any(
+        other["bridge"] == bridge and other["iface"] != iface
+        for other in get_config()["container"].get(container_name, [])
+    ):
+        for prefix in ("ip", "ip6"):
+            get_ip_allocator(bridge, prefix).release(container_name)
+    _LOGGER.info(
+        "Interface %s removed from container %s and bridge %s",
+        iface,
+        container_name,
+        bridge,
+    )
+
+
+async def detach_parent(bridge_name: str, parent: str) -> None:
+    """Release a parent dropped from the configuration of a bridge.
+
+    :param bridge_name: OVS/Linux bridge name
+    :type bridge_name: str
+    :param parent: parent interface, as configured until now
+    :type parent: str
+    """
+    if "usb:" in parent:
+        parent = get_usb_interface(parent.rsplit(":", 1)[-1])
+    get_db(bridge_name).pop(parent, None)
+    await remove_iface_from_bridge(bridge_name, parent)
+
+
+def release_container_ips(container_name: str) -> None:
+    """Return the automatically allocated addresses of a removed container.
 
-    fail_count = cast(int, get_db("failed", 0))
+    Addresses set in the container's configuration stay reserved for it.
 
+    :param container_name: Name of the removed container
+    :type container_name: str
+    """
+    for info in get_config()["container"].get(container_name, []):
+        for prefix in ("ip", "ip6"):
+            if not info.get(f"{prefix}address"):
+                get_ip_allocator(info["bridge"], prefix).release(container_name)
+
+
+def _container_items(container_name: str) -> list[str]:
+    """Return the items of the configured interfaces of a container.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :return: item names, see item_key()
+    :rtype: list[str]
+    """
+    return [
+        item_key("container", container_name, info["iface"])
+        for info in get_config()["container"].get(container_name, [])
+    ]
+
+
+def _container_failed(container_name: str, error: Exception) -> None:
+    """Record a failure to reach a container against its interfaces.
+
+    Interfaces waiting for their retry are left alone, so that a container
+    failing on every pass backs off like any other item.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :param error: error raised while resolving the container
+    :type error: Exception
+    """
+    tracker = get_failure_tracker()
+    for item in _container_items(container_name):
+        if tracker.is_due(item):
+            tracker.failed(item, error)
+
+
+async def reconcile_container(container_name: str) -> None:
+    """Attach all configured interfaces to a single container.
+
+    Quarantined interfaces are left alone, the others are attempted even
+    if waiting for their retry, the container may have been fixed.
+
+    :param container_name: Name of the container to reconcile
+    :type container_name: str
+    """
+    try:
+        if (handle := await get_container_handle(container_name)) is None:
+            return
+        # A single dump serves the existence checks of all interfaces
+        links = get_container_links(handle.netns_fd)
+    except (OSError, ValueError) as exc:
+        _container_failed(container_name, exc)
+        return
+    for info in get_config()["container"].get(container_name, []):
+        item = item_key("container", container_name, info["iface"])
+        if get_failure_tracker().is_quarantined(item):
+            continue
+        await _attempt(
+            item, partial(add_iface_to_container, container_name, info, links)
+        )
+
+
+def _container_info(container_name: str, iface: str) -> ContainerInfoDict:
+    """Return the configuration of a container interface.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :param iface: Name of the interface inside the container
+    :type iface: str
+    :return: Container interface details
+    :rtype: ContainerInfoDict
+    :raises ValueError: If the interface is not configured
+    """
+    for info in get_config()["container"].get(container_name, []):
+        if info["iface"] == iface:
+            return info
+    msg = f"No configuration for {container_name}:{iface}"
+    raise ValueError(msg)
+
+
+async def apply_operation(operation: Operation) -> None:  # noqa: C901
+    """Apply a single operation of a reconcile plan.
+
+    The cached VLAN settings of the ports involved are dropped first, the
+    plan found them to differ from the network. Removals are applied with
+    the configuration that still holds the items removed.
+
+    :param operation: operation planned by plan() or plan_changes()
+    :type operation: Operation
+    :raises ValueError: If the operation is unknown or its target not configured
+    """
+    config = get_config()
+    action, target = operation.action, operation.target
+    if action in (REMOVE_STALE_PORT, DETACH_CONTAINER_IFACE):
+        await del_container_port(*target)
+    elif action == INIT_BRIDGE:
+        await init_bridge(target[0], config["bridge"][target[0]])
+    elif action == ATTACH_PARENT:
+        bridge, parent = target
+        for parent_info in config["bridge"][bridge].get("parents", []):
+            if parent_info.get("iface") == parent:
+                get_db(bridge).pop(parent, None)
+                await _add_iface_to_bridge(bridge, parent_info)
+    elif action == ATTACH_CONTAINER_IFACE:
+        await add_iface_to_container(target[0], _container_info(*target))
+    elif action == CONFIGURE_CONTAINER_VLAN:
+        container, iface = target
+        info = _container_info(container, iface)
+        get_db(info["bridge"]).setdefault(container, {}).setdefault(iface, {})
+        await configure_container_vlan(container, info)
+    elif action == CREATE_VETH_PAIR:
+        prefix = target[0]
+        translation = config["veth_pairs"][prefix]
+        for veth in (f"v0_{prefix}", f"v1_{prefix}"):
+            get_db(translation["on"]).pop(veth, None)
+        await create_veth_pair(
+            on_bridge=translation["on"],
+            prefix=prefix,
+            vlan_map=translation.get("map", ":"),
+            trunk=translation.get("trunk", "no"),
+        )
+    elif action in REMOVAL_ACTIONS:
+        await _apply_removal(operation)
+    else:
+        msg = f"Unknown operation {operation}"
+        raise ValueError(msg)
+
+
+async def _apply_removal(operation: Operation) -> None:
+    """Remove an item dropped from the configuration.
+
+    :param operation: operation planned by plan_changes()
+    :type operation: Operation
+    """
+    action, target = operation.action, operation.target
+    if action == REMOVE_CONTAINER_IFACE:
+        await remove_container_iface(target[0], _container_info(*target))
+    elif action == REMOVE_VETH_PAIR:
+        on_bridge = get_config()["veth_pairs"][target[0]]["on"]
+        await remove_veth_pair(on_bridge, target[0])
+    elif action == DETACH_PARENT:
+        await detach_parent(*target)
+    else:
+        await delete_bridge(target[0])
+        get_db().pop(target[0], None)
+
+
+async def _apply_logged(operation: Operation) -> None:
+    """Apply an operation of a reconcile plan and account for it.
+
+    :param operation: operation planned by plan()
+    :type operation: Operation
+    """
+    _LOGGER.info(
+        "Applying %s %s: %s",
+        operation.action,
+        ":".join(operation.target),
+        operation.reason,
+    )
+    RECONCILE_OPERATIONS.inc(action=operation.action)
+    await apply_operation(operation)
+
+
+async def reconcile_all() -> list[Operation]:
+    """Run a full reconcile pass over bridges, containers and veth pairs.
+
+    The network is read in bulk and compared with the configuration, only
+    the operations of the resulting plan are applied. Their probes are
+    answered from the same snapshot. Operations that do not depend on each
+    other are applied concurrently, at most MAX_CONCURRENCY at a time.
+
+    A failing operation does not fail the pass, its item is retried by a
+    later pass after a backoff, see app/retry.py. So is a container that
+    cannot be resolved, it is taken for not running.
+
+    :return: the operations attempted
+    :rtype: list[Operation]
+    """
+    config = get_config()
+    running = await get_docker_client().refresh()
+    for name in set(_CONTAINER_HANDLES) - set(running):
+        invalidate_container(name)
+
+    slots = asyncio.Semaphore(MAX_CONCURRENCY)
+    unresolved: dict[str, Exception] = {}
+
+    async def _resolve(container: str) -> ContainerHandle | None:
+        try:
+            async with slots:
+                return await get_container_handle(container)
+        except (OSError, ValueError) as exc:
+            # E.g. the container exited since the refresh, the others go on
+            unresolved[container] = exc
+            return None
+
+    with RECONCILE_PHASE_SECONDS.time(phase="observe"):
+        # Cached handles are checked in place, only new ones wait for Docker
+        handles = {
+            container: await _resolve(container)
+            for container in config["container"]
+            if container in _CONTAINER_HANDLES
+        }
+        missing = [name for name in config["container"] if name not in handles]
+        handles.update(
+            zip(missing, await asyncio.gather(*map(_resolve, missing)), strict=True)
+        )
+        netns_fds = {
+            container: handle.netns_fd
+            for container, handle in handles.items()
+            if handle is not None
+        }
+        snapshot = await take_snapshot(netns_fds)
+
+    # The probes of the operations are answered from the snapshot as well
+    with use_snapshot(snapshot):
+        with RECONCILE_PHASE_SECONDS.time(phase="plan"):
+            planned = plan(config, snapshot)
+            operations, dependencies = _defer_failing(
+                planned, plan_dependencies(planned, config)
+            )
+
+        # Items the network matches need no retry, wherever the fix came from
+        get_failure_tracker().retain(
+            itertools.chain(
+                (operation.item for operation in planned),
+                *map(_container_items, unresolved),
+            )
+        )
+        for container, exc in unresolved.items():
+            _container_failed(container, exc)
+        with RECONCILE_PHASE_SECONDS.time(phase="apply"):
+            await _apply_operations(operations, dependencies)
+    return operations
+
+
+async def _apply_operations(
+    operations: list[Operation], dependencies: list[set[int]]
+) -> None:
+    """Apply the operations of a plan and record the outcome of their items.
+
+    :param operations: operations of a plan
+    :type operations: list[Operation]
+    :param dependencies: their dependencies, see plan_dependencies()
+    :type dependencies: list[set[int]]
+    """
+    result = await run_graph(
+        [partial(_apply_logged, operation) for operation in operations],
+        dependencies,
+    )
+    tracker = get_failure_tracker()
+    failed = {}
+    for index, exc in result.errors.items():
+        failed.setdefault(operations[index].item, exc)
+    for item, exc in failed.items():
+        tracker.failed(item, exc)
+    for index, operation in enumerate(operations):
+        if result.succeeded(index) and operation.item not in failed:
+            tracker.succeeded(operation.item)
+
+
+async def apply_config_changes(
+    previous: dict[str, Any] | None, document: dict[str, Any]
+) -> list[Operation]:
+    """Apply a new version of the configuration to the network.
+
+    Only the bridges, container interfaces and veth pairs that differ
+    between the two versions are touched, the others are neither probed
+    nor changed. The items dropped are removed with the configuration
+    still holding them, then the configuration is updated and the items
+    added or changed are applied. No other operation runs meanwhile.
+
+    A failing operation is retried like those of a full pass, the removal
+    of an item is not retried though.
+
+    :param previous: version the configuration was updated with last, None
+                     for the current desired state, changes made through
+                     the API included
+    :type previous: dict[str, Any] | None
+    :param document: new version
+    :type document: dict[str, Any]
+    :return: the operations attempted
+    :rtype: list[Operation]
+    """
+    async with get_lock_manager().hold_all():
+        if previous is None:
+            previous = copy.deepcopy(get_config())
+        if not (operations := plan_changes(previous, document)):
+            return []
+        tracker = get_failure_tracker()
+        for operation in operations:
+            # The item changed, its failures with the previous version are moot
+            tracker.release(operation.item)
+
+        removals = [op for op in operations if op.action in REMOVAL_ACTIONS]
+        additions = [op for op in operations if op.action not in REMOVAL_ACTIONS]
+        await get_docker_client().refresh()
+        # Committed first, a changed item is created again under the same names
+        async with ovs_transaction():
+            await _apply_operations(removals, plan_dependencies(removals, get_config()))
+        update_config(get_config(), previous, document)
+        async with ovs_transaction():
+            await _apply_operations(
+                additions, plan_dependencies(additions, get_config())
+            )
+    save_db()
+    return operations
+
+
+# Version of the configuration files applied last, see reload_config()
+_LOADED_CONFIG: dict[str, Any] = {}
+
+
+async def reload_config() -> list[Operation]:
+    """Read the configuration files again and apply what changed in them.
+
+    The previous configuration stays in force if the files cannot be read.
+
+    :return: the operations attempted
+    :rtype: list[Operation]
+    """
+    try:
+        document = load_config()
+    except (OSError, ValueError):
+        _LOGGER.exception("Failed to reload the configuration, keeping the current")
+        return []
+    if document == _LOADED_CONFIG:
+        _LOGGER.debug("Configuration files unchanged")
+        return []
+
+    TRACE_ORIGIN.set(f"config:{next(_PASSES)}")
+    with RECONCILE_SECONDS.time(kind="config"):
+        operations = await apply_config_changes(_LOADED_CONFIG, document)
+    _LOADED_CONFIG.clear()
+    _LOADED_CONFIG.update(document)
+    _LOGGER.info("Configuration reloaded, %d operations applied", len(operations))
+    return operations
+
+
+async def apply_topology(document: dict[str, Any]) -> list[Operation]:
+    """Replace the desired state with a full topology and apply the difference.
+
+    The topology is saved to config.json, the fragments still apply over it.
+    Their items stay in the desired state, as they would once the files are
+    read again.
+
+    :param document: topology, in the schema of config.json
+    :type document: dict[str, Any]
+    :return: the operations attempted
+    :rtype: list[Operation]
+    :raises OSError: If config.json cannot be written, the topology is
+                     applied nevertheless
+    :raises ValueError: If a fragment is not valid JSON, nothing is applied
+    """
+    config = load_config(document)
+    with RECONCILE_SECONDS.time(kind="topology"):
+        operations = await apply_config_changes(None, config)
+    _LOGGER.info("Topology replaced, %d operations applied", len(operations))
+    # The write is not taken for an edit of the files
+    _LOADED_CONFIG.clear()
+    _LOADED_CONFIG.update(config)
+    save_config(document)
+    return operations
+
+
+def _defer_failing(
+    operations: list[Operation], dependencies: list[set[int]]
+) -> tuple[list[Operation], list[set[int]]]:
+    """Leave out the operations of failing items that are not due for a retry.
+
+    The operations depending on them are left out as well.
+
+    :param operations: operations of a plan
+    :type operations: list[Operation]
+    :param dependencies: their dependencies, see plan_dependencies()
+    :type dependencies: list[set[int]]
+    :return: the operations to apply and their dependencies
+    :rtype: tuple[list[Operation], list[set[int]]]
+    """
+    tracker = get_failure_tracker()
+    kept: dict[int, int] = {}  # Index in the plan to index in the result
+    for index, operation in enumerate(operations):
+        if dependencies[index] - kept.keys() or not tracker.is_due(operation.item):
+            _LOGGER.debug(
+                "Deferring %s %s", operation.action, ":".join(operation.target)
+            )
+            continue
+        kept[index] = len(kept)
+    return (
+        [operations[index] for index in kept],
+        [{kept[other] for other in dependencies[index]} for index in kept],
+    )
+
+
+async def _watch_container_events(queue: asyncio.Queue[tuple[str, str]]) -> None:
+    """Push (action, container name) of Docker container events into a queue.
+
+    The subscription is re-established if the Docker daemon drops it,
+    replaying the events missed in the meantime.
+
+    :param queue: queue consumed by the main loop
+    :type queue: asyncio.Queue[tuple[str, str]]
+    """
+    filters = {"type": ["container"], "event": list(CONTAINER_EVENTS)}
+    since: str | None = None
     while True:
-        config = get_config()
+        try:
+            async for event in get_docker_client().events(filters, since):
+                if time_nano := event.get("timeNano"):
+                    since = f"{time_nano // 10**9}.{time_nano % 10**9:09d}"
+                name = event.get("Actor", {}).get("Attributes", {}).get("name", "")
+                queue.put_nowait((event.get("Action", ""), name))
+        except (OSError, ValueError, EOFError, IndexError):
+            # EOFError covers asyncio.IncompleteReadError, e.g. a stream cut
+            # short by a daemon restart, IndexError a malformed chunk
+            _LOGGER.exception("Lost the Docker event stream, reconnecting..")
+        await asyncio.sleep(EVENT_RETRY_DELAY)
+
+
+def _log_watcher_exit(task: asyncio.Task[None]) -> None:
+    """Log an unexpected error that ended a watcher task.
+
+    :param task: the watcher task, done
+    :type task: asyncio.Task[None]
+    """
+    if not task.cancelled() and (error := task.exception()) is not None:
+        _LOGGER.error("Watcher %s stopped", task.get_name(), exc_info=error)
+
+
+async def _watch_config(queue: asyncio.Queue[tuple[str, str]]) -> None:
+    """Push a reload request into a queue when the configuration files change.
+
+    :param queue: queue consumed by the main loop
+    :type queue: asyncio.Queue[tuple[str, str]]
+    """
+    # Changes of the files are applied relative to the configuration read
+    _LOADED_CONFIG.clear()
+    _LOADED_CONFIG.update(copy.deepcopy(get_config()))
+    await watch_config(partial(queue.put_nowait, (RELOAD_ACTION, "config")))
+
+
+@cache
+def get_event_queue() -> asyncio.Queue[tuple[str, str]]:
+    """Return the queue of Docker events, configuration changes and requests.
+
+    :return: queue of (action, container name or requester)
+    :rtype: asyncio.Queue[tuple[str, str]]
+    """
+    return asyncio.Queue()
 
-        if fail_count > MAX_FAIL_COUNT:
-            sys.exit(1)
+
+def request_reconcile(requester: str) -> None:
+    """Wake the main loop up for a full pass, e.g. after an API mutation.
+
+    Requests made while a pass runs are coalesced into the next pass.
+
+    :param requester: what asked for the pass, for the logs
+    :type requester: str
+    """
+    get_event_queue().put_nowait((WAKE_ACTION, requester))
+
+
+async def _handle_container_events(
+    queue: asyncio.Queue[tuple[str, str]], interval: float
+) -> bool:
+    """Reconcile containers reported by Docker events until the interval expires.
+
+    Bursts of events are coalesced, only the latest action of each
+    container is acted upon. Changes of the configuration files are applied
+    first. A full pass request ends the wait early.
+
+    :param queue: queue fed by the Docker event watcher, the configuration
+                  watcher and request_reconcile()
+    :type queue: asyncio.Queue[tuple[str, str]]
+    :param interval: seconds to wait before returning to the full sweep
+    :type interval: float
+    :return: True if an event, change or request was handled, False if the
+             interval expired in silence
+    :rtype: bool
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + interval
+    active = False
+    while (remaining := deadline - loop.time()) > 0:
         try:
-            async with EVENT_LOCK:
-                # Initialize all parent bridges
-                for bridge, info in config["bridge"].items():
-                    init_bridge(bridge, info)
-
-                # Attach containers to parent bridges based on config.json
-                for container, iface_info in config["container"].items():
-                    for info in iface_info:
-                        add_iface_to_container(container, info)
-
-                # Handle Veth pairs and VLAN translations
-                for prefix, translation in config.get("veth_pairs", {}).items():
-                    create_veth_pair(
-                        on_bridge=translation["on"],
-                        prefix=prefix,
-                        vlan_map=translation.get("map", ":"),
-                        trunk=translation.get("trunk", "no"),
+            items = [await asyncio.wait_for(queue.get(), remaining)]
+        except TimeoutError:
+            return active
+        while not queue.empty():
+            items.append(queue.get_nowait())
+
+        # The configuration is brought up to date before acting on events
+        if any(action == RELOAD_ACTION for action, _ in items):
+            active = bool(await reload_config()) or active
+
+        pending, woken = {}, False
+        for action, name in items:
+            if action == WAKE_ACTION:
+                _LOGGER.debug("Full pass requested by %s", name)
+                woken = True
+            elif action != RELOAD_ACTION and name in get_config()["container"]:
+                pending[name] = action
+
+        if pending:
+            active = True
+            TRACE_ORIGIN.set(f"events:{next(_PASSES)}")
+            with RECONCILE_SECONDS.time(kind="events"):
+                await get_docker_client().refresh()
+                # Containers are independent, their events are handled in parallel
+                await asyncio.gather(
+                    *(
+                        _handle_container_event(name, action)
+                        for name, action in pending.items()
                     )
+                )
+                save_db()
+        if woken:
+            return True
+    return active
+
+
+async def _handle_container_event(container_name: str, action: str) -> None:
+    """Attach or detach the interfaces of a container after a Docker event.
+
+    :param container_name: Name of the container
+    :type container_name: str
+    :param action: Docker event action, e.g. start or die
+    :type action: str
+    """
+    bridges = {info["bridge"] for info in get_config()["container"][container_name]}
+    async with (
+        get_lock_manager().hold(containers=[container_name], uses=bridges),
+        ovs_transaction(),
+    ):
+        _LOGGER.info("Received %s event for container %s", action, container_name)
+        if action in ("die", "restart", "destroy"):
+            invalidate_container(container_name)
+        if action in ("die", "destroy"):
+            await detach_container(container_name)
+            if action == "destroy":
+                release_container_ips(container_name)
+        else:
+            await reconcile_container(container_name)
+
 
-            # Introduce a sleep to wait before the next loop cycle
-            await asyncio.sleep(15)  # This allows cancellation to be checked
+def _next_interval(interval: float, *, changed: bool) -> float:
+    """Pick the wait before the next full pass from the outcome of the last.
 
-        except asyncio.CancelledError:
-            _LOGGER.info("Main loop has been cancelled. Shutting down gracefully.")
+    Passes that change or fail to change something are followed closely,
+    the wait doubles with each pass in a row that finds nothing to do.
 
-        except (CalledProcessError, ValueError, IndexError):
-            _LOGGER.exception("Exiting core due to exception")
-            traceback.print_exc()
-            get_db()["failed"] = fail_count + 1
-            if fail_count > MAX_FAIL_COUNT:
-                _LOGGER.exception("Orchestrator keeps failing! Exiting.")
-                sys.exit(1)
+    :param interval: wait after the previous pass
+    :type interval: float
+    :param changed: the last pass applied or attempted operations
+    :type changed: bool
+    :return: seconds, between MIN_SYNC_INTERVAL and FULL_SYNC_INTERVAL
+    :rtype: float
+    """
+    if changed:
+        return MIN_SYNC_INTERVAL
+    return min(max(interval * 2, MIN_SYNC_INTERVAL), FULL_SYNC_INTERVAL)
+
+
+async def main() -> None:  # noqa: PLR0915
+    """Runner function that runs in a loop."""
+    # Initial Check if docker socket is loaded.
+    if not USE_SIMULATION and not DOCKER_SOCKET.exists():
+        _LOGGER.error("Need to mount Docker socket!!")
+        sys.exit(1)
+
+    check_sys_module()
+
+    loop = asyncio.get_running_loop()
+    started, ready = loop.time(), False
+    fail_count = cast("int", get_db("failed", 0))
+
+    events = get_event_queue()
+    watcher = asyncio.create_task(_watch_container_events(events), name="docker-events")
+    watcher.add_done_callback(_log_watcher_exit)
+    config_watcher = asyncio.create_task(_watch_config(events), name="config-files")
+    config_watcher.add_done_callback(_log_watcher_exit)
+    # Grows while passes find nothing to change, see _next_interval()
+    interval = MIN_SYNC_INTERVAL
+
+    try:
+        while True:
+            try:
+                TRACE_ORIGIN.set(f"reconcile:{next(_PASSES)}")
+                with RECONCILE_SECONDS.time(kind="full"):
+                    async with get_lock_manager().hold_all(), ovs_transaction():
+                        operations = await reconcile_all()
+                if not ready:
+                    ready, elapsed = True, loop.time() - started
+                    TIME_TO_READY_SECONDS.set(elapsed)
+                    _LOGGER.info(
+                        "Network ready after %.2f s, %d operations applied, "
+                        "%d items failing",
+                        elapsed,
+                        len(operations),
+                        len(get_failure_tracker().failures()),
+                    )
+                # A pass that found nothing to change leaves the state as is
+                if operations or fail_count:
+                    fail_count = get_db()["failed"] = 0
+                    save_db()
+
+                interval = _next_interval(interval, changed=bool(operations))
+                delay = interval
+                # Failing items are retried when due, before the next sweep
+                if (retry := get_failure_tracker().next_retry()) is not None:
+                    delay = min(delay, retry)
+
+            except Exception:
+                # E.g. Docker or OVSDB unreachable, failing items do not get here
+                fail_count += 1
+                delay = backoff_delay(fail_count)
+                _LOGGER.exception(
+                    "Reconcile pass failed %d time(s), retrying in %.0f s",
+                    fail_count,
+                    delay,
+                )
+                RECONCILE_FAILURES.inc()
+                get_db()["failed"] = fail_count
+                save_db()
+
+            RECONCILE_DELAY_SECONDS.set(delay)
+            try:
+                # Serve Docker events and full pass requests until the next
+                # sweep is due. This allows cancellation to be checked
+                if await _handle_container_events(events, delay):
+                    interval = MIN_SYNC_INTERVAL
+            except asyncio.CancelledError:
+                _LOGGER.info("Main loop has been cancelled. Shutting down gracefully.")
+                raise
+            except Exception:
+                _LOGGER.exception(
+                    "Failed to handle Docker events, retrying in %d s",
+                    EVENT_RETRY_DELAY,
+                )
+                await asyncio.sleep(EVENT_RETRY_DELAY)
+    finally:
+        watcher.cancel()
+        config_watcher.cancel()
+        get_db_store().flush()
@@ -4,12 +4,35 @@ This part contains public helper functions for command execution, IP retrieval,
 and OVS database management.
 """
 
+import hashlib
+import json
 import re
 import sys
-from subprocess import CalledProcessError, run
-
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from functools import cache
+from pathlib import Path
+from uuid import uuid4
+
+from app.metrics import OVS_OPERATION_SECONDS, timed
+from app.netlink import Link, NetlinkBackend
+from app.ovsdb import (
+    BRIDGE_COLUMNS,
+    INTERFACE_COLUMNS,
+    OVS_TRANSACTION,
+    PORT_COLUMNS,
+    OvsdbBackend,
+    OvsdbClient,
+    OvsState,
+    PendingWrites,
+    ovs_state,
+)
+from app.simulated import SimulatedNetlink, SimulatedOvsBackend, get_simulated_network
+from app.snapshot import SNAPSHOT, Snapshot, SnapshotLinkBackend, SnapshotOvsBackend
 from app.utils import (
+    OVSDB_REMOTE,
     USE_LINUX_BRIDGE,
+    USE_SIMULATION,
     ContainerInfoDict,
     IfaceInfoDict,
     get_db,
@@ -21,6 +44,320 @@ from app.utils import (
 _LOGGER = get_logger("ovs_lib")
 
 
+class VsctlBackend:
+    """OVS bridge and port operations performed by forking ovs-vsctl.
+
+    Writes collected in a transaction opened by ovs_transaction() are
+    chained into a single ``ovs-vsctl -- cmd -- cmd ...`` invocation.
+    """
+
+    async def commit(self) -> None:
+        """Apply all collected writes as a single ovs-vsctl transaction."""
+        if (pending := OVS_TRANSACTION.get()) is None or not pending.operations:
+            return
+        commands = pending.operations
+        pending.reset()
+        await run_command(f"ovs-vsctl -- {' -- '.join(commands)}")
+
+    async def _write(self, command: str, check: bool = True) -> None:
+        """Run an ovs-vsctl command, or collect it if a transaction is open.
+
+        :param command: ovs-vsctl command and its arguments
+        :type command: str
+        :param check: Flag to raise an exception on command failure.
+        :type check: bool
+        """
+        if (pending := OVS_TRANSACTION.get()) is not None:
+            pending.operations.append(command)
+            return
+        await run_command(f"ovs-vsctl {command}", check=check)
+
+    async def dump(self) -> OvsState:
+        """Read all bridges and ports with a single ovs-vsctl invocation.
+
+        :return: committed state of OVS
+        :rtype: OvsState
+        """
+        tables = (
+            ("Bridge", BRIDGE_COLUMNS),
+            ("Port", PORT_COLUMNS),
+            ("Interface", INTERFACE_COLUMNS),
+        )
+        commands = " ".join(
+            f"-- --columns={','.join(columns)} list {table}"
+            for table, columns in tables
+        )
+        check = await run_command(f"ovs-vsctl --format=json --data=json {commands}")
+
+        # One JSON table per command, printed one after the other
+        decoder, output, offset = json.JSONDecoder(), check.stdout, 0
+        rows = []
+        for _ in tables:
+            offset = len(output) - len(output[offset:].lstrip())
+            table, offset = decoder.raw_decode(output, offset)
+            rows.append(
+                [
+                    dict(zip(table["headings"], row, strict=True))
+                    for row in table["data"]
+                ]
+            )
+        return ovs_state(*rows)
+
+    async def bridge_exists(self, bridge: str) -> bool:
+        """Check if a bridge exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :return: True if the bridge exists
+        :rtype: bool
+        """
+        if (pending := OVS_TRANSACTION.get()) and bridge in pending.bridges:
+            return True
+        check = await run_command(f"ovs-vsctl br-exists {bridge}", check=False)
+        return check.returncode == 0
+
+    async def add_bridge(self, bridge: str) -> None:
+        """Create a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        await self._write(f"--may-exist add-br {bridge}")
+        if pending := OVS_TRANSACTION.get():
+            pending.bridges.add(bridge)
+
+    async def del_bridge(self, bridge: str) -> None:
+        """Delete a bridge, if it exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        await self._write(f"--if-exists del-br {bridge}", check=False)
+
+    async def port_to_br(self, port: str) -> str:
+        """Return the bridge a port belongs to.
+
+        :param port: port name
+        :type port: str
+        :return: bridge name, empty if the port does not exist
+        :rtype: str
+        """
+        if (pending := OVS_TRANSACTION.get()) and port in pending.ports:
+            return pending.ports[port]
+        check = await run_command(f"ovs-vsctl port-to-br {port}", check=False)
+        return check.stdout.strip()
+
+    async def add_port(
+        self,
+        bridge: str,
+        port: str,
+        external_ids: dict[str, str] | None = None,
+        **columns: str,
+    ) -> None:
+        """Add a port to a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :param port: port (and interface) name
+        :type port: str
+        :param external_ids: Optional, external_ids of the interface
+        :type external_ids: dict[str, str] | None
+        :param columns: Optional, Port columns e.g. tag="100"
+        :type columns: str
+        """
+        cmd = f"--may-exist add-port {bridge} {port}"
+        for column, value in columns.items():
+            cmd = f"{cmd} {column}={value}"
+        if external_ids:
+            cmd = f"{cmd} -- set interface {port}"
+            for key, value in external_ids.items():
+                cmd = f"{cmd} external_ids:{key}={value}"
+        await self._write(cmd)
+        if pending := OVS_TRANSACTION.get():
+            pending.add_port(bridge, port, external_ids or {})
+
+    async def del_port(self, port: str) -> None:
+        """Remove a port from its bridge, if it exists.
+
+        :param port: port name
+        :type port: str
+        """
+        await self._write(f"--if-exists del-port {port}", check=False)
+        if pending := OVS_TRANSACTION.get():
+            pending.del_port(port)
+
+    async def get_port_vlans(self, port: str, column: str) -> list[str]:
+        """Return the VLAN ids held in a Port column.
+
+        :param port: port name
+        :type port: str
+        :param column: "tag" or "trunks"
+        :type column: str
+        :return: VLAN ids, empty if unset or if the port does not exist
+        :rtype: list[str]
+        """
+        if (pending := OVS_TRANSACTION.get()) and port in pending.ports:
+            return []  # Port is (re)created by the pending transaction
+        check = await run_command(f"ovs-vsctl get port {port} {column}", check=False)
+        return re.findall(r"\d+", check.stdout.strip())
+
+    async def set_port(self, port: str, **columns: str) -> None:
+        """Set columns of a port.
+
+        :param port: port name
+        :type port: str
+        :param columns: Port columns e.g. vlan_mode="access", tag="100"
+        :type columns: str
+        """
+        settings = " ".join(f"{column}={value}" for column, value in columns.items())
+        await self._write(f"set port {port} {settings}")
+
+    async def clear_port(self, port: str, column: str) -> None:
+        """Clear a set column of a port.
+
+        :param port: port name
+        :type port: str
+        :param column: column name, e.g. "trunks"
+        :type column: str
+        """
+        await self._write(f"clear port {port} {column}")
+
+    async def find_port(self, external_ids: dict[str, str]) -> str:
+        """Return the port whose interface has the given external_ids.
+
+        :param external_ids: external_ids the interface must include
+        :type external_ids: dict[str, str]
+        :return: port name, empty if there is none
+        :rtype: str
+        """
+        conditions = " ".join(
+            f"external_ids:{key}={value}" for key, value in external_ids.items()
+        )
+        check = await run_command(
+            "ovs-vsctl --data=bare --no-heading --columns=name find interface "
+            f"{conditions}",
+            check=False,
+        )
+        ports = check.stdout.split()
+        if (pending := OVS_TRANSACTION.get()) is not None:
+            return pending.find_port(external_ids, ports)
+        return ports[0] if ports else ""
+
+
+def get_ovs_backend() -> (
+    OvsdbBackend | VsctlBackend | SimulatedOvsBackend | SnapshotOvsBackend
+):
+    """Return the backend used for OVS bridge and port operations.
+
+    OVSDB is used over its management protocol unless OVSDB_REMOTE is empty,
+    in which case every operation forks ovs-vsctl. During a reconcile pass,
+    reads are answered from the snapshot of the pass.
+
+    :return: OVS backend
+    :rtype: OvsdbBackend | VsctlBackend | SimulatedOvsBackend | SnapshotOvsBackend
+    """
+    backend = _get_ovs_backend()
+    if (snapshot := SNAPSHOT.get()) is not None and snapshot.ovs is not None:
+        return snapshot.ovs_view(backend)
+    return backend
+
+
+@cache
+def _get_ovs_backend() -> OvsdbBackend | VsctlBackend | SimulatedOvsBackend:
+    """Create the OVS backend shared by all callers.
+
+    :return: OVS backend
+    :rtype: OvsdbBackend | VsctlBackend | SimulatedOvsBackend
+    """
+    if USE_SIMULATION:
+        return SimulatedOvsBackend(get_simulated_network())
+    if OVSDB_REMOTE:
+        return OvsdbBackend(OvsdbClient(OVSDB_REMOTE))
+    return VsctlBackend()
+
+
+@asynccontextmanager
+async def ovs_transaction() -> AsyncIterator[None]:
+    """Group the OVS writes of a block into a single transaction.
+
+    The writes are committed together when the block exits, followed by
+    a single wait for ovs-vswitchd, instead of one commit per command.
+    Writes collected before an error are still committed, as they would
+    have been when applied one by one. Nested blocks join the outer
+    transaction. Linux bridges are not affected.
+
+    :yield: once the transaction is open
+    """
+    if USE_LINUX_BRIDGE or OVS_TRANSACTION.get() is not None:
+        yield
+        return
+
+    token = OVS_TRANSACTION.set(PendingWrites())
+    try:
+        yield
+    finally:
+        try:
+            await flush_ovs_transaction()
+        finally:
+            OVS_TRANSACTION.reset(token)
+
+
+@timed(OVS_OPERATION_SECONDS)
+async def flush_ovs_transaction() -> None:
+    """Commit the OVS writes collected so far and run the deferred actions.
+
+    The transaction stays open for the writes that follow.
+    """
+    if (pending := OVS_TRANSACTION.get()) is None:
+        return
+    await get_ovs_backend().commit()
+    actions, pending.after_commit = pending.after_commit, []
+    for action in actions:
+        await action()
+
+
+async def run_after_commit(action: Callable[[], Awaitable[None]]) -> None:
+    """Run an action once the pending OVS writes are applied.
+
+    Use this for work depending on the result of the writes, e.g. on the
+    kernel device of a new bridge. The action runs right away if no
+    transaction is open.
+
+    :param action: coroutine function to run
+    :type action: Callable[[], Awaitable[None]]
+    """
+    if (pending := OVS_TRANSACTION.get()) is None:
+        await action()
+        return
+    pending.after_commit.append(action)
+
+
+def get_link_backend() -> NetlinkBackend | SimulatedNetlink | SnapshotLinkBackend:
+    """Return the backend used for host link and address operations.
+
+    During a reconcile pass, reads are answered from the snapshot of the pass.
+
+    :return: netlink backend
+    :rtype: NetlinkBackend | SimulatedNetlink | SnapshotLinkBackend
+    """
+    backend = _get_link_backend()
+    if (snapshot := SNAPSHOT.get()) is not None:
+        return snapshot.link_view(backend)
+    return backend
+
+
+@cache
+def _get_link_backend() -> NetlinkBackend | SimulatedNetlink:
+    """Create the netlink backend shared by all callers.
+
+    :return: netlink backend
+    :rtype: NetlinkBackend | SimulatedNetlink
+    """
+    if USE_SIMULATION:
+        return SimulatedNetlink(get_simulated_network())
+    return NetlinkBackend()
+
+
 def get_interface_ip(interface: str) -> list[str | None]:
     """Get the IP address of a network interface.
 
@@ -29,15 +366,7 @@ def get_interface_ip(interface: str) -> list[str | None]:
     :return: The IP address of the interface, or None if not found.
     :rtype: list[str | None]
     """
-    try:
-        command = ["ip", "-o", "addr", "show", interface]
-        result = run(command, check=True, capture_output=True, text=True)
-        return re.findall(r"inet\d*\s+(\S+)", result.stdout.strip())
-    except CalledProcessError as exc:
-        _LOGGER.exception("Subprocess error:\nCommand failed: %s", exc.cmd)
-        stderr_output = exc.stderr.strip()
-        _LOGGER.exception("Command stderr output:\n%s", stderr_output)
-    return []
+    return [addr for _, addr in get_link_backend().addresses(interface)]
 
 
 def veth_exists(veth_end: str) -> bool:
@@ -48,11 +377,11 @@ def veth_exists(veth_end: str) -> bool:
     :return: True if the veth or veth pair exists, False otherwise.
     :rtype: bool
     """
-    result = run_command(f"ip link show {veth_end}", check=False)
-    return result.returncode == 0
+    return get_link_backend().link(veth_end) is not None
 
 
-def configure_ovs_vlan_port(port_name: str, vlan_type: str, vid: str) -> None:
+@timed(OVS_OPERATION_SECONDS)
+async def configure_ovs_vlan_port(port_name: str, vlan_type: str, vid: str) -> None:
     """Configure VLAN settings for an OVS bridge.
 
     This function applies trunk and native VLAN settings to the specified parent interface
@@ -65,16 +394,16 @@ def configure_ovs_vlan_port(port_name: str, vlan_type: str, vid: str) -> None:
     :param vid: The VLAN ID(s) associated with the parent interface.
     :type vid: str
     """
+    backend = get_ovs_backend()
     if vlan_type == "trunk":
-        run_command(f"ovs-vsctl set port {port_name} vlan_mode=trunk trunks={vid}")
+        await backend.set_port(port_name, vlan_mode="trunk", trunks=vid)
     elif vlan_type == "vlan":
-        run_command(f"ovs-vsctl set port {port_name} vlan_mode=access tag={vid}")
+        await backend.set_port(port_name, vlan_mode="access", tag=vid)
     elif vlan_type == "native":
-        run_command(
-            f"ovs-vsctl set port {port_name} vlan_mode=native-untagged tag={vid}"
-        )
+        await backend.set_port(port_name, vlan_mode="native-untagged", tag=vid)
 
 
+@timed(OVS_OPERATION_SECONDS)
 def configure_lxbr_vlan_port(
     bridge_name: str, port_name: str, vlan_type: str, vid: str
 ) -> None:
@@ -92,16 +421,18 @@ def configure_lxbr_vlan_port(
     :param vid: The VLAN ID(s) associated with the parent interface.
     :type vid: str
     """
-    run_command(f"ip link set {bridge_name} type bridge vlan_filtering 1")
-    run_command(f"bridge vlan delete dev {port_name} vid 1")
+    links = get_link_backend()
+    links.set_link(bridge_name, vlan_filtering=True)
+    if 1 in links.bridge_vlans(port_name):
+        links.del_bridge_vlan(port_name, 1)
 
     for vlan_id in str(vid).split(","):
-        cmd = f"bridge vlan add dev {port_name} vid {vlan_id}"
-        if vlan_type in ["native", "vlan"]:
-            cmd += " pvid untagged"
-        run_command(cmd)
+        links.add_bridge_vlan(
+            port_name, int(vlan_id), pvid=vlan_type in ["native", "vlan"]
+        )
 
 
+@timed(OVS_OPERATION_SECONDS)
 def remove_linux_bridge_vlan(iface: str, vid: str) -> bool:
     """Remove or reset the specified VLAN setting from a Linux bridge interface.
 
@@ -116,20 +447,14 @@ def remove_linux_bridge_vlan(iface: str, vid: str) -> bool:
     :return: True if VLAN settings were removed, False if there was no change.
     :rtype: bool
     """
-    # Determine the current VLAN settings on the interface using `bridge vlan`
-    check = run_command(f"bridge vlan show dev {iface}", check=False)
-
-    if not check.stdout.strip():
+    # Determine the current VLAN settings on the interface
+    links = get_link_backend()
+    if not (actual_values := [str(vlan) for vlan in links.bridge_vlans(iface)]):
         _LOGGER.debug("No VLAN settings found on iface %s", iface)
         return True
 
     # Split the expected and actual VLANs
     expected_values = set(vid.split(","))
-    actual_values = [
-        re.findall(r"\d+", li).pop()
-        for li in check.stdout.strip().splitlines()[1:]
-        if re.findall(r"\d+", li)
-    ]
 
     # Find any VLANs that exist but aren't expected
     actual_value_set = set(actual_values)
@@ -149,13 +474,13 @@ def remove_linux_bridge_vlan(iface: str, vid: str) -> bool:
     # Remove any VLANs that are not in the expected values
     for vlan_id in to_remove:
         _LOGGER.info("Removing VLAN: %s from iface %s", vlan_id, iface)
-        cmd = f"bridge vlan del vid {vlan_id} dev {iface}"
-        run_command(cmd)
+        links.del_bridge_vlan(iface, int(vlan_id))
 
     return True
 
 
-def remove_ovs_vlan_port(parent: str, vlan_type: str, vid: str) -> bool:
+@timed(OVS_OPERATION_SECONDS)
+async def remove_ovs_vlan_port(parent: str, vlan_type: str, vid: str) -> bool:
     """Remove or reset the specified VLAN setting from the OVS port if the value differs.
 
     This function checks the current VLAN setting on the OVS port. If the
@@ -172,14 +497,13 @@ def remove_ovs_vlan_port(parent: str, vlan_type: str, vid: str) -> bool:
     :return: True if VLAN settings were removed.
     :rtype: bool
     """
+    backend = get_ovs_backend()
     # Get the current configuration for the port
     if vlan_type == "trunk":
-        check = run_command(f"ovs-vsctl get port {parent} trunks", check=False)
-        current_value = re.findall(r"\d+", check.stdout.strip())
+        current_value = await backend.get_port_vlans(parent, "trunks")
         _LOGGER.debug("Current trunk VLAN for port %s is %s", parent, current_value)
     elif vlan_type in ("vlan"):
-        check = run_command(f"ovs-vsctl get port {parent} tag", check=False)
-        current_value = re.findall(r"\d+", check.stdout.strip())
+        current_value = await backend.get_port_vlans(parent, "tag")
         _LOGGER.debug("Current tag VLAN for port %s is %s", parent, current_value)
     else:
         return True
@@ -200,10 +524,10 @@ def remove_ovs_vlan_port(parent: str, vlan_type: str, vid: str) -> bool:
     # Remove the VLAN configuration only if it doesn't match
     if vlan_type == "trunk":
         _LOGGER.debug("Removing trunk VLAN setting from port %s", parent)
-        run_command(f"ovs-vsctl remove port {parent} trunks {','.join(current_value)}")
+        await backend.clear_port(parent, "trunks")
     elif vlan_type in ("native", "vlan"):
         _LOGGER.debug("Removing VLAN tag setting from port %s", parent)
-        run_command(f"ovs-vsctl remove port {parent} tag {','.join(current_value)}")
+        await backend.clear_port(parent, "tag")
 
     _LOGGER.info(
         "%s VLAN setting %s removed from port %s",
@@ -214,43 +538,87 @@ def remove_ovs_vlan_port(parent: str, vlan_type: str, vid: str) -> bool:
     return True
 
 
-def create_bridge(bridge_name: str) -> None:
+@timed(OVS_OPERATION_SECONDS)
+async def create_bridge(bridge_name: str) -> None:
     """Create an OVS or Linux bridge.
 
     :param bridge_name: Name of the bridge to create.
     :type bridge_name: str
     """
-    bridge_exists_cmd = (
-        f"ovs-vsctl br-exists {bridge_name}"
-        if not USE_LINUX_BRIDGE
-        else f"brctl show {bridge_name}"
-    )
-    bridge_check = run_command(bridge_exists_cmd, check=False)
+    links = get_link_backend()
+    if USE_LINUX_BRIDGE:
+        link = links.link(bridge_name)
+        exists = link is not None and link.kind == "bridge"
+    else:
+        exists = await get_ovs_backend().bridge_exists(bridge_name)
 
     # If the bridge exists, no need to create it again
-    if bridge_check.returncode == 0:
+    if exists:
         _LOGGER.debug("Bridge %s already exists", bridge_name)
         return
 
     # This means that the interface was part of the wrong module
     # eg. if the interface was part of linux when meant to be part of OVS
-    if run_command(f"ip link show dev {bridge_name}", check=False).returncode == 0:
+    if (link := links.link(bridge_name)) is not None:
         _LOGGER.debug("Bridge %s already exists but not on right module", bridge_name)
-        run_command(f"ip link set {bridge_name} down")
-        run_command(f"ovs-vsctl del-br {bridge_name}", check=False)
-        run_command(f"brctl delbr {bridge_name}", check=False)
+        links.set_link(bridge_name, up=False)
+        if USE_LINUX_BRIDGE:
+            await run_command(f"ovs-vsctl del-br {bridge_name}", check=False)
+        else:
+            await get_ovs_backend().del_bridge(bridge_name)
+        if link.kind == "bridge":
+            links.delete_link(bridge_name)
         _LOGGER.info("Removed redundant Bridge %s", bridge_name)
 
     # Bridge doesn't exist, create it
-    cmd, check = f"ovs-vsctl --may-exist add-br {bridge_name}", True
     if USE_LINUX_BRIDGE:
-        cmd, check = f"brctl addbr {bridge_name}", False
-    run_command(cmd, check)
-    run_command(f"ip link set {bridge_name} up")
-    _LOGGER.info("Bridge %s created and brought up", bridge_name)
+        links.add_bridge(bridge_name)
+    else:
+        await get_ovs_backend().add_bridge(bridge_name)
+
+    async def _bring_up() -> None:
+        links.set_link(bridge_name, up=True)
+        _LOGGER.info("Bridge %s created and brought up", bridge_name)
+
+    # The OVS internal port only shows up once the bridge is committed
+    await run_after_commit(_bring_up)
+
+
+async def delete_bridge(bridge_name: str) -> None:
+    """Delete an OVS or Linux bridge, its ports are released.
+
+    :param bridge_name: Name of the bridge to delete.
+    :type bridge_name: str
+    """
+    links = get_link_backend()
+    if USE_LINUX_BRIDGE:
+        if (link := links.link(bridge_name)) is not None and link.kind == "bridge":
+            links.delete_link(bridge_name)
+    elif await get_ovs_backend().bridge_exists(bridge_name):
+        await get_ovs_backend().del_bridge(bridge_name)
+    _LOGGER.info("Bridge %s deleted", bridge_name)
+
 
+async def remove_iface_from_bridge(bridge_name: str, iface: str) -> None:
+    """Release a host interface from a bridge, if it is a port of it.
 
-def add_iface_to_ovs_bridge(bridge_name: str, iface_info: IfaceInfoDict) -> None:
+    :param bridge_name: Name of the bridge.
+    :type bridge_name: str
+    :param iface: Name of the host interface.
+    :type iface: str
+    """
+    if USE_LINUX_BRIDGE:
+        links = get_link_backend()
+        bridge, port = links.link(bridge_name), links.link(iface)
+        if bridge is not None and port is not None and port.master == bridge.index:
+            links.set_link(iface, master="")
+    elif await get_ovs_backend().port_to_br(iface) == bridge_name:
+        await get_ovs_backend().del_port(iface)
+    _LOGGER.info("Interface %s removed from bridge %s", iface, bridge_name)
+
+
+@timed(OVS_OPERATION_SECONDS)
+async def add_iface_to_ovs_bridge(bridge_name: str, iface_info: IfaceInfoDict) -> None:
     """Add a parent/native interface to an OVS bridge.
 
     Use this to allow access to public network via your OVS bridge.
@@ -267,26 +635,33 @@ def add_iface_to_ovs_bridge(bridge_name: str, iface_info: IfaceInfoDict) -> None
     db_cache = get_db(bridge_name)
     iface_cache = db_cache.setdefault(parent, {})
 
-    check = run_command(f"ovs-vsctl port-to-br {parent}", check=False)
-    if check.stdout.strip() != bridge_name:
+    backend = get_ovs_backend()
+    if await backend.port_to_br(parent) != bridge_name:
         _LOGGER.debug("Parent %s not part of OVS bridge %s", parent, bridge_name)
-        run_command(f"ovs-vsctl --if-exists del-port {parent}", check=False)
-        run_command(f"ovs-vsctl --may-exist add-port {bridge_name} {parent}")
+        await backend.del_port(parent)
+        await backend.add_port(bridge_name, parent)
+        # The cached VLAN settings were lost with the old port
+        iface_cache.clear()
         _LOGGER.debug("parent %s up for OVS bridge %s", parent, bridge_name)
 
     for key in ["trunk", "native", "vlan"]:
         value = iface_info.get(key, "")
-        cleaned_something = remove_ovs_vlan_port(parent, key, str(value))
+        if key == "vlan" and not value and iface_info.get("native"):
+            continue  # The tag holds the native VLAN
+        cleaned_something = await remove_ovs_vlan_port(parent, key, str(value))
         if value and value != iface_cache.get(key, ""):
             iface_cache[key] = value
             if cleaned_something:
-                configure_ovs_vlan_port(parent, key, str(value))
+                await configure_ovs_vlan_port(parent, key, str(value))
                 _LOGGER.info(
                     "New %s %s setting applied for parent %s", key, value, parent
                 )
 
 
-def add_iface_to_linux_bridge(bridge_name: str, iface_info: IfaceInfoDict) -> None:
+@timed(OVS_OPERATION_SECONDS)
+async def add_iface_to_linux_bridge(
+    bridge_name: str, iface_info: IfaceInfoDict
+) -> None:
     """Add a parent/native interface to an Linux bridge.
 
     Use this to allow access to public network via your Linux bridge.
@@ -302,22 +677,230 @@ def add_iface_to_linux_bridge(bridge_name: str, iface_info: IfaceInfoDict) -> No
     db_cache = get_db(bridge_name)
     iface_cache = db_cache.setdefault(parent, {})
 
-    check = run_command(f"ip -o link show master {bridge_name}", check=False)
-    if parent not in check.stdout:
+    links = get_link_backend()
+    bridge = links.link(bridge_name)
+    port = links.link(parent)
+    if bridge is None or port is None or port.master != bridge.index:
         _LOGGER.debug("Parent %s not part of Linux bridge %s", parent, bridge_name)
-        run_command(f"ip link set dev {parent} nomaster")
-        run_command(f"brctl addif {bridge_name} {parent}")
-
-    for key in ["trunk", "native", "vlan"]:
+        links.set_link(parent, master="")
+        links.set_link(parent, master=bridge_name)
+        iface_cache.clear()
+
+    keys = ["trunk", "native", "vlan"]
+    # VLANs of one key must not be removed when applying another
+    expected = ",".join(str(iface_info[key]) for key in keys if iface_info.get(key))
+    for key in keys:
         if (value := iface_info.get(key, "")) and value != iface_cache.get(key, ""):
             _LOGGER.info("New %s %s setting applied for parent %s", key, value, parent)
             iface_cache[key] = value
-            if remove_linux_bridge_vlan(parent, str(value)):
-                configure_lxbr_vlan_port(bridge_name, parent, key, str(value))
+            remove_linux_bridge_vlan(parent, expected)
+            configure_lxbr_vlan_port(bridge_name, parent, key, str(value))
 
 
-def check_interface_exists(
-    bridge: str, container_name: str, iface: str, util: str
+def lxbr_port_name(container_name: str, iface: str) -> str:
+    """Return the Linux bridge port name of a container interface.
+
+    The name is derived the same way lxbr-docker did, so that ports
+    attached by earlier releases are still found.
+
+    :param container_name: Name of the container.
+    :type container_name: str
+    :param iface: Name of the interface inside the container.
+    :type iface: str
+    :return: bridge side veth name
+    :rtype: str
+    """
+    digest = hashlib.sha1(f"{container_name}{iface}\n".encode()).hexdigest()  # noqa: S324
+    return f"{digest[:13]}_l"
+
+
+async def get_container_port(container_name: str, iface: str) -> str:
+    """Return the bridge port attached to a container interface.
+
+    :param container_name: Name of the container.
+    :type container_name: str
+    :param iface: Name of the interface inside the container.
+    :type iface: str
+    :return: port name, empty if there is none
+    :rtype: str
+    """
+    if USE_LINUX_BRIDGE:
+        port = lxbr_port_name(container_name, iface)
+        return port if veth_exists(port) else ""
+    return await get_ovs_backend().find_port(
+        {"container_id": container_name, "container_iface": iface}
+    )
+
+
+def _configure_container_end(netns_fd: int, info: ContainerInfoDict) -> None:
+    """Bring up and address the container end of a veth pair.
+
+    The container's network namespace is entered once, all settings are
+    applied over a netlink socket opened inside it.
+
+    :param netns_fd: network namespace file descriptor of the container
+    :type netns_fd: int
+    :param info: Container interface details, with the addresses to assign
+    :type info: ContainerInfoDict
+    """
+    iface = info["iface"]
+    container = get_link_backend().for_netns(netns_fd)
+    try:
+        container.set_link(iface, up=True)
+        if ipaddr := info.get("ipaddress"):
+            container.add_address(iface, ipaddr)
+        if ip6addr := info.get("ip6address"):
+            container.enable_ipv6(iface)
+            container.add_address(iface, ip6addr)
+        for key in ("gateway", "gateway6"):
+            if gateway := info.get(key):
+                container.add_default_route(str(gateway))
+    finally:
+        container.close()
+
+
+@timed(OVS_OPERATION_SECONDS)
+async def add_container_port(
+    container_name: str, info: ContainerInfoDict, netns_fd: int
+) -> None:
+    """Connect a new interface of a container to a bridge.
+
+    In-process equivalent of ``ovs-docker add-port`` and ``lxbr-docker add-port``.
+    The container end of the veth pair is created directly inside the container
+    under its final name. On OVS the bridge end is added together with its
+    external_ids and VLAN settings, as part of the pending transaction.
+
+    :param container_name: Name of the container.
+    :type container_name: str
+    :param info: Container interface details, with the addresses to assign
+    :type info: ContainerInfoDict
+    :param netns_fd: network namespace file descriptor of the container
+    :type netns_fd: int
+    :raises ValueError: if a port is already attached for the container interface
+    """
+    bridge = info["bridge"]  # Mandatory
+    iface = info["iface"]  # Mandatory
+    if await get_container_port(container_name, iface):
+        msg = f"Port already attached for {container_name}:{iface}"
+        raise ValueError(msg)
+
+    await create_bridge(bridge)
+
+    if USE_LINUX_BRIDGE:
+        port = lxbr_port_name(container_name, iface)
+    else:
+        port = f"{uuid4().hex[:13]}_l"
+    links = get_link_backend()
+    links.add_veth(
+        port, iface, peer_netns=netns_fd, peer_address=info.get("macaddress")
+    )
+
+    try:
+        _configure_container_end(netns_fd, info)
+        if USE_LINUX_BRIDGE:
+            links.set_link(port, up=True, master=bridge)
+            for vlan_mode in ("vlan", "trunk"):
+                if value := info.get(vlan_mode):
+                    configure_lxbr_vlan_port(bridge, port, vlan_mode, str(value))
+        else:
+            columns = {"tag": info.get("vlan"), "trunks": info.get("trunk")}
+            await get_ovs_backend().add_port(
+                bridge,
+                port,
+                {"container_id": container_name, "container_iface": iface},
+                **{column: str(value) for column, value in columns.items() if value},
+            )
+            links.set_link(port, up=True)
+    except (OSError, ValueError):
+        # Deleting the bridge end removes the container end as well
+        links.delete_link(port)
+        raise
+
+
+@timed(OVS_OPERATION_SECONDS)
+async def del_container_port(container_name: str, iface: str) -> None:
+    """Disconnect a container interface from its bridge.
+
+    In-process equivalent of ``ovs-docker del-port`` and ``lxbr-docker del-port``.
+    Deleting the bridge end of the veth pair removes the container end too.
+
+    :param container_name: Name of the container.
+    :type container_name: str
+    :param iface: Name of the interface inside the container.
+    :type iface: str
+    """
+    if not (port := await get_container_port(container_name, iface)):
+        return
+    if not USE_LINUX_BRIDGE:
+        await get_ovs_backend().del_port(port)
+    get_link_backend().delete_link(port)
+
+
+def get_container_links(netns_fd: int) -> dict[str, Link]:
+    """Return all interfaces of a container, read in a single netlink dump.
+
+    Nothing is executed inside the container, so this works for images
+    without the ip binary as well.
+
+    :param netns_fd: network namespace file descriptor of the container
+    :type netns_fd: int
+    :return: container interfaces by name
+    :rtype: dict[str, Link]
+    """
+    container = get_link_backend().for_netns(netns_fd)
+    try:
+        return {link.name: link for link in container.links()}
+    finally:
+        container.close()
+
+
+async def take_snapshot(netns_fds: dict[str, int]) -> Snapshot:
+    """Read the bridges, ports and interfaces of the host and containers in bulk.
+
+    A single OVSDB transaction (or ovs-vsctl call) reads all bridges and
+    ports, a netlink dump each the host links, addresses and Linux bridge
+    VLANs, and a netlink dump per container its interfaces.
+
+    :param netns_fds: network namespace of each running container
+    :type netns_fds: dict[str, int]
+    :return: snapshot of the network
+    :rtype: Snapshot
+    """
+    backend = _get_link_backend()
+    links = {link.name: link for link in backend.links()}
+    names = {link.index: link.name for link in links.values()}
+
+    addresses: dict[str, list[str]] = {}
+    for index, addr in backend.addresses():
+        if (name := names.get(index)) is not None:
+            addresses.setdefault(name, []).append(addr)
+
+    ovs, vlans = None, {}
+    if USE_LINUX_BRIDGE:
+        vlans = {
+            names[index]: {str(vid) for vid in vids}
+            for index, vids in backend.all_bridge_vlans().items()
+            if index in names
+        }
+    else:
+        ovs = await _get_ovs_backend().dump()
+
+    return Snapshot(
+        ovs=ovs,
+        links=links,
+        addresses=addresses,
+        vlans=vlans,
+        containers={name: get_container_links(fd) for name, fd in netns_fds.items()},
+    )
+
+
+@timed(OVS_OPERATION_SECONDS)
+async def check_interface_exists(
+    bridge: str,
+    container_name: str,
+    iface: str,
+    netns_fd: int,
+    links: dict[str, Link],
 ) -> bool:
     """Check if the interface exists inside the container and handle cleanup if necessary.
 
@@ -327,18 +910,21 @@ def check_interface_exists(
     :type container_name: str
     :param iface: Name of the interface.
     :type iface: str
-    :param util: Utility command (ovs-docker or lxbr-docker).
-    :type util: str
+    :param netns_fd: network namespace file descriptor of the container
+    :type netns_fd: int
+    :param links: interfaces of the container, see get_container_links()
+    :type links: dict[str, Link]
     :return: True if the interface exists and was already connected, False otherwise.
     :rtype: bool
     """
-    check = run_command(
-        f"docker exec {container_name} ip link show {iface}", check=False
-    )
-    if check.returncode == 0:
-        _LOGGER.debug("Interface %s exists inside container %s.", iface, container_name)
-        check = run_command(f"{util} get-port {container_name} {iface}", check=False)
-        if bool(check.stdout.strip()):
+    if (link := links.get(iface)) is not None:
+        _LOGGER.debug(
+            "Interface %s exists inside container %s, state %s.",
+            iface,
+            container_name,
+            link.operstate,
+        )
+        if await get_container_port(container_name, iface):
             _LOGGER.debug("Interface %s exists on bridge.", iface)
             return True
 
@@ -351,10 +937,14 @@ def check_interface_exists(
             iface,
             container_name,
         )
-        run_command(f"docker exec {container_name} ip link del {iface}", check=False)
+        container = get_link_backend().for_netns(netns_fd)
+        try:
+            container.delete_link(iface)
+        finally:
+            container.close()
 
     _LOGGER.info("Container: %s is missing interface %s!!", container_name, iface)
-    run_command(f"{util} del-port {bridge} {iface} {container_name}", check=False)
+    await del_container_port(container_name, iface)
     _LOGGER.info(
         "Removed redundant pair of %s for container: %s from bridge: %s",
         iface,
@@ -364,14 +954,17 @@ def check_interface_exists(
     return False
 
 
-def configure_container_vlan(container_name: str, info: ContainerInfoDict) -> None:
+@timed(OVS_OPERATION_SECONDS)
+async def configure_container_vlan(
+    container_name: str, info: ContainerInfoDict
+) -> None:
     """Configure VLAN or trunk settings for a container's interface on a bridge.
 
     This function configures the VLAN or trunk settings for a container's interface
     (`iface`) on a given bridge (`bridge`). The settings are determined from the
     `info` dictionary, which should include the VLAN or trunk configuration. The
-    function will apply the specified VLAN or trunk mode to the interface using the
-    appropriate tool (`ovs-docker` or `lxbr-docker`), depending on the system's bridge setup.
+    function will apply the specified VLAN or trunk mode to the bridge port
+    of the interface, like ``ovs-docker set-vlan``/``set-trunk`` used to.
 
     :param container_name: The name of the container whose interface is being configured.
     :type container_name: str
@@ -381,8 +974,8 @@ def configure_container_vlan(container_name: str, info: ContainerInfoDict) -> No
                  - `vlan`: Optional. The VLAN ID to set (str or int).
                  - `trunk`: Optional. The trunk configuration to set (str).
     :type info: ContainerInfoDict
+    :raises ValueError: if no port is attached for the container interface
     """
-    util = "ovs-docker" if not USE_LINUX_BRIDGE else "lxbr-docker"
     bridge = info["bridge"]  # Mandatory
     iface = info["iface"]  # Mandatory
     cc_cache = get_db(bridge)[container_name][iface]
@@ -391,12 +984,14 @@ def configure_container_vlan(container_name: str, info: ContainerInfoDict) -> No
             _LOGGER.debug(
                 "%s read for %s:%s is %s", vlan_mode, container_name, iface, value
             )
-            run(
-                f"{util} set-{vlan_mode} {bridge} {iface} {container_name} "
-                f"{value}".split(),
-                check=True,
-                capture_output=True,
-            )
+            if not (port := await get_container_port(container_name, iface)):
+                msg = f"No port attached for {container_name}:{iface}"
+                raise ValueError(msg)
+            if USE_LINUX_BRIDGE:
+                configure_lxbr_vlan_port(bridge, port, vlan_mode, str(value))
+            else:
+                column = "tag" if vlan_mode == "vlan" else "trunks"
+                await get_ovs_backend().set_port(port, **{column: str(value)})
             cc_cache["vlan_mode"] = value
             _LOGGER.info(
                 "%s set for %s:%s is %s", vlan_mode, container_name, iface, value
@@ -405,19 +1000,15 @@ def configure_container_vlan(container_name: str, info: ContainerInfoDict) -> No
 
 def check_sys_module() -> None:
     """Check if OVS module is installed."""
+    if USE_SIMULATION:
+        return
     if USE_LINUX_BRIDGE:
-        run_command("sysctl net.bridge.bridge-nf-call-iptables=0")
+        # sysctl net.bridge.bridge-nf-call-iptables=0
+        Path("/proc/sys/net/bridge/bridge-nf-call-iptables").write_text("0")
         return
 
-    lsmod_out = run(["/bin/lsmod"], check=True, capture_output=True)
-    try:
-        run(
-            ["grep", "openvswitch"],
-            check=True,
-            input=lsmod_out.stdout,
-            capture_output=True,
-        )
-
-    except CalledProcessError:
-        _LOGGER.exception("Openvswitch kernel modules need to be mounted from host!!")
+    # Same source as lsmod
+    modules = Path("/proc/modules").read_text(encoding="utf-8")
+    if not any(line.startswith("openvswitch ") for line in modules.splitlines()):
+        _LOGGER.error("Openvswitch kernel modules need to be mounted from host!!")
         sys.exit(1)
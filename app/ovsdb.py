@@ -0,0 +1,821 @@
+"""OVSDB management protocol client.
+
+This part implements the subset of the OVSDB JSON-RPC protocol (RFC 7047)
+used by the orchestrator, and an OVS backend performing bridge and port
+operations over a single persistent connection instead of forking
+ovs-vsctl for every read and write.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from app.trace import trace_command
+from app.utils import OVSDB_TIMEOUT, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Iterator
+
+_LOGGER = get_logger("ovsdb")
+
+OVS_DB = "Open_vSwitch"
+_CFG_POLL_INTERVAL = 0.01
+
+# Columns read by dump(), see ovs_state()
+BRIDGE_COLUMNS = ["name", "ports"]
+PORT_COLUMNS = ["_uuid", "name", "interfaces", "tag", "trunks", "vlan_mode"]
+INTERFACE_COLUMNS = ["_uuid", "external_ids"]
+
+# Port columns holding VLAN ids, OVSDB expects them as integers.
+_INTEGER_COLUMNS = ("tag", "trunks")
+
+# Bytes that matter to framing messages, outside and inside of strings.
+# Bytes of multi-byte UTF-8 characters never match them.
+_STRUCTURE = re.compile(rb'[{}"]')
+_STRING_END = re.compile(rb'["\\]')
+
+
+def _set(values: list[Any]) -> list[Any]:
+    """Encode a list as an OVSDB set.
+
+    :param values: set members
+    :type values: list[Any]
+    :return: OVSDB <set> notation
+    :rtype: list[Any]
+    """
+    return ["set", values]
+
+
+def _map(values: dict[str, str]) -> list[Any]:
+    """Encode a dict as an OVSDB map.
+
+    :param values: map entries
+    :type values: dict[str, str]
+    :return: OVSDB <map> notation
+    :rtype: list[Any]
+    """
+    return ["map", [[key, value] for key, value in values.items()]]
+
+
+def _atoms(value: Any) -> list[Any]:  # noqa: ANN401
+    """Decode an OVSDB column value into a list of atoms.
+
+    :param value: OVSDB <value> notation, either an atom or a <set>
+    :type value: Any
+    :return: list of atoms, empty for an empty set
+    :rtype: list[Any]
+    """
+    if isinstance(value, list) and value and value[0] == "set":
+        return value[1]
+    return [value]
+
+
+def _uuid(value: list[Any]) -> str:
+    """Decode an OVSDB <uuid>.
+
+    :param value: OVSDB <uuid> notation
+    :type value: list[Any]
+    :return: the UUID
+    :rtype: str
+    """
+    return str(value[1])
+
+
+def _map_atoms(value: Any) -> dict[str, str]:  # noqa: ANN401
+    """Decode an OVSDB <map> column value.
+
+    :param value: OVSDB <map> notation
+    :type value: Any
+    :return: map entries
+    :rtype: dict[str, str]
+    """
+    if isinstance(value, list) and value and value[0] == "map":
+        return {str(key): str(entry) for key, entry in value[1]}
+    return {}
+
+
+def ovs_state(
+    bridges: list[dict[str, Any]],
+    ports: list[dict[str, Any]],
+    interfaces: list[dict[str, Any]],
+) -> OvsState:
+    """Build the state of OVS from Bridge, Port and Interface rows.
+
+    :param bridges: Bridge rows, with the name and ports columns
+    :type bridges: list[dict[str, Any]]
+    :param ports: Port rows, with the _uuid, name, interfaces, tag,
+                  trunks and vlan_mode columns
+    :type ports: list[dict[str, Any]]
+    :param interfaces: Interface rows, with the _uuid and external_ids columns
+    :type interfaces: list[dict[str, Any]]
+    :return: bridges and ports
+    :rtype: OvsState
+    """
+    port_bridges = {
+        _uuid(uuid): row["name"] for row in bridges for uuid in _atoms(row["ports"])
+    }
+    external_ids = {
+        _uuid(row["_uuid"]): _map_atoms(row["external_ids"]) for row in interfaces
+    }
+    state = OvsState(bridges={row["name"] for row in bridges})
+    for row in ports:
+        if (bridge := port_bridges.get(_uuid(row["_uuid"]))) is None:
+            continue  # Not referenced by any bridge, garbage collected
+        ifaces = [_uuid(uuid) for uuid in _atoms(row["interfaces"])]
+        state.ports[row["name"]] = OvsPort(
+            name=row["name"],
+            bridge=bridge,
+            tag=[str(vid) for vid in _atoms(row["tag"])],
+            trunks=[str(vid) for vid in _atoms(row["trunks"])],
+            vlan_mode="".join(_atoms(row["vlan_mode"])),
+            external_ids=external_ids.get(ifaces[0], {}) if ifaces else {},
+        )
+    return state
+
+
+def _port_row(columns: dict[str, str]) -> dict[str, Any]:
+    """Convert ovs-vsctl style Port column settings into an OVSDB row.
+
+    :param columns: column name to value, e.g. {"trunks": "100,200"}
+    :type columns: dict[str, str]
+    :return: OVSDB row
+    :rtype: dict[str, Any]
+    """
+    row: dict[str, Any] = {}
+    for column, value in columns.items():
+        if column in _INTEGER_COLUMNS:
+            row[column] = _set([int(vid) for vid in str(value).split(",") if vid])
+        else:
+            row[column] = value
+    return row
+
+
+class _MessageFramer:
+    """Split a stream of JSON-RPC messages into complete messages.
+
+    Messages are framed by the depth of their braces, outside of strings.
+    The bytes received are scanned once, each message is decoded only once
+    it is complete.
+    """
+
+    def __init__(self) -> None:
+        """Start with an empty stream."""
+        self._buffer = bytearray()
+        self._scan = 0  # Where framing goes on
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Add received bytes, return the messages they complete.
+
+        :param data: bytes received
+        :type data: bytes
+        :return: complete messages, in order
+        :rtype: list[bytes]
+        """
+        buffer = self._buffer
+        buffer += data
+        messages = []
+        start = 0
+        while True:
+            if self._in_string:
+                if (match := _STRING_END.search(buffer, self._scan)) is None:
+                    self._scan = len(buffer)
+                    break
+                if match.group() == b"\\":
+                    if match.end() == len(buffer):
+                        # The escaped byte is yet to come
+                        self._scan = match.start()
+                        break
+                    self._scan = match.end() + 1
+                    continue
+                self._in_string = False
+            elif (match := _STRUCTURE.search(buffer, self._scan)) is None:
+                self._scan = len(buffer)
+                break
+            elif match.group() == b'"':
+                self._in_string = True
+            elif match.group() == b"{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    messages.append(bytes(buffer[start : match.end()]))
+                    start = match.end()
+            self._scan = match.end()
+        del buffer[:start]
+        self._scan -= start
+        return messages
+
+
+class OvsdbClient:
+    """Persistent asyncio JSON-RPC connection to ovsdb-server.
+
+    The connection is opened lazily and re-established on the next call
+    if ovsdb-server drops it. Echo requests from the server are answered
+    so that the session is kept alive.
+    """
+
+    def __init__(self, remote: str) -> None:
+        """Initialize the client.
+
+        :param remote: ovsdb-server remote, "unix:<path>" or "tcp:<host>:<port>"
+        :type remote: str
+        """
+        self._remote = remote
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task[None] | None = None
+        self._pending: dict[int, asyncio.Future[Any]] = {}
+        self._ids = itertools.count()
+        self._connect_lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        """Open the connection to ovsdb-server.
+
+        :raises ValueError: if the remote syntax is not supported
+        """
+        kind, _, address = self._remote.partition(":")
+        if kind == "unix":
+            reader, writer = await asyncio.open_unix_connection(address)
+        elif kind == "tcp":
+            host, _, port = address.rpartition(":")
+            reader, writer = await asyncio.open_connection(host, int(port))
+        else:
+            msg = f"Unsupported OVSDB remote: {self._remote}"
+            raise ValueError(msg)
+
+        self._writer = writer
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+        _LOGGER.info("Connected to OVSDB at %s", self._remote)
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        """Split the incoming stream into JSON-RPC messages and dispatch them.
+
+        :param reader: stream connected to ovsdb-server
+        :type reader: asyncio.StreamReader
+        """
+        framer = _MessageFramer()
+        try:
+            while data := await reader.read(65536):
+                for message in framer.feed(data):
+                    self._dispatch(json.loads(message))
+        except ValueError:
+            _LOGGER.exception("Malformed message from OVSDB, disconnecting")
+        finally:
+            self._disconnect()
+
+    def _dispatch(self, message: dict[str, Any]) -> None:
+        """Handle a single message received from ovsdb-server.
+
+        :param message: decoded JSON-RPC message
+        :type message: dict[str, Any]
+        """
+        if message.get("method") == "echo":
+            self._send(
+                {"id": message["id"], "result": message["params"], "error": None}
+            )
+            return
+
+        future = self._pending.pop(message.get("id", -1), None)
+        if future is None or future.done():
+            return  # Notification or a reply to a request that timed out
+        if error := message.get("error"):
+            future.set_exception(ValueError(f"OVSDB request failed: {error}"))
+        else:
+            future.set_result(message.get("result"))
+
+    def _disconnect(self) -> None:
+        """Drop the connection and fail all requests still waiting for a reply."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionResetError("OVSDB connection lost"))
+        self._pending.clear()
+
+    def _send(self, message: dict[str, Any]) -> None:
+        """Write a JSON-RPC message to the connection.
+
+        :param message: JSON-RPC message
+        :type message: dict[str, Any]
+        """
+        if self._writer is not None:
+            self._writer.write(json.dumps(message).encode())
+
+    async def call(self, method: str, params: list[Any]) -> Any:  # noqa: ANN401
+        """Send a JSON-RPC request and wait for its reply.
+
+        :param method: JSON-RPC method
+        :type method: str
+        :param params: JSON-RPC parameters
+        :type params: list[Any]
+        :return: result of the request
+        :rtype: Any
+        """
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                await self._connect()
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._send({"method": method, "params": params, "id": request_id})
+        try:
+            return await asyncio.wait_for(future, OVSDB_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def transact(self, *operations: dict[str, Any]) -> list[dict[str, Any]]:
+        """Run operations as a single atomic OVSDB transaction.
+
+        :param operations: OVSDB transaction operations
+        :type operations: dict[str, Any]
+        :return: per-operation results
+        :rtype: list[dict[str, Any]]
+        :raises ValueError: if any of the operations or the commit fails
+        """
+        argv = ["transact"]
+        argv.extend(f"{op['op']} {op.get('table', '')}".strip() for op in operations)
+        with trace_command("ovsdb", argv) as trace:
+            results = await self.call("transact", [OVS_DB, *operations])
+            errors = [result for result in results if result and "error" in result]
+            trace.returncode = 1 if errors else 0
+            if errors:
+                msg = f"OVSDB transaction failed: {errors}"
+                raise ValueError(msg)
+        return results
+
+    async def select(
+        self, table: str, where: list[Any], columns: list[str]
+    ) -> list[dict[str, Any]]:
+        """Read rows from a table.
+
+        :param table: table name
+        :type table: str
+        :param where: OVSDB conditions
+        :type where: list[Any]
+        :param columns: columns to fetch
+        :type columns: list[str]
+        :return: matching rows
+        :rtype: list[dict[str, Any]]
+        """
+        (result,) = await self.transact(
+            {"op": "select", "table": table, "where": where, "columns": columns}
+        )
+        return result["rows"]
+
+
+@dataclass
+class OvsPort:
+    """A Port row, with the external_ids of its interface."""
+
+    name: str
+    bridge: str
+    tag: list[str] = field(default_factory=list)
+    trunks: list[str] = field(default_factory=list)
+    vlan_mode: str = ""
+    external_ids: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class OvsState:
+    """All bridges and ports of OVS, read at once."""
+
+    bridges: set[str] = field(default_factory=set)
+    ports: dict[str, OvsPort] = field(default_factory=dict)
+
+
+@dataclass
+class PendingWrites:
+    """OVS writes collected for a single transaction.
+
+    Also tracks the bridges and ports created or removed by the pending
+    writes, so that reads issued before the commit see them.
+    """
+
+    operations: list[Any] = field(default_factory=list)
+    bridges: set[str] = field(default_factory=set)
+    # Port name to the bridge it will be on after the commit, empty if removed
+    ports: dict[str, str] = field(default_factory=dict)
+    # Port name to the external_ids of its interface, for the ports added
+    external_ids: dict[str, dict[str, str]] = field(default_factory=dict)
+    # Index of update operations that must match a row, with the error to raise
+    updates: dict[int, str] = field(default_factory=dict)
+    names: Iterator[int] = field(default_factory=itertools.count)
+    # Actions to run once the writes are applied
+    after_commit: list[Callable[[], Awaitable[None]]] = field(default_factory=list)
+
+    def reset(self) -> None:
+        """Forget the collected writes, once committed."""
+        self.operations = []
+        self.updates = {}
+        self.bridges.clear()
+        self.ports.clear()
+        self.external_ids.clear()
+
+    def add_port(self, bridge: str, port: str, external_ids: dict[str, str]) -> None:
+        """Track a port added by the pending writes.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :param port: port name
+        :type port: str
+        :param external_ids: external_ids of its interface
+        :type external_ids: dict[str, str]
+        """
+        self.ports[port] = bridge
+        self.external_ids[port] = dict(external_ids)
+
+    def del_port(self, port: str) -> None:
+        """Track a port removed by the pending writes.
+
+        :param port: port name
+        :type port: str
+        """
+        self.ports[port] = ""
+        self.external_ids.pop(port, None)
+
+    def find_port(self, external_ids: dict[str, str], committed: list[str]) -> str:
+        """Return the port whose interface has the given external_ids.
+
+        :param external_ids: external_ids the interface must include
+        :type external_ids: dict[str, str]
+        :param committed: ports matching them before the pending writes
+        :type committed: list[str]
+        :return: port name, empty if there is none once the writes are applied
+        :rtype: str
+        """
+        for port, port_ids in self.external_ids.items():
+            if external_ids.items() <= port_ids.items():
+                return port
+        # Ports removed, or added again, by the pending writes are known here
+        return next((port for port in committed if port not in self.ports), "")
+
+
+OVS_TRANSACTION: ContextVar[PendingWrites | None] = ContextVar(
+    "OVS_TRANSACTION", default=None
+)
+
+
+class OvsdbBackend:
+    """OVS bridge and port operations over the OVSDB management protocol.
+
+    Implements the same operations as the ovs-vsctl backend in ``ovs_lib``.
+    Like ovs-vsctl, every write waits until ovs-vswitchd has applied it,
+    unless the writes are collected in a transaction opened by
+    ``ovs_lib.ovs_transaction()``.
+    """
+
+    def __init__(self, client: OvsdbClient) -> None:
+        """Initialize the backend.
+
+        :param client: connection to ovsdb-server
+        :type client: OvsdbClient
+        """
+        self._client = client
+
+    async def commit(self) -> None:
+        """Apply all collected writes as a single transaction.
+
+        :raises ValueError: if an update did not match any port
+        """
+        if (pending := OVS_TRANSACTION.get()) is None or not pending.operations:
+            return
+        operations, updates = pending.operations, pending.updates
+        pending.reset()
+
+        results = await self._commit(*operations)
+        for index, error in updates.items():
+            if not results[index]["count"]:
+                raise ValueError(error)
+
+    async def _write(self, *operations: dict[str, Any], error: str = "") -> None:
+        """Apply write operations, or collect them if a transaction is open.
+
+        :param operations: OVSDB transaction operations
+        :type operations: dict[str, Any]
+        :param error: Optional, error raised if the first operation, an
+                      update, does not match any row
+        :type error: str
+        :raises ValueError: if the update did not match any row
+        """
+        if (pending := OVS_TRANSACTION.get()) is not None:
+            if error:
+                pending.updates[len(pending.operations)] = error
+            pending.operations.extend(operations)
+            return
+
+        results = await self._commit(*operations)
+        if error and not results[0]["count"]:
+            raise ValueError(error)
+
+    async def _commit(self, *operations: dict[str, Any]) -> list[dict[str, Any]]:
+        """Run a write transaction and wait for ovs-vswitchd to apply it.
+
+        :param operations: OVSDB transaction operations
+        :type operations: dict[str, Any]
+        :return: per-operation results
+        :rtype: list[dict[str, Any]]
+        """
+        results = await self._client.transact(
+            *operations,
+            {
+                "op": "mutate",
+                "table": OVS_DB,
+                "where": [],
+                "mutations": [["next_cfg", "+=", 1]],
+            },
+            {"op": "select", "table": OVS_DB, "where": [], "columns": ["next_cfg"]},
+        )
+        await self._wait_for_cfg(results[-1]["rows"][0]["next_cfg"])
+        return results
+
+    async def _wait_for_cfg(self, next_cfg: int) -> None:
+        """Wait until ovs-vswitchd has reconfigured up to the given sequence number.
+
+        :param next_cfg: configuration sequence number to wait for
+        :type next_cfg: int
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OVSDB_TIMEOUT
+        while loop.time() < deadline:
+            rows = await self._client.select(OVS_DB, [], ["cur_cfg"])
+            if rows[0]["cur_cfg"] >= next_cfg:
+                return
+            await asyncio.sleep(_CFG_POLL_INTERVAL)
+        _LOGGER.warning("ovs-vswitchd did not apply configuration %s in time", next_cfg)
+
+    @staticmethod
+    def _uuid_name(prefix: str) -> str:
+        """Return a uuid-name that is unique within the current transaction.
+
+        :param prefix: readable prefix
+        :type prefix: str
+        :return: uuid-name
+        :rtype: str
+        """
+        if (pending := OVS_TRANSACTION.get()) is None:
+            return prefix
+        return f"{prefix}{next(pending.names)}"
+
+    async def _port_uuid(self, port: str) -> list[Any] | None:
+        """Return the UUID of a port.
+
+        :param port: port name
+        :type port: str
+        :return: OVSDB <uuid> of the port, None if it does not exist
+        :rtype: list[Any] | None
+        """
+        rows = await self._client.select("Port", [["name", "==", port]], ["_uuid"])
+        return rows[0]["_uuid"] if rows else None
+
+    async def dump(self) -> OvsState:
+        """Read all bridges and ports in a single transaction.
+
+        Writes pending in the current transaction are not included.
+
+        :return: committed state of OVS
+        :rtype: OvsState
+        """
+        bridges, ports, interfaces = await self._client.transact(
+            {"op": "select", "table": "Bridge", "where": [], "columns": BRIDGE_COLUMNS},
+            {"op": "select", "table": "Port", "where": [], "columns": PORT_COLUMNS},
+            {
+                "op": "select",
+                "table": "Interface",
+                "where": [],
+                "columns": INTERFACE_COLUMNS,
+            },
+        )
+        return ovs_state(bridges["rows"], ports["rows"], interfaces["rows"])
+
+    async def bridge_exists(self, bridge: str) -> bool:
+        """Check if a bridge exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :return: True if the bridge exists
+        :rtype: bool
+        """
+        if (pending := OVS_TRANSACTION.get()) and bridge in pending.bridges:
+            return True
+        return bool(
+            await self._client.select("Bridge", [["name", "==", bridge]], ["_uuid"])
+        )
+
+    async def add_bridge(self, bridge: str) -> None:
+        """Create a bridge with its internal port, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        if await self.bridge_exists(bridge):
+            return
+        iface, port, row = (self._uuid_name(name) for name in ("iface", "port", "br"))
+        await self._write(
+            {
+                "op": "insert",
+                "table": "Interface",
+                "row": {"name": bridge, "type": "internal"},
+                "uuid-name": iface,
+            },
+            {
+                "op": "insert",
+                "table": "Port",
+                "row": {"name": bridge, "interfaces": ["named-uuid", iface]},
+                "uuid-name": port,
+            },
+            {
+                "op": "insert",
+                "table": "Bridge",
+                "row": {"name": bridge, "ports": ["named-uuid", port]},
+                "uuid-name": row,
+            },
+            {
+                "op": "mutate",
+                "table": OVS_DB,
+                "where": [],
+                "mutations": [["bridges", "insert", ["named-uuid", row]]],
+            },
+        )
+        if pending := OVS_TRANSACTION.get():
+            pending.bridges.add(bridge)
+
+    async def del_bridge(self, bridge: str) -> None:
+        """Delete a bridge with all its ports, if it exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        rows = await self._client.select("Bridge", [["name", "==", bridge]], ["_uuid"])
+        if not rows:
+            return
+        # Bridge, Port and Interface rows are garbage collected once unreferenced
+        await self._write(
+            {
+                "op": "mutate",
+                "table": OVS_DB,
+                "where": [],
+                "mutations": [["bridges", "delete", rows[0]["_uuid"]]],
+            }
+        )
+
+    async def port_to_br(self, port: str) -> str:
+        """Return the bridge a port belongs to.
+
+        :param port: port name
+        :type port: str
+        :return: bridge name, empty if the port does not exist
+        :rtype: str
+        """
+        if (pending := OVS_TRANSACTION.get()) and port in pending.ports:
+            return pending.ports[port]
+        if (uuid := await self._port_uuid(port)) is None:
+            return ""
+        rows = await self._client.select(
+            "Bridge", [["ports", "includes", uuid]], ["name"]
+        )
+        return rows[0]["name"] if rows else ""
+
+    async def add_port(
+        self,
+        bridge: str,
+        port: str,
+        external_ids: dict[str, str] | None = None,
+        **columns: str,
+    ) -> None:
+        """Add a port to a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :param port: port (and interface) name
+        :type port: str
+        :param external_ids: Optional, external_ids of the interface
+        :type external_ids: dict[str, str] | None
+        :param columns: Optional, Port columns e.g. tag="100"
+        :type columns: str
+        """
+        if await self.port_to_br(port):
+            return
+        iface, row = self._uuid_name("iface"), self._uuid_name("port")
+        await self._write(
+            {
+                "op": "insert",
+                "table": "Interface",
+                "row": {"name": port, "external_ids": _map(external_ids or {})},
+                "uuid-name": iface,
+            },
+            {
+                "op": "insert",
+                "table": "Port",
+                "row": {
+                    "name": port,
+                    "interfaces": ["named-uuid", iface],
+                    **_port_row(columns),
+                },
+                "uuid-name": row,
+            },
+            {
+                "op": "mutate",
+                "table": "Bridge",
+                "where": [["name", "==", bridge]],
+                "mutations": [["ports", "insert", ["named-uuid", row]]],
+            },
+        )
+        if pending := OVS_TRANSACTION.get():
+            pending.add_port(bridge, port, external_ids or {})
+
+    async def del_port(self, port: str) -> None:
+        """Remove a port from its bridge, if it exists.
+
+        :param port: port name
+        :type port: str
+        """
+        if (pending := OVS_TRANSACTION.get()) and not pending.ports.get(port, True):
+            return
+        if (uuid := await self._port_uuid(port)) is None:
+            return
+        await self._write(
+            {
+                "op": "mutate",
+                "table": "Bridge",
+                "where": [["ports", "includes", uuid]],
+                "mutations": [["ports", "delete", uuid]],
+            }
+        )
+        if pending:
+            pending.del_port(port)
+
+    async def get_port_vlans(self, port: str, column: str) -> list[str]:
+        """Return the VLAN ids held in a Port column.
+
+        :param port: port name
+        :type port: str
+        :param column: "tag" or "trunks"
+        :type column: str
+        :return: VLAN ids, empty if unset or if the port does not exist
+        :rtype: list[str]
+        """
+        if (pending := OVS_TRANSACTION.get()) and port in pending.ports:
+            return []  # Port is (re)created by the pending transaction
+        rows = await self._client.select("Port", [["name", "==", port]], [column])
+        return [str(vid) for vid in _atoms(rows[0][column])] if rows else []
+
+    async def set_port(self, port: str, **columns: str) -> None:
+        """Set columns of a port.
+
+        :param port: port name
+        :type port: str
+        :param columns: Port columns e.g. vlan_mode="access", tag="100"
+        :type columns: str
+        """
+        await self._write(
+            {
+                "op": "update",
+                "table": "Port",
+                "where": [["name", "==", port]],
+                "row": _port_row(columns),
+            },
+            error=f"No port named {port}",
+        )
+
+    async def clear_port(self, port: str, column: str) -> None:
+        """Clear a set column of a port.
+
+        :param port: port name
+        :type port: str
+        :param column: column name, e.g. "trunks"
+        :type column: str
+        """
+        await self._write(
+            {
+                "op": "update",
+                "table": "Port",
+                "where": [["name", "==", port]],
+                "row": {column: _set([])},
+            },
+            error=f"No port named {port}",
+        )
+
+    async def find_port(self, external_ids: dict[str, str]) -> str:
+        """Return the port whose interface has the given external_ids.
+
+        :param external_ids: external_ids the interface must include
+        :type external_ids: dict[str, str]
+        :return: port name, empty if there is none
+        :rtype: str
+        """
+        rows = await self._client.select(
+            "Interface", [["external_ids", "includes", _map(external_ids)]], ["name"]
+        )
+        ports = [row["name"] for row in rows]
+        if (pending := OVS_TRANSACTION.get()) is not None:
+            return pending.find_port(external_ids, ports)
+        return ports[0] if ports else ""
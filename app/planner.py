@@ -0,0 +1,532 @@
+"""Compare the configuration with the observed network and plan the changes.
+
+plan() compares a snapshot of the network, see take_snapshot(), with the
+configuration and returns the operations that bring the network in line,
+in the order they must be applied. A network that already matches the
+configuration results in an empty plan.
+
+plan_changes() compares two versions of the configuration instead, the
+network is not read. It plans the removal of the items dropped from the
+configuration and the application of those added or changed only.
+
+The operations are applied by the orchestrator, see apply_operation().
+Those that do not depend on each other, see plan_dependencies(), are
+applied concurrently.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from app.ovs_lib import lxbr_port_name
+from app.retry import item_key
+from app.utils import USE_LINUX_BRIDGE, get_db
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from app.netlink import Link
+    from app.snapshot import Snapshot
+    from app.utils import BridgeInfoDict, ContainerInfoDict, IfaceInfoDict
+
+# Operations removing what the configuration no longer holds, see plan_changes()
+REMOVE_CONTAINER_IFACE = "remove_container_iface"
+REMOVE_VETH_PAIR = "remove_veth_pair"
+DETACH_PARENT = "detach_parent"
+REMOVE_BRIDGE = "remove_bridge"
+REMOVAL_ACTIONS = (
+    REMOVE_CONTAINER_IFACE,
+    REMOVE_VETH_PAIR,
+    DETACH_PARENT,
+    REMOVE_BRIDGE,
+)
+
+# Operations, in the order a plan applies them
+REMOVE_STALE_PORT = "remove_stale_port"
+INIT_BRIDGE = "init_bridge"
+ATTACH_PARENT = "attach_parent"
+DETACH_CONTAINER_IFACE = "detach_container_iface"
+ATTACH_CONTAINER_IFACE = "attach_container_iface"
+CONFIGURE_CONTAINER_VLAN = "configure_container_vlan"
+CREATE_VETH_PAIR = "create_veth_pair"
+
+# VLAN a Linux bridge port is enslaved with
+DEFAULT_VID = "1"
+
+
+@dataclass(frozen=True)
+class Operation:
+    """A change to apply to the network."""
+
+    action: str
+    target: tuple[str, ...]  # e.g. (bridge,) or (container, iface)
+    reason: str
+
+    @property
+    def item(self) -> str:
+        """Return the bridge, container interface or veth pair operated on.
+
+        :return: item name, see item_key()
+        :rtype: str
+        """
+        if self.action in (INIT_BRIDGE, ATTACH_PARENT, DETACH_PARENT, REMOVE_BRIDGE):
+            return item_key("bridge", self.target[0])
+        if self.action in (CREATE_VETH_PAIR, REMOVE_VETH_PAIR):
+            return item_key("veth", self.target[0])
+        return item_key("container", *self.target)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the operation as reported by the API.
+
+        :return: operation details
+        :rtype: dict[str, Any]
+        """
+        return {
+            "action": self.action,
+            "target": list(self.target),
+            "reason": self.reason,
+        }
+
+
+def _vids(value: object) -> set[str]:
+    """Return the VLAN ids of a vlan, native or trunk setting.
+
+    :param value: setting, e.g. "100" or "100,200"
+    :type value: object
+    :return: VLAN ids
+    :rtype: set[str]
+    """
+    return set(re.findall(r"\d+", str(value or "")))
+
+
+def _port_drift(  # noqa: PLR0911
+    bridge: str, info: IfaceInfoDict, snapshot: Snapshot
+) -> str:
+    """Compare a host interface with its bridge membership and VLAN settings.
+
+    :param bridge: bridge the interface belongs to
+    :type bridge: str
+    :param info: interface details, as add_iface_to_ovs_bridge() applies them
+    :type info: IfaceInfoDict
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: what differs, empty if nothing does
+    :rtype: str
+    """
+    iface = info.get("iface", "")
+    if USE_LINUX_BRIDGE:
+        link, master = snapshot.links.get(iface), snapshot.links.get(bridge)
+        if link is None or master is None or link.master != master.index:
+            return f"not a port of {bridge}"
+        expected = set().union(
+            *(_vids(info.get(key)) for key in ("trunk", "native", "vlan"))
+        )
+        if expected and snapshot.vlans.get(iface, set()) != expected:
+            return "VLANs differ"
+        return ""
+
+    port = snapshot.ovs.ports.get(iface) if snapshot.ovs else None
+    if port is None or port.bridge != bridge:
+        return f"not a port of {bridge}"
+    # The access VLAN is applied after the native one
+    if set(port.tag) != _vids(info.get("vlan") or info.get("native")):
+        return f"tag {port.tag} differs"
+    if set(port.trunks) != _vids(info.get("trunk")):
+        return f"trunks {port.trunks} differ"
+    return ""
+
+
+def _bridge_drift(bridge: str, info: BridgeInfoDict, snapshot: Snapshot) -> str:
+    """Compare a bridge with its configuration, parents aside.
+
+    :param bridge: bridge name
+    :type bridge: str
+    :param info: bridge details
+    :type info: BridgeInfoDict
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: what differs, empty if nothing does
+    :rtype: str
+    """
+    link = snapshot.links.get(bridge)
+    if USE_LINUX_BRIDGE:
+        exists = link is not None and link.kind == "bridge"
+    else:
+        exists = snapshot.ovs is not None and bridge in snapshot.ovs.bridges
+    if not exists:
+        return "missing"
+
+    db_cache = get_db().get(bridge, {})
+    for range_key, address_key, version in (
+        ("iprange", "ipaddress", 4),
+        ("ip6range", "ip6address", 6),
+    ):
+        if info.get(range_key) != db_cache.get(range_key):
+            return f"{range_key} changed"
+        assigned = [
+            addr
+            for addr in snapshot.addresses.get(bridge, [])
+            if (interface := ipaddress.ip_interface(addr)).version == version
+            and not interface.is_link_local
+        ]
+        if ip_addr := info.get(address_key):
+            reserved = db_cache.get(f"{range_key}_hosts", {}).get(bridge)
+            if ip_addr != reserved or ip_addr not in assigned:
+                return f"{address_key} {ip_addr} not assigned"
+        elif assigned:
+            return f"unexpected addresses {assigned}"
+    return ""
+
+
+def _plan_bridge(
+    bridge: str, info: BridgeInfoDict, snapshot: Snapshot
+) -> list[Operation]:
+    """Plan the creation of a bridge and the attachment of its parents.
+
+    :param bridge: bridge name
+    :type bridge: str
+    :param info: bridge details
+    :type info: BridgeInfoDict
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: operations
+    :rtype: list[Operation]
+    """
+    if reason := _bridge_drift(bridge, info, snapshot):
+        # init_bridge() attaches the parents as well
+        return [Operation(INIT_BRIDGE, (bridge,), reason)]
+
+    operations = []
+    for parent_info in info.get("parents", []):
+        if (parent := parent_info.get("iface")) is None:
+            continue
+        if "usb:" in parent:
+            reason = "USB interface not resolved"
+        elif (link := snapshot.links.get(parent)) is None:
+            reason = "missing"
+        elif not link.up:
+            reason = "down"
+        else:
+            reason = _port_drift(bridge, parent_info, snapshot)
+        if reason:
+            operations.append(Operation(ATTACH_PARENT, (bridge, parent), reason))
+    return operations
+
+
+def _container_port_drift(  # noqa: PLR0911
+    container: str, info: ContainerInfoDict, snapshot: Snapshot
+) -> tuple[str, bool]:
+    """Compare the bridge port of a container interface with its configuration.
+
+    :param container: container name
+    :type container: str
+    :param info: container interface details
+    :type info: ContainerInfoDict
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: what differs, empty if nothing does, and whether the port has
+             to be re-created rather than have its VLANs set
+    :rtype: tuple[str, bool]
+    """
+    bridge, iface = info["bridge"], info["iface"]
+    vlan, trunk = _vids(info.get("vlan")), _vids(info.get("trunk"))
+    if USE_LINUX_BRIDGE:
+        port = lxbr_port_name(container, iface)
+        link, master = snapshot.links.get(port), snapshot.links.get(bridge)
+        if link is None:
+            return "no bridge port", False
+        if master is None or link.master != master.index:
+            return f"not a port of {bridge}", True
+        actual = snapshot.vlans.get(port, set())
+        if not (expected := vlan | trunk):
+            extra = actual - {DEFAULT_VID}
+            return (f"unexpected VLANs {sorted(extra)}", True) if extra else ("", False)
+        if actual != expected:
+            return "VLANs differ", bool(actual - expected - {DEFAULT_VID})
+        return "", False
+
+    ovs_port = snapshot.container_ports.get((container, iface))
+    if ovs_port is None or ovs_port.name not in snapshot.links:
+        return "no bridge port", False
+    if ovs_port.bridge != bridge:
+        return f"port of {ovs_port.bridge}", True
+    tag, trunks = set(ovs_port.tag), set(ovs_port.trunks)
+    if tag != vlan or trunks != trunk:
+        # configure_container_vlan() only sets the configured columns
+        return "VLANs differ", bool((tag and not vlan) or (trunks and not trunk))
+    return "", False
+
+
+def _plan_container(
+    container: str, links: dict[str, Link], snapshot: Snapshot, config: dict
+) -> list[Operation]:
+    """Plan the attachment of the interfaces of a running container.
+
+    :param container: container name
+    :type container: str
+    :param links: interfaces of the container
+    :type links: dict[str, Link]
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :param config: orchestrator configuration
+    :type config: dict
+    :return: operations
+    :rtype: list[Operation]
+    """
+    operations = []
+    for info in config["container"][container]:
+        target = (container, info["iface"])
+        if info["iface"] not in links:
+            operations.append(Operation(ATTACH_CONTAINER_IFACE, target, "missing"))
+            continue
+        reason, recreate = _container_port_drift(container, info, snapshot)
+        if not reason:
+            continue
+        if recreate:
+            operations.append(Operation(DETACH_CONTAINER_IFACE, target, reason))
+            operations.append(Operation(ATTACH_CONTAINER_IFACE, target, reason))
+        elif reason == "no bridge port":
+            operations.append(Operation(ATTACH_CONTAINER_IFACE, target, reason))
+        else:
+            operations.append(Operation(CONFIGURE_CONTAINER_VLAN, target, reason))
+    return operations
+
+
+def _plan_veth_pair(
+    prefix: str, translation: dict[str, str], snapshot: Snapshot
+) -> list[Operation]:
+    """Plan the creation of a VLAN translation veth pair.
+
+    :param prefix: veth pair prefix
+    :type prefix: str
+    :param translation: veth pair details
+    :type translation: dict[str, str]
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: operations
+    :rtype: list[Operation]
+    """
+    veth0, veth1 = f"v0_{prefix}", f"v1_{prefix}"
+    if veth0 not in snapshot.links:
+        return [Operation(CREATE_VETH_PAIR, (prefix,), "missing")]
+
+    key = "trunk" if translation.get("trunk", "no") == "yes" else "vlan"
+    source_vlan, dest_vlan = translation.get("map", ":").split(":")
+    bridge = translation["on"]
+    ends = [(veth0, source_vlan)] + ([(veth1, dest_vlan)] if dest_vlan else [])
+    for veth, vlan in ends:
+        if reason := _port_drift(bridge, {"iface": veth, key: vlan}, snapshot):
+            return [Operation(CREATE_VETH_PAIR, (prefix,), f"{veth} {reason}")]
+    return []
+
+
+def plan(config: dict[str, Any], snapshot: Snapshot) -> list[Operation]:
+    """Plan the operations that bring the network in line with the configuration.
+
+    Only running containers are considered, the bridge ports left behind
+    by configured containers that are no longer running are removed.
+
+    :param config: orchestrator configuration
+    :type config: dict[str, Any]
+    :param snapshot: snapshot of the network
+    :type snapshot: Snapshot
+    :return: operations, in the order they must be applied
+    :rtype: list[Operation]
+    """
+    operations = [
+        Operation(REMOVE_STALE_PORT, (container, iface), "container end is gone")
+        for (container, iface), port in snapshot.container_ports.items()
+        if container not in snapshot.containers
+        and port.name not in snapshot.links
+        and any(
+            info["iface"] == iface for info in config["container"].get(container, [])
+        )
+    ]
+    for bridge, info in config["bridge"].items():
+        operations.extend(_plan_bridge(bridge, info, snapshot))
+    for container, links in snapshot.containers.items():
+        operations.extend(_plan_container(container, links, snapshot, config))
+    for prefix, translation in config.get("veth_pairs", {}).items():
+        operations.extend(_plan_veth_pair(prefix, translation, snapshot))
+    return operations
+
+
+def _changes(old: dict[str, Any], new: dict[str, Any]) -> Iterator[tuple[str, str]]:
+    """Yield the keys whose values differ between two mappings.
+
+    :param old: previous values
+    :type old: dict[str, Any]
+    :param new: new values
+    :type new: dict[str, Any]
+    :yield: key and how its value changed: added, removed or changed
+    """
+    for key in sorted(old.keys() | new.keys()):
+        if key not in old:
+            yield key, "added"
+        elif key not in new:
+            yield key, "removed"
+        elif old[key] != new[key]:
+            yield key, "changed"
+
+
+def _plan_bridge_changes(
+    old_bridges: dict[str, BridgeInfoDict], new_bridges: dict[str, BridgeInfoDict]
+) -> tuple[list[Operation], list[Operation], list[Operation]]:
+    """Plan the changes of the bridges and their parents.
+
+    :param old_bridges: bridges of the configuration currently applied
+    :type old_bridges: dict[str, BridgeInfoDict]
+    :param new_bridges: bridges of the new configuration
+    :type new_bridges: dict[str, BridgeInfoDict]
+    :return: parents to detach, bridges to remove, and bridges and parents
+             to set up
+    :rtype: tuple[list[Operation], list[Operation], list[Operation]]
+    """
+    detaches, removals, setups = [], [], []
+    for bridge, reason in _changes(old_bridges, new_bridges):
+        if bridge not in new_bridges:
+            removals.append(Operation(REMOVE_BRIDGE, (bridge,), reason))
+            continue
+        if bridge not in old_bridges:
+            # init_bridge() attaches the parents as well
+            setups.append(Operation(INIT_BRIDGE, (bridge,), reason))
+            continue
+        old, new = old_bridges[bridge], new_bridges[bridge]
+        if {**old, "parents": None} != {**new, "parents": None}:
+            setups.append(Operation(INIT_BRIDGE, (bridge,), reason))
+        old_parents = {
+            info["iface"]: info for info in old.get("parents", []) if "iface" in info
+        }
+        new_parents = {
+            info["iface"]: info for info in new.get("parents", []) if "iface" in info
+        }
+        for parent, parent_reason in _changes(old_parents, new_parents):
+            target = (bridge, parent)
+            if parent in old_parents:
+                detaches.append(Operation(DETACH_PARENT, target, parent_reason))
+            if parent in new_parents:
+                setups.append(Operation(ATTACH_PARENT, target, parent_reason))
+    return detaches, removals, setups
+
+
+def plan_changes(previous: dict[str, Any], document: dict[str, Any]) -> list[Operation]:
+    """Plan the operations that apply a new version of the configuration.
+
+    Removals come first, they are applied with the previous version of the
+    configuration, the other operations with the new one. A changed
+    container interface or veth pair is removed and created again, a changed
+    parent detached and attached again.
+
+    :param previous: configuration currently applied
+    :type previous: dict[str, Any]
+    :param document: new configuration
+    :type document: dict[str, Any]
+    :return: operations, in the order they must be applied
+    :rtype: list[Operation]
+    """
+    removals, containers, veth_pairs = [], [], []
+
+    old_containers = previous.get("container", {})
+    new_containers = document.get("container", {})
+    for container in sorted(old_containers.keys() | new_containers.keys()):
+        old_ifaces = {info["iface"]: info for info in old_containers.get(container, [])}
+        new_ifaces = {info["iface"]: info for info in new_containers.get(container, [])}
+        for iface, reason in _changes(old_ifaces, new_ifaces):
+            target = (container, iface)
+            if iface in old_ifaces:
+                removals.append(Operation(REMOVE_CONTAINER_IFACE, target, reason))
+            if iface in new_ifaces:
+                containers.append(Operation(ATTACH_CONTAINER_IFACE, target, reason))
+
+    old_pairs = previous.get("veth_pairs", {})
+    new_pairs = document.get("veth_pairs", {})
+    for prefix, reason in _changes(old_pairs, new_pairs):
+        if prefix in old_pairs:
+            removals.append(Operation(REMOVE_VETH_PAIR, (prefix,), reason))
+        if prefix in new_pairs:
+            veth_pairs.append(Operation(CREATE_VETH_PAIR, (prefix,), reason))
+
+    detaches, bridge_removals, bridges = _plan_bridge_changes(
+        previous.get("bridge", {}), document.get("bridge", {})
+    )
+    return [
+        *removals,
+        *detaches,
+        *bridge_removals,
+        *bridges,
+        *containers,
+        *veth_pairs,
+    ]
+
+
+def _bridge_of(operation: Operation, config: dict[str, Any]) -> str | None:
+    """Return the bridge a container or veth pair operation attaches to.
+
+    :param operation: operation on a container interface or veth pair
+    :type operation: Operation
+    :param config: configuration the operation is applied with
+    :type config: dict[str, Any]
+    :return: bridge name, None if the item is not configured
+    :rtype: str | None
+    """
+    if operation.action in (CREATE_VETH_PAIR, REMOVE_VETH_PAIR):
+        return config.get("veth_pairs", {}).get(operation.target[0], {}).get("on")
+    container, iface = operation.target
+    for info in config["container"].get(container, []):
+        if info["iface"] == iface:
+            return info["bridge"]
+    return None
+
+
+def plan_dependencies(
+    operations: list[Operation], config: dict[str, Any]
+) -> list[set[int]]:
+    """Return, per operation of a plan, the operations it must wait for.
+
+    A bridge is set up before its parents are attached, both before the
+    container interfaces and veth pairs on the bridge. A bridge is removed
+    after them. The operations of a single container are applied one after
+    the other. Operations on different bridges, containers and veth pairs
+    do not wait for each other.
+
+    :param operations: operations returned by plan() or plan_changes()
+    :type operations: list[Operation]
+    :param config: configuration the operations are applied with
+    :type config: dict[str, Any]
+    :return: per operation, the indexes of the earlier operations it waits for
+    :rtype: list[set[int]]
+    """
+    bridge_inits: dict[str, int] = {}
+    # Per bridge, the operations setting it up and those using it
+    bridge_operations: dict[str, list[int]] = {}
+    bridge_users: dict[str, list[int]] = {}
+    container_last: dict[str, int] = {}
+    dependencies: list[set[int]] = []
+    for index, operation in enumerate(operations):
+        action, target = operation.action, operation.target
+        depends_on: set[int] = set()
+        if action in (INIT_BRIDGE, ATTACH_PARENT):
+            bridge = target[0]
+            if action == INIT_BRIDGE:
+                bridge_inits[bridge] = index
+            elif bridge in bridge_inits:
+                depends_on.add(bridge_inits[bridge])
+            bridge_operations.setdefault(bridge, []).append(index)
+        elif action == DETACH_PARENT:
+            bridge_users.setdefault(target[0], []).append(index)
+        elif action == REMOVE_BRIDGE:
+            depends_on.update(bridge_users.get(target[0], []))
+        else:
+            if (bridge := _bridge_of(operation, config)) is not None:
+                depends_on.update(bridge_operations.get(bridge, []))
+                bridge_users.setdefault(bridge, []).append(index)
+            if action not in (CREATE_VETH_PAIR, REMOVE_VETH_PAIR):
+                container = target[0]
+                if container in container_last:
+                    depends_on.add(container_last[container])
+                container_last[container] = index
+        dependencies.append(depends_on)
+    return dependencies
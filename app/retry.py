@@ -0,0 +1,231 @@
+"""Track the failures of bridges, container interfaces and veth pairs.
+
+An item whose operation fails is retried by the reconcile loop after a
+delay that doubles with each consecutive failure, from RETRY_BASE_DELAY
+up to RETRY_MAX_DELAY. Meanwhile the rest of the topology is reconciled
+as usual. After QUARANTINE_THRESHOLD consecutive failures the item is
+quarantined, it is no longer retried until released through the API or
+applied successfully by it.
+
+Items are named after their kind, e.g. bridge:br0, container:wan:eth1
+or veth:vp0, see item_key().
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, Any
+
+from app.metrics import ITEM_FAILURES, QUARANTINED_ITEMS
+from app.utils import (
+    QUARANTINE_THRESHOLD,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+    get_logger,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_LOGGER = get_logger("retry")
+
+
+def item_key(kind: str, *names: str) -> str:
+    """Name an item.
+
+    :param kind: bridge, container or veth
+    :type kind: str
+    :param names: e.g. the bridge name, or the container and its interface
+    :type names: str
+    :return: item name, e.g. container:wan:eth1
+    :rtype: str
+    """
+    return ":".join((kind, *names))
+
+
+def backoff_delay(failures: int) -> float:
+    """Return how long to wait before the next attempt.
+
+    :param failures: consecutive failures so far, at least 1
+    :type failures: int
+    :return: seconds
+    :rtype: float
+    """
+    return min(RETRY_BASE_DELAY * 2 ** (failures - 1), RETRY_MAX_DELAY)
+
+
+@dataclass
+class ItemFailure:
+    """Consecutive failures of an item."""
+
+    item: str
+    failures: int = 0
+    error: str = ""  # Last error
+    failed_at: float = 0.0  # Wall clock time of the last failure
+    retry_at: float = 0.0  # Monotonic time of the next attempt
+    quarantined: bool = False
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the failure as reported by the API.
+
+        :return: failure details
+        :rtype: dict[str, Any]
+        """
+        return {
+            "item": self.item,
+            "failures": self.failures,
+            "error": self.error,
+            "failed_at": self.failed_at,
+            "retry_in": None
+            if self.quarantined
+            else max(0.0, self.retry_at - time.monotonic()),
+            "quarantined": self.quarantined,
+        }
+
+
+class FailureTracker:
+    """Failures per item, forgotten once the item succeeds."""
+
+    def __init__(self, threshold: int = QUARANTINE_THRESHOLD) -> None:
+        """Initialize the tracker.
+
+        :param threshold: Optional, consecutive failures that quarantine an item
+        :type threshold: int
+        """
+        self._threshold = threshold
+        self._items: dict[str, ItemFailure] = {}
+
+    def _update_gauge(self) -> None:
+        """Export the number of quarantined items."""
+        QUARANTINED_ITEMS.set(sum(entry.quarantined for entry in self._items.values()))
+
+    def failed(self, item: str, error: BaseException) -> ItemFailure:
+        """Record a failure of an item.
+
+        :param item: item name
+        :type item: str
+        :param error: error raised by the operation
+        :type error: BaseException
+        :return: the failures of the item
+        :rtype: ItemFailure
+        """
+        entry = self._items.setdefault(item, ItemFailure(item))
+        entry.failures += 1
+        entry.error = str(error) or type(error).__name__
+        entry.failed_at = time.time()
+        entry.retry_at = time.monotonic() + backoff_delay(entry.failures)
+        ITEM_FAILURES.inc(kind=item.split(":", 1)[0])
+        if entry.failures >= self._threshold:
+            if not entry.quarantined:
+                _LOGGER.error(
+                    "Quarantined %s after %d failures: %s",
+                    item,
+                    entry.failures,
+                    entry.error,
+                )
+            entry.quarantined = True
+            self._update_gauge()
+        else:
+            _LOGGER.warning(
+                "%s failed %d time(s), retrying in %.0f s: %s",
+                item,
+                entry.failures,
+                backoff_delay(entry.failures),
+                entry.error,
+            )
+        return entry
+
+    def succeeded(self, item: str) -> None:
+        """Forget the failures of an item.
+
+        :param item: item name
+        :type item: str
+        """
+        if (entry := self._items.pop(item, None)) is not None:
+            _LOGGER.info("%s recovered after %d failure(s)", item, entry.failures)
+            self._update_gauge()
+
+    def release(self, item: str) -> bool:
+        """Forget the failures of an item, so that it is retried right away.
+
+        :param item: item name
+        :type item: str
+        :return: False if the item was not failing
+        :rtype: bool
+        """
+        if self._items.pop(item, None) is None:
+            return False
+        _LOGGER.info("Released %s", item)
+        self._update_gauge()
+        return True
+
+    def retain(self, items: Iterable[str]) -> None:
+        """Forget the items that no longer need to be applied.
+
+        :param items: items still planned, e.g. by the last full pass
+        :type items: Iterable[str]
+        """
+        for item in set(self._items) - set(items):
+            self.succeeded(item)
+
+    def is_due(self, item: str) -> bool:
+        """Check that an item may be attempted.
+
+        :param item: item name
+        :type item: str
+        :return: False if the item is quarantined or waits for its retry
+        :rtype: bool
+        """
+        if (entry := self._items.get(item)) is None:
+            return True
+        return not entry.quarantined and entry.retry_at <= time.monotonic()
+
+    def is_quarantined(self, item: str) -> bool:
+        """Check that an item is quarantined.
+
+        :param item: item name
+        :type item: str
+        :return: True if the item is no longer retried
+        :rtype: bool
+        """
+        return (entry := self._items.get(item)) is not None and entry.quarantined
+
+    def next_retry(self) -> float | None:
+        """Return the time until the next retry of a failing item is due.
+
+        :return: seconds, None if no item waits for a retry
+        :rtype: float | None
+        """
+        retries = [
+            entry.retry_at for entry in self._items.values() if not entry.quarantined
+        ]
+        if not retries:
+            return None
+        return max(0.0, min(retries) - time.monotonic())
+
+    def failures(self, *, quarantined: bool | None = None) -> list[ItemFailure]:
+        """List the failing items.
+
+        :param quarantined: Optional, only quarantined (True) or retried
+                            (False) items
+        :type quarantined: bool | None
+        :return: failing items, by name
+        :rtype: list[ItemFailure]
+        """
+        return [
+            entry
+            for _, entry in sorted(self._items.items())
+            if quarantined is None or entry.quarantined == quarantined
+        ]
+
+
+@cache
+def get_failure_tracker() -> FailureTracker:
+    """Return the failure tracker shared by the API and the reconcile loop.
+
+    :return: failure tracker
+    :rtype: FailureTracker
+    """
+    return FailureTracker()
@@ -0,0 +1,76 @@
+"""Helpers shared by the bulk API routers."""
+
+from __future__ import annotations
+
+from subprocess import CalledProcessError
+from typing import TYPE_CHECKING
+
+from app.locks import get_lock_manager
+from app.ovs_lib import ovs_transaction
+from app.utils import get_logger, save_db
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Iterable
+
+_LOGGER = get_logger("batch")
+
+
+async def run_batch(
+    items: list[tuple[str, str, Callable[[], Awaitable[None]]]],
+    **resources: Iterable[str],
+) -> dict:
+    """Apply the items of a bulk request under the same locks and transaction.
+
+    Items are applied in order, a failing item does not stop the others.
+    The OVS writes of all items are committed together at the end, if that
+    commit fails, none of the items is reported as applied nor added to the
+    runner config.
+
+    :param items: ID, validation error (empty if valid) and apply function
+                  of each item
+    :type items: list[tuple[str, str, Callable[[], Awaitable[None]]]]
+    :param resources: resources locked for all items, see LockManager.hold()
+    :type resources: Iterable[str]
+    :return: overall status and per item results, in request order
+    :rtype: dict
+    """
+    results = [
+        {"id": item_id, "status": "failed", "detail": error}
+        if error
+        else {"id": item_id, "status": "success"}
+        for item_id, error, _ in items
+    ]
+    applied: list[int] = []
+    try:
+        async with get_lock_manager().hold(**resources), ovs_transaction():
+            for index, (item_id, error, apply) in enumerate(items):
+                if error:
+                    continue
+                try:
+                    await apply()
+                except (CalledProcessError, OSError, ValueError, IndexError) as exc:
+                    _LOGGER.exception("Failed to apply %s", item_id)
+                    results[index] = {
+                        "id": item_id,
+                        "status": "failed",
+                        "detail": str(exc),
+                    }
+                else:
+                    applied.append(index)
+    except (CalledProcessError, OSError, ValueError) as exc:
+        # The batched commit failed, the items applied are not recorded
+        _LOGGER.exception("Failed to commit the batch")
+        for index in applied:
+            results[index] = {
+                "id": results[index]["id"],
+                "status": "failed",
+                "detail": f"Commit failed: {exc}",
+            }
+    finally:
+        save_db()
+
+    failed = sum(result["status"] != "success" for result in results)
+    status = (
+        "success" if not failed else "partial" if failed < len(results) else "failed"
+    )
+    return {"status": status, "results": results}
@@ -1,19 +1,76 @@
 """API router to add bridge."""
 
+from functools import partial
 from typing import Annotated, cast
 
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Response
 
+from app.locks import get_lock_manager
 from app.orchestrator import init_bridge
-from app.schemas import BridgeInfo
-from app.utils import EVENT_LOCK, BridgeInfoDict, get_config, validate_bridge
+from app.ovs_lib import ovs_transaction, run_after_commit
+from app.retry import get_failure_tracker, item_key
+from app.routers.batch import run_batch
+from app.routers.jobs import accept_job
+from app.schemas import BridgeInfo, BridgeItem
+from app.utils import BridgeInfoDict, get_config, save_db, validate_bridge
 
 router = APIRouter()
 
 
+async def _add_bridge(bridge_name: str, payload: BridgeInfoDict) -> None:
+    """Create a bridge and record it in the runner config.
+
+    :param bridge_name: bridge name
+    :type bridge_name: str
+    :param payload: network details
+    :type payload: BridgeInfoDict
+    """
+    await init_bridge(bridge_name, payload)
+
+    async def _record() -> None:
+        get_failure_tracker().succeeded(item_key("bridge", bridge_name))
+
+        # Update runner config only if bridge is added
+        config = get_config()
+        bridge_config = config["bridge"].setdefault(bridge_name, {})
+        for key, value in payload.items():
+            if key in bridge_config and isinstance(value, list):
+                bridge_config.setdefault(key, []).extend(value)
+                continue
+            bridge_config[key] = value
+
+    # Not recorded if the OVS writes fail to commit
+    await run_after_commit(_record)
+
+
+async def _apply_bridge(bridge_name: str, payload: BridgeInfoDict) -> dict:
+    """Add a bridge under its lock and commit it.
+
+    :param bridge_name: bridge name
+    :type bridge_name: str
+    :param payload: network details
+    :type payload: BridgeInfoDict
+    :return: Status Message
+    :rtype: dict
+    """
+    try:
+        async with (
+            get_lock_manager().hold(bridges=[bridge_name]),
+            ovs_transaction(),
+        ):
+            await _add_bridge(bridge_name, payload)
+    finally:
+        save_db()
+
+    return {"status": "success", "bridge_name": bridge_name}
+
+
 @router.post("/add_bridge")
 async def init_bridge_api(
-    bridge_name: Annotated[str, Body()], bridge_info: BridgeInfo
+    bridge_name: Annotated[str, Body()],
+    bridge_info: BridgeInfo,
+    response: Response,
+    background: bool = False,
 ) -> dict:
     """Add a Linux/OVS bridge.
 
@@ -21,12 +78,16 @@ async def init_bridge_api(
     :type bridge_name: str
     :param bridge_info: network details
     :type bridge_info: BridgeInfo
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
     :raises HTTPException: error code 400, if payload validation fails.
     :raises HTTPException: error code 500, if adding a bridge fails
     :return: Status Message
     :rtype: dict
     """
-    payload = cast(BridgeInfoDict, bridge_info.model_dump())
+    payload = cast("BridgeInfoDict", bridge_info.model_dump())
     # Pre-validation check
 
     if not validate_bridge(bridge_name, payload):
@@ -35,20 +96,49 @@ async def init_bridge_api(
             detail="Bridge already exists with the same parent details",
         )
 
+    apply = partial(_apply_bridge, bridge_name, payload)
+    if background:
+        return accept_job(response, "add_bridge", apply)
+
     # Init Bridge logic
     try:
-        async with EVENT_LOCK:
-            init_bridge(bridge_name, payload)
-
-            # Update runner config only if bridge is added
-            config = get_config()
-            bridge_config = config["bridge"].setdefault(bridge_name, {})
-            for key, value in payload.items():
-                if key in bridge_config and isinstance(value, list):
-                    bridge_config.setdefault(key, []).extend(value)
-                    continue
-                bridge_config[key] = value
+        return await apply()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
-    return {"status": "success", "bridge_name": bridge_name}
+
+@router.post("/add_bridges")
+async def init_bridges_api(
+    bridges: list[BridgeItem], response: Response, background: bool = False
+) -> dict:
+    """Add several Linux/OVS bridges at once.
+
+    All bridges are validated first, then applied under their locks with
+    a single OVS commit.
+
+    :param bridges: bridge names and network details
+    :type bridges: list[BridgeItem]
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
+    :return: overall status and the result of each bridge
+    :rtype: dict
+    """
+    items = []
+    seen: set[str] = set()
+    for item in bridges:
+        payload = cast("BridgeInfoDict", item.bridge_info.model_dump())
+        error = ""
+        if item.bridge_name in seen:
+            error = "Bridge is listed more than once"
+        elif not validate_bridge(item.bridge_name, payload):
+            error = "Bridge already exists with the same parent details"
+        seen.add(item.bridge_name)
+        items.append(
+            (item.bridge_name, error, partial(_add_bridge, item.bridge_name, payload))
+        )
+    apply = partial(run_batch, items, bridges=seen)
+    if background:
+        return accept_job(response, "add_bridges", apply)
+    return await apply()
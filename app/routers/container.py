@@ -1,19 +1,105 @@
 """API router to add a container to a bridge."""
 
+from collections.abc import Awaitable, Callable
+from functools import partial
 from typing import Annotated, cast
 
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Response
 
+from app.docker_client import get_docker_client
+from app.locks import get_lock_manager
 from app.orchestrator import add_iface_to_container
-from app.schemas import ContainerInfo
-from app.utils import EVENT_LOCK, ContainerInfoDict, get_config, validate_container
+from app.ovs_lib import ovs_transaction, run_after_commit
+from app.retry import get_failure_tracker, item_key
+from app.routers.batch import run_batch
+from app.routers.jobs import accept_job
+from app.schemas import ContainerIfaceItem, ContainerInfo
+from app.utils import (
+    ContainerInfoDict,
+    get_config,
+    save_db,
+    validate_container,
+)
 
 router = APIRouter()
 
 
+async def _add_container_iface(container_id: str, payload: ContainerInfoDict) -> None:
+    """Attach a container interface and record it in the runner config.
+
+    :param container_id: container name
+    :type container_id: str
+    :param payload: container interface details
+    :type payload: ContainerInfoDict
+    """
+    await add_iface_to_container(container_id, payload)
+
+    async def _record() -> None:
+        get_failure_tracker().succeeded(
+            item_key("container", container_id, payload["iface"])
+        )
+
+        # Add runner config only if container iface is added
+        config = get_config()
+        cc_config = config["container"].setdefault(container_id, [])
+        cc_config.append(payload)
+
+    # Not recorded if the OVS writes fail to commit
+    await run_after_commit(_record)
+
+
+async def _apply_container_iface(container_id: str, payload: ContainerInfoDict) -> dict:
+    """Attach a container interface under its locks and commit it.
+
+    :param container_id: container name
+    :type container_id: str
+    :param payload: container interface details
+    :type payload: ContainerInfoDict
+    :return: Success message.
+    :rtype: dict
+    """
+    try:
+        async with (
+            get_lock_manager().hold(
+                containers=[container_id], uses=[payload["bridge"]]
+            ),
+            ovs_transaction(),
+        ):
+            await get_docker_client().refresh()
+            await _add_container_iface(container_id, payload)
+    finally:
+        save_db()
+
+    return {"status": "success", "container_id": container_id}
+
+
+async def _apply_container_ifaces(
+    items: list[tuple[str, str, Callable[[], Awaitable[None]]]],
+    containers: set[str],
+    bridges: set[str],
+) -> dict:
+    """List the running containers once, then attach all interfaces.
+
+    :param items: ID, validation error (empty if valid) and apply function
+                  of each interface
+    :type items: list[tuple[str, str, Callable[[], Awaitable[None]]]]
+    :param containers: containers the interfaces are attached to
+    :type containers: set[str]
+    :param bridges: bridges the interfaces are attached to
+    :type bridges: set[str]
+    :return: overall status and the result of each interface
+    :rtype: dict
+    """
+    await get_docker_client().refresh()
+    return await run_batch(items, containers=containers, uses=bridges)
+
+
 @router.post("/add_container_iface")
 async def add_iface_to_container_api(
-    container_id: Annotated[str, Body()], container_info: ContainerInfo
+    container_id: Annotated[str, Body()],
+    container_info: ContainerInfo,
+    response: Response,
+    background: bool = False,
 ) -> dict:
     """Attach a OVS/Linux Bridge link to target container.
 
@@ -22,27 +108,76 @@ async def add_iface_to_container_api(
     :param container_info: container's information, including its bridge and
                            interface details.
     :type container_info: ContainerInfo
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
     :raises HTTPException: error code 400, if payload validation fails
     :raises HTTPException: error code 500, if failed to attach container to
                            a bridge
     :return: Success message.
     :rtype: dict
     """
-    payload = cast(ContainerInfoDict, container_info.model_dump())
+    payload = cast("ContainerInfoDict", container_info.model_dump())
     # Pre-validation check
     if not validate_container(container_id, payload):
         raise HTTPException(status_code=400, detail="Validation failed")
 
+    apply = partial(_apply_container_iface, container_id, payload)
+    if background:
+        return accept_job(response, "add_container_iface", apply)
+
     # Add interface to container
     try:
-        async with EVENT_LOCK:
-            add_iface_to_container(container_id, payload)
-
-            # Add runner config only if container iface is added
-            config = get_config()
-            cc_config = config["container"].setdefault(container_id, [])
-            cc_config.append(payload)
+        return await apply()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
-    return {"status": "success", "container_id": container_id}
+
+@router.post("/add_container_ifaces")
+async def add_ifaces_to_containers_api(
+    ifaces: list[ContainerIfaceItem], response: Response, background: bool = False
+) -> dict:
+    """Attach several OVS/Linux Bridge links to containers at once.
+
+    All interfaces are validated first, the running containers are listed
+    once, then the interfaces are attached under the locks of their
+    containers with a single OVS commit.
+
+    :param ifaces: container names and interface details
+    :type ifaces: list[ContainerIfaceItem]
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
+    :return: overall status and the result of each interface
+    :rtype: dict
+    """
+    items = []
+    seen: set[tuple[str, str, str]] = set()
+    for item in ifaces:
+        payload = cast("ContainerInfoDict", item.container_info.model_dump())
+        key = (item.container_id, payload["bridge"], payload["iface"])
+        error = ""
+        if key in seen:
+            error = "Container interface is listed more than once"
+        elif not validate_container(item.container_id, payload):
+            error = "Validation failed"
+        seen.add(key)
+        items.append(
+            (
+                f"{item.container_id}:{payload['iface']}",
+                error,
+                partial(_add_container_iface, item.container_id, payload),
+            )
+        )
+
+    apply = partial(
+        _apply_container_ifaces,
+        items,
+        {container for container, _, _ in seen},
+        {bridge for _, bridge, _ in seen},
+    )
+    if background:
+        return accept_job(response, "add_container_ifaces", apply)
+    return await apply()
@@ -0,0 +1,48 @@
+"""API router to inspect the orchestrator at runtime."""
+
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Query
+
+from app.trace import TRACE_SIZE, get_traces
+
+router = APIRouter()
+
+
+@router.get("/debug/commands")
+async def get_commands_api(  # noqa: PLR0913
+    *,
+    kind: Literal["exec", "docker", "ovsdb", "netlink"] | None = None,
+    origin: str | None = None,
+    contains: str | None = None,
+    min_duration: Annotated[float, Query(ge=0)] = 0.0,
+    failed: bool | None = None,
+    limit: Annotated[int, Query(ge=1, le=TRACE_SIZE)] = 100,
+) -> dict:
+    """Show the most recent commands executed by the orchestrator.
+
+    :param kind: Optional, command kind
+    :type kind: Literal["exec", "docker", "ovsdb", "netlink"] | None
+    :param origin: Optional, prefix of the request or reconcile pass that
+                   caused the command, e.g. "reconcile" or "request:12 "
+    :type origin: str | None
+    :param contains: Optional, substring of the command arguments
+    :type contains: str | None
+    :param min_duration: Optional, minimum duration in seconds
+    :type min_duration: float
+    :param failed: Optional, only failed (true) or successful (false) ones
+    :type failed: bool | None
+    :param limit: Optional, maximum number of commands returned
+    :type limit: int
+    :return: matching commands, newest first
+    :rtype: dict
+    """
+    traces = get_traces(
+        kind=kind,
+        origin=origin,
+        contains=contains,
+        min_duration=min_duration,
+        failed=failed,
+        limit=limit,
+    )
+    return {"commands": [trace.as_dict() for trace in traces]}
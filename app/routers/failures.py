@@ -0,0 +1,36 @@
+"""API router to inspect and release failing items."""
+
+from fastapi import APIRouter, HTTPException
+
+from app.retry import get_failure_tracker
+
+router = APIRouter()
+
+
+@router.get("/failures")
+async def get_failures_api(quarantined: bool | None = None) -> dict:
+    """Show the bridges, container interfaces and veth pairs that keep failing.
+
+    :param quarantined: Optional, only quarantined (true) or retried (false)
+                        items
+    :type quarantined: bool | None
+    :return: failing items with their last error, by name
+    :rtype: dict
+    """
+    failures = get_failure_tracker().failures(quarantined=quarantined)
+    return {"items": [failure.as_dict() for failure in failures]}
+
+
+@router.delete("/failures/{item:path}")
+async def release_failure_api(item: str) -> dict:
+    """Release a failing item, the next reconcile pass retries it.
+
+    :param item: item name, e.g. bridge:br0, container:wan:eth1 or veth:vp0
+    :type item: str
+    :raises HTTPException: error code 404, if the item is not failing
+    :return: Success message.
+    :rtype: dict
+    """
+    if not get_failure_tracker().release(item):
+        raise HTTPException(status_code=404, detail="Item is not failing")
+    return {"status": "success", "item": item}
@@ -0,0 +1,74 @@
+"""API router to poll background jobs."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from typing import TYPE_CHECKING, Annotated
+
+from fastapi import APIRouter, HTTPException, Query, Response
+
+from app.jobs import get_job_queue
+from app.orchestrator import request_reconcile
+from app.utils import JOB_WAIT_LIMIT
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
+router = APIRouter()
+
+HTTP_ACCEPTED = 202
+
+
+def accept_job(
+    response: Response, operation: str, apply: Callable[[], Awaitable[dict]]
+) -> dict:
+    """Queue a mutation and answer with 202 Accepted.
+
+    :param response: response of the mutation endpoint
+    :type response: Response
+    :param operation: name of the API operation, e.g. add_bridge
+    :type operation: str
+    :param apply: applies the mutation and returns the response body
+    :type apply: Callable[[], Awaitable[dict]]
+    :return: job ID and status
+    :rtype: dict
+    """
+
+    async def _apply_and_wake() -> dict:
+        try:
+            return await apply()
+        finally:
+            # The request itself woke the main loop before the job ran
+            request_reconcile(f"job {operation}")
+
+    job = get_job_queue().submit(operation, _apply_and_wake)
+    response.status_code = HTTP_ACCEPTED
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_api(
+    job_id: str,
+    wait: Annotated[float, Query(ge=0, le=JOB_WAIT_LIMIT)] = 0,
+) -> dict:
+    """Show the status of a background job.
+
+    :param job_id: job ID returned by the mutation endpoint
+    :type job_id: str
+    :param wait: Optional, seconds to wait for the job to finish
+    :type wait: float
+    :raises HTTPException: error code 404, if the job is unknown
+    :return: job status, including the result once finished
+    :rtype: dict
+    """
+    if (job := get_job_queue().get(job_id)) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if wait and not job.done.is_set():
+        # On timeout, report the current status
+        with suppress(TimeoutError):
+            await asyncio.wait_for(job.done.wait(), wait)
+
+    return job.as_dict()
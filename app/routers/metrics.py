@@ -0,0 +1,18 @@
+"""API router to expose runtime metrics."""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import CONTENT_TYPE, render
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_api() -> PlainTextResponse:
+    """Show the runtime metrics in the Prometheus text format.
+
+    :return: Prometheus exposition text
+    :rtype: PlainTextResponse
+    """
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,20 @@
+"""API router to trigger a full reconcile pass."""
+
+from fastapi import APIRouter
+
+from app.orchestrator import request_reconcile
+
+router = APIRouter()
+
+
+@router.post("/reconcile")
+async def reconcile_api(requester: str = "api") -> dict:
+    """Wake the orchestrator up for a full pass, e.g. after an external change.
+
+    :param requester: Optional, what asked for the pass, for the logs
+    :type requester: str
+    :return: Success message.
+    :rtype: dict
+    """
+    request_reconcile(requester)
+    return {"status": "queued"}
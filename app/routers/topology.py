@@ -0,0 +1,88 @@
+"""API router to show and replace the whole topology."""
+
+from functools import partial
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Response
+
+from app.orchestrator import apply_topology
+from app.retry import get_failure_tracker
+from app.routers.jobs import accept_job
+from app.schemas import Topology
+from app.utils import CONFIG_SECTIONS, get_config, validate_topology
+
+router = APIRouter()
+
+
+async def _apply_topology(document: dict[str, Any]) -> dict:
+    """Apply a topology and report the plan executed.
+
+    :param document: topology, in the schema of config.json
+    :type document: dict[str, Any]
+    :return: the operations attempted and the items that failed
+    :rtype: dict
+    """
+    operations = await apply_topology(document)
+    items = {operation.item for operation in operations}
+    failures = [
+        failure.as_dict()
+        for failure in get_failure_tracker().failures()
+        if failure.item in items
+    ]
+    return {
+        "status": "partial" if failures else "success",
+        "operations": [operation.as_dict() for operation in operations],
+        "failures": failures,
+    }
+
+
+@router.get("/topology")
+async def get_topology_api() -> dict:
+    """Show the desired state, changes made through the API included.
+
+    :return: topology, in the schema of config.json
+    :rtype: dict
+    """
+    config = get_config()
+    return {section: config.get(section, {}) for section in CONFIG_SECTIONS}
+
+
+@router.put("/topology")
+async def put_topology_api(
+    topology: Topology, response: Response, background: bool = False
+) -> dict:
+    """Replace the whole topology.
+
+    The difference from the desired state is applied as a single plan, the
+    items missing from the topology are removed from the network. No other
+    change is applied meanwhile. The topology is saved to config.json, the
+    items of the configuration fragments stay in force over it.
+
+    :param topology: bridges, containers and veth pairs, as in config.json
+    :type topology: Topology
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
+    :raises HTTPException: error code 400, if the items of the topology are
+                           inconsistent
+    :raises HTTPException: error code 500, if the topology could not be
+                           applied or saved
+    :return: the operations attempted and the items that failed
+    :rtype: dict
+    """
+    # Settings left out stay out, as they would in config.json
+    document = topology.model_dump(exclude_unset=True, exclude_none=True)
+    for section in CONFIG_SECTIONS:
+        document.setdefault(section, {})
+    if problems := validate_topology(document):
+        raise HTTPException(status_code=400, detail=problems)
+
+    apply = partial(_apply_topology, document)
+    if background:
+        return accept_job(response, "put_topology", apply)
+
+    try:
+        return await apply()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
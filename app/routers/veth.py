@@ -1,19 +1,78 @@
 """API router to add a VETH pair to a bridge."""
 
+from functools import partial
 from typing import Annotated
 
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Response
 
+from app.locks import get_lock_manager
 from app.orchestrator import create_veth_pair
-from app.schemas import VethPairInfo
-from app.utils import EVENT_LOCK, get_config, validate_veth_pair
+from app.ovs_lib import ovs_transaction, run_after_commit
+from app.retry import get_failure_tracker, item_key
+from app.routers.batch import run_batch
+from app.routers.jobs import accept_job
+from app.schemas import VethPairInfo, VethPairItem
+from app.utils import get_config, save_db, validate_veth_pair
 
 router = APIRouter()
 
 
+async def _add_veth_pair(veth_pair_id: str, veth_pair_info: VethPairInfo) -> None:
+    """Create a veth pair and record it in the runner config.
+
+    :param veth_pair_id: VETH pair ID
+    :type veth_pair_id: str
+    :param veth_pair_info: VETH pair details, including target bridge and VLAN.
+    :type veth_pair_info: VethPairInfo
+    """
+    await create_veth_pair(
+        veth_pair_info.on,
+        veth_pair_id,
+        veth_pair_info.map,
+        veth_pair_info.trunk,
+    )
+
+    async def _record() -> None:
+        get_failure_tracker().succeeded(item_key("veth", veth_pair_id))
+
+        config = get_config()
+        cc_config = config["veth_pairs"].setdefault(veth_pair_id, {})
+        cc_config.update(veth_pair_info.model_dump())
+
+    # Not recorded if the OVS writes fail to commit
+    await run_after_commit(_record)
+
+
+async def _apply_veth_pair(veth_pair_id: str, veth_pair_info: VethPairInfo) -> dict:
+    """Create a veth pair under its lock and commit it.
+
+    :param veth_pair_id: VETH pair ID
+    :type veth_pair_id: str
+    :param veth_pair_info: VETH pair details, including target bridge and VLAN.
+    :type veth_pair_info: VethPairInfo
+    :return: Success message
+    :rtype: dict
+    """
+    try:
+        async with (
+            get_lock_manager().hold(
+                veth_pairs=[veth_pair_id], uses=[veth_pair_info.on]
+            ),
+            ovs_transaction(),
+        ):
+            await _add_veth_pair(veth_pair_id, veth_pair_info)
+    finally:
+        save_db()
+
+    return {"status": "success", "veth_pair_id": veth_pair_id}
+
+
 @router.post("/add_veth_pair")
 async def add_veth_pair_api(
-    veth_pair_id: Annotated[str, Body()], veth_pair_info: VethPairInfo
+    veth_pair_id: Annotated[str, Body()],
+    veth_pair_info: VethPairInfo,
+    response: Response,
+    background: bool = False,
 ) -> dict:
     """Add a VETH link onto a bridge.
 
@@ -30,6 +89,10 @@ async def add_veth_pair_api(
     :type veth_pair_id: str
     :param veth_pair_info: VETH pair details, including target bridge and VLAN.
     :type veth_pair_info: VethPairInfo
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
     :raises HTTPException: error code 400, if payload validation fails
     :raises HTTPException: error code 500, if fails to add veth pair to the bridge.
     :return: Success message
@@ -42,20 +105,56 @@ async def add_veth_pair_api(
     if not validate_veth_pair(veth_pair_id, veth_pair_info.model_dump()):
         raise HTTPException(status_code=400, detail="Validation failed")
 
+    apply = partial(_apply_veth_pair, veth_pair_id, veth_pair_info)
+    if background:
+        return accept_job(response, "add_veth_pair", apply)
+
     # Create veth pair
     try:
-        async with EVENT_LOCK:
-            create_veth_pair(
-                veth_pair_info.on,
-                veth_pair_id,
-                veth_pair_info.map,
-                veth_pair_info.trunk,
-            )
-
-            config = get_config()
-            cc_config = config["veth_pairs"].setdefault(veth_pair_id, {})
-            cc_config.update(veth_pair_info.model_dump())
+        return await apply()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
-    return {"status": "success", "veth_pair_id": veth_pair_id}
+
+@router.post("/add_veth_pairs")
+async def add_veth_pairs_api(
+    veth_pairs: list[VethPairItem], response: Response, background: bool = False
+) -> dict:
+    """Add several VETH links onto bridges at once.
+
+    All pairs are validated first, then created under their locks with
+    a single OVS commit.
+
+    :param veth_pairs: VETH pair IDs and details
+    :type veth_pairs: list[VethPairItem]
+    :param response: response to set the status code on
+    :type response: Response
+    :param background: Optional, queue the request and return a job ID
+    :type background: bool
+    :return: overall status and the result of each VETH pair
+    :rtype: dict
+    """
+    items = []
+    seen: set[str] = set()
+    for item in veth_pairs:
+        info = item.veth_pair_info
+        if not info.map:
+            info.map = ":"
+        error = ""
+        if item.veth_pair_id in seen:
+            error = "VETH pair is listed more than once"
+        elif not validate_veth_pair(item.veth_pair_id, info.model_dump()):
+            error = "Validation failed"
+        seen.add(item.veth_pair_id)
+        items.append(
+            (item.veth_pair_id, error, partial(_add_veth_pair, item.veth_pair_id, info))
+        )
+    apply = partial(
+        run_batch,
+        items,
+        veth_pairs=seen,
+        uses={item.veth_pair_info.on for item in veth_pairs},
+    )
+    if background:
+        return accept_job(response, "add_veth_pairs", apply)
+    return await apply()
@@ -1,17 +1,44 @@
 """Main Runner."""
 
 import asyncio
-from collections.abc import AsyncGenerator
+import itertools
+from collections.abc import AsyncGenerator, Awaitable, Callable
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 
-from app.orchestrator import main
-from app.routers import bridge, container, veth
+from app.jobs import get_job_queue
+from app.orchestrator import main, request_reconcile
+from app.routers import (
+    bridge,
+    container,
+    debug,
+    failures,
+    jobs,
+    metrics,
+    reconcile,
+    topology,
+    veth,
+)
+from app.trace import TRACE_ORIGIN
 from app.utils import get_logger
 
 _LOGGER = get_logger("runner")
 
+# Numbers the API requests, for the command trace
+_REQUESTS = itertools.count(1)
+HTTP_BAD_REQUEST = 400
+
+
+def _log_main_exit(task: asyncio.Task[None]) -> None:
+    """Log an unexpected error that ended the main loop.
+
+    :param task: the main loop task, done
+    :type task: asyncio.Task[None]
+    """
+    if not task.cancelled() and (error := task.exception()) is not None:
+        _LOGGER.error("Main loop stopped", exc_info=error)
+
 
 # Define the lifespan context manager
 @asynccontextmanager
@@ -23,11 +50,14 @@ async def app_lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     :yield: notifies FASTAPI to start listening to requests.
     """
     task = asyncio.create_task(main())
+    task.add_done_callback(_log_main_exit)
+    get_job_queue().start()
 
     # Yield allows FastAPI to start accepting requests
     yield
 
     # Shutdown logic: cancel the task when the app stops
+    await get_job_queue().stop()
     task.cancel()
     try:
         await task  # Wait for the task to finish gracefully after cancellation
@@ -40,6 +70,48 @@ app = FastAPI(lifespan=app_lifespan)
 app.include_router(bridge.router)
 app.include_router(container.router)
 app.include_router(veth.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+app.include_router(failures.router)
+app.include_router(reconcile.router)
+app.include_router(topology.router)
+
+
+@app.middleware("http")
+async def trace_origin(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Attribute the commands run while serving a request to that request.
+
+    :param request: incoming request
+    :type request: Request
+    :param call_next: next handler of the request
+    :type call_next: Callable[[Request], Awaitable[Response]]
+    :return: response of the request
+    :rtype: Response
+    """
+    TRACE_ORIGIN.set(f"request:{next(_REQUESTS)} {request.method} {request.url.path}")
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def wake_after_mutation(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Have a full pass check the network right after a successful mutation.
+
+    :param request: incoming request
+    :type request: Request
+    :param call_next: next handler of the request
+    :type call_next: Callable[[Request], Awaitable[Response]]
+    :return: response of the request
+    :rtype: Response
+    """
+    response = await call_next(request)
+    if request.method != "GET" and response.status_code < HTTP_BAD_REQUEST:
+        request_reconcile(f"{request.method} {request.url.path}")
+    return response
 
 
 @app.get("/")
@@ -0,0 +1,92 @@
+"""Run a graph of dependent tasks with bounded parallelism.
+
+A task starts once all the tasks it depends on have succeeded, at most
+a given number of tasks run at the same time. The tasks of a graph run
+in the context of the caller, hence share its OVS transaction and
+snapshot.
+
+A failing task does not cancel the others, only the tasks depending on
+it are skipped. The errors are returned once every other task has
+finished or been skipped, it is up to the caller to act on them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from app.utils import MAX_CONCURRENCY, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Collection, Sequence
+
+_LOGGER = get_logger("scheduler")
+
+
+@dataclass
+class GraphResult:
+    """Outcome of the tasks of a graph, the others succeeded."""
+
+    errors: dict[int, Exception] = field(default_factory=dict)
+    skipped: set[int] = field(default_factory=set)  # A dependency failed
+
+    def succeeded(self, index: int) -> bool:
+        """Check that a task succeeded.
+
+        :param index: task index
+        :type index: int
+        :return: False if the task failed or was skipped
+        :rtype: bool
+        """
+        return index not in self.errors and index not in self.skipped
+
+
+async def run_graph(
+    tasks: Sequence[Callable[[], Awaitable[None]]],
+    dependencies: Sequence[Collection[int]],
+    limit: int = MAX_CONCURRENCY,
+) -> GraphResult:
+    """Run tasks once the tasks they depend on have succeeded.
+
+    :param tasks: coroutine functions to run
+    :type tasks: Sequence[Callable[[], Awaitable[None]]]
+    :param dependencies: per task, the indexes of the tasks it depends on,
+                         which must come before it
+    :type dependencies: Sequence[Collection[int]]
+    :param limit: Optional, tasks allowed to run at the same time
+    :type limit: int
+    :return: the errors of the failed tasks and the skipped tasks
+    :rtype: GraphResult
+    :raises ValueError: If a task depends on a task that does not precede it
+    """
+    for index, depends_on in enumerate(dependencies):
+        if any(not 0 <= other < index for other in depends_on):
+            msg = f"Task {index} depends on {sorted(depends_on)}, not earlier tasks"
+            raise ValueError(msg)
+
+    slots = asyncio.Semaphore(limit)
+    # Per task, True once it succeeded, False if it failed or was skipped
+    outcomes: list[asyncio.Future[bool]] = [
+        asyncio.get_running_loop().create_future() for _ in tasks
+    ]
+    result = GraphResult()
+
+    async def _run(index: int) -> None:
+        succeeded = False
+        try:
+            for other in dependencies[index]:
+                if not await outcomes[other]:
+                    _LOGGER.debug("Skipping task %d, task %d failed", index, other)
+                    result.skipped.add(index)
+                    return
+            async with slots:
+                await tasks[index]()
+            succeeded = True
+        except Exception as exc:  # noqa: BLE001
+            result.errors[index] = exc
+        finally:
+            outcomes[index].set_result(succeeded)
+
+    await asyncio.gather(*(_run(index) for index in range(len(tasks))))
+    return result
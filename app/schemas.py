@@ -166,3 +166,46 @@ class VethPairInfo(BaseModel):
         description="Whether the veth pair is trunked ('yes' or 'no')",
         title="Trunk",
     )
+
+
+class BridgeItem(BaseModel):
+    """A bridge entry of a bulk request."""
+
+    bridge_name: str = Field(..., description="Name of the bridge", title="Bridge Name")
+    bridge_info: BridgeInfo
+
+
+class ContainerIfaceItem(BaseModel):
+    """A container interface entry of a bulk request."""
+
+    container_id: str = Field(
+        ..., description="Name of the container", title="Container Name"
+    )
+    container_info: ContainerInfo
+
+
+class VethPairItem(BaseModel):
+    """A veth pair entry of a bulk request."""
+
+    veth_pair_id: str = Field(
+        ..., description="VETH pair ID, also used as prefix", title="VETH pair ID"
+    )
+    veth_pair_info: VethPairInfo
+
+
+class Topology(BaseModel):
+    """A full network topology, in the schema of config.json."""
+
+    bridge: dict[str, BridgeInfo] = Field(
+        default_factory=dict, description="Bridges by name", title="Bridges"
+    )
+    container: dict[str, list[ContainerInfo]] = Field(
+        default_factory=dict,
+        description="Interfaces of each container, by container name",
+        title="Containers",
+    )
+    veth_pairs: dict[str, VethPairInfo] = Field(
+        default_factory=dict,
+        description="VETH pairs by ID, also used as prefix",
+        title="VETH Pairs",
+    )
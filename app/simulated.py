@@ -0,0 +1,977 @@
+"""Simulated kernel, OVS and Docker backends.
+
+With USE_SIMULATION set, the orchestrator talks to an in-memory
+model instead of rtnetlink, OVSDB and the Docker Engine API. Bridges,
+ports with their VLAN tags and trunks, veth pairs, container network
+namespaces, addresses and routes are kept in Python data structures,
+with the same semantics and errors as the real backends. The API and the
+reconcile loop can then be exercised with thousands of containers on an
+unprivileged host, e.g. for load tests and benchmarks.
+
+Every container of config.json is running and every parent interface of
+a bridge is plugged, unless stopped through SimulatedDockerClient.
+OVSDB and Docker round trips take SIMULATED_LATENCY seconds, so that the
+benefit of overlapping them can be measured.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import errno
+import ipaddress
+import os
+import socket
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import cache
+from typing import TYPE_CHECKING, Any
+
+from app.docker_client import Container
+from app.netlink import Link
+from app.ovsdb import OvsPort, OvsState
+from app.utils import SIMULATED_LATENCY, get_config, get_logger
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+_LOGGER = get_logger("simulated")
+
+HOST_NETNS = 0  # Namespace key of the host, containers use their PID
+FIRST_PID = 1000
+DEFAULT_PVID = 1  # VLAN a Linux bridge gives to new ports
+
+
+async def _round_trip() -> None:
+    """Wait as long as a request to OVSDB or the Docker daemon would."""
+    if SIMULATED_LATENCY:
+        await asyncio.sleep(SIMULATED_LATENCY)
+
+
+def _error(code: int, detail: str) -> OSError:
+    """Return the error the kernel would report.
+
+    :param code: errno value
+    :type code: int
+    :param detail: what failed
+    :type detail: str
+    :return: error, e.g. FileExistsError for EEXIST
+    :rtype: OSError
+    """
+    return OSError(code, f"{os.strerror(code)}: {detail}")
+
+
+@dataclass
+class SimulatedPort:
+    """An OVS Port row, with the external_ids of its Interface."""
+
+    bridge: str
+    external_ids: dict[str, str] = field(default_factory=dict)
+    columns: dict[str, str] = field(default_factory=dict)  # e.g. tag, trunks
+
+
+@dataclass
+class SimulatedNetwork:
+    """State shared by the simulated backends.
+
+    Links, addresses and bridge VLANs are kept per network namespace,
+    the host namespace has the key HOST_NETNS.
+    """
+
+    links: dict[int, dict[str, Link]] = field(default_factory=dict)
+    addresses: dict[tuple[int, str], list[str]] = field(default_factory=dict)
+    routes: dict[tuple[int, int], str] = field(default_factory=dict)
+    vlans: dict[tuple[int, str], set[int]] = field(default_factory=dict)
+    pvids: dict[tuple[int, str], int] = field(default_factory=dict)
+    vlan_filtering: set[tuple[int, str]] = field(default_factory=set)
+    # Both ends of each veth pair, by link index
+    peers: dict[int, tuple[int, str]] = field(default_factory=dict)
+    bridges: set[str] = field(default_factory=set)  # OVS bridges
+    ports: dict[str, SimulatedPort] = field(default_factory=dict)
+    # Ports of container interfaces, like an OVSDB index would serve them
+    container_ports: dict[tuple[str, str], str] = field(default_factory=dict)
+    calls: Counter[str] = field(default_factory=Counter)  # Operations by name
+    _next_index: int = 1
+
+    def __post_init__(self) -> None:
+        """Create the host namespace with its loopback interface."""
+        self.create_namespace(HOST_NETNS)
+
+    def namespace(self, netns: int) -> dict[str, Link]:
+        """Return the links of a namespace.
+
+        :param netns: namespace key
+        :type netns: int
+        :return: links by name
+        :rtype: dict[str, Link]
+        :raises OSError: if the namespace does not exist
+        """
+        if (links := self.links.get(netns)) is None:
+            raise _error(errno.ENOENT, f"network namespace {netns}")
+        return links
+
+    def create_namespace(self, netns: int) -> None:
+        """Create a network namespace with its loopback interface.
+
+        :param netns: namespace key
+        :type netns: int
+        """
+        self.links[netns] = {}
+        loopback = self.new_link(netns, "lo", "")
+        loopback.up, loopback.operstate = True, "unknown"
+
+    def destroy_namespace(self, netns: int) -> None:
+        """Destroy a namespace, like the kernel does once its last process exits.
+
+        Veth ends inside the namespace are deleted along with their peers.
+
+        :param netns: namespace key
+        :type netns: int
+        """
+        for name in list(self.links.get(netns, {})):
+            self.delete_link(netns, name)
+        self.links.pop(netns, None)
+        for key in [key for key in self.routes if key[0] == netns]:
+            del self.routes[key]
+
+    def new_link(self, netns: int, name: str, kind: str) -> Link:
+        """Create a link, down.
+
+        :param netns: namespace key
+        :type netns: int
+        :param name: interface name
+        :type name: str
+        :param kind: link kind, e.g. veth, empty for a physical device
+        :type kind: str
+        :return: the new link
+        :rtype: Link
+        :raises OSError: EEXIST if the name is taken
+        """
+        links = self.namespace(netns)
+        if name in links:
+            raise _error(errno.EEXIST, name)
+        index = self._next_index
+        self._next_index += 1
+        links[name] = Link(
+            index=index,
+            name=name,
+            up=False,
+            kind=kind,
+            address=f"02:00:{index >> 24 & 0xFF:02x}:{index >> 16 & 0xFF:02x}:"
+            f"{index >> 8 & 0xFF:02x}:{index & 0xFF:02x}",
+            mtu=65536 if name == "lo" else 1500,
+            operstate="down",
+        )
+        return links[name]
+
+    def delete_link(self, netns: int, name: str) -> None:
+        """Delete a link and, for a veth, its peer.
+
+        :param netns: namespace key
+        :type netns: int
+        :param name: interface name
+        :type name: str
+        """
+        links = self.namespace(netns)
+        if (link := links.pop(name, None)) is None:
+            return
+        networks = [
+            ipaddress.ip_interface(addr).network
+            for addr in self.addresses.pop((netns, name), [])
+        ]
+        # Routes through a gateway reached over the link go with it
+        for key, gateway in list(self.routes.items()):
+            if key[0] == netns and any(
+                ipaddress.ip_address(gateway) in network for network in networks
+            ):
+                del self.routes[key]
+        self.vlans.pop((netns, name), None)
+        self.pvids.pop((netns, name), None)
+        self.vlan_filtering.discard((netns, name))
+        # Ports of a deleted bridge are released
+        for other in links.values():
+            if other.master == link.index:
+                other.master = 0
+        # The peer of a veth pair goes with it, wherever it lives
+        if (peer := self.peers.pop(link.index, None)) is not None:
+            self.delete_link(*peer)
+
+    def update_operstate(self, netns: int, name: str) -> None:
+        """Derive the operational state of a link and of its veth peer.
+
+        :param netns: namespace key
+        :type netns: int
+        :param name: interface name
+        :type name: str
+        """
+        link = self.namespace(netns)[name]
+        ends = [link]
+        if (peer := self.peers.get(link.index)) is not None:
+            ends.append(self.namespace(peer[0])[peer[1]])
+        for end in ends:
+            if not end.up:
+                end.operstate = "down"
+            elif all(other.up for other in ends):
+                end.operstate = "unknown" if end.name == "lo" else "up"
+            else:
+                end.operstate = "lowerlayerdown"
+
+    def plug(self, name: str) -> None:
+        """Plug a physical interface into the host, if it is missing.
+
+        :param name: interface name
+        :type name: str
+        """
+        if name not in self.namespace(HOST_NETNS):
+            self.new_link(HOST_NETNS, name, "")
+            _LOGGER.debug("Plugged simulated interface %s", name)
+
+
+class SimulatedNetlink:
+    """Stand-in for NetlinkBackend, bound to a single namespace."""
+
+    def __init__(self, network: SimulatedNetwork, netns: int = HOST_NETNS) -> None:
+        """Bind to a namespace.
+
+        :param network: simulated state
+        :type network: SimulatedNetwork
+        :param netns: Optional, namespace key, default is the host
+        :type netns: int
+        """
+        self._network = network
+        self._netns = netns
+
+    def _call(self, method: str) -> dict[str, Link]:
+        """Count a request and return the links of the namespace.
+
+        :param method: method name
+        :type method: str
+        :return: links by name
+        :rtype: dict[str, Link]
+        """
+        self._network.calls[f"netlink.{method}"] += 1
+        return self._network.namespace(self._netns)
+
+    def _get(self, name: str) -> Link:
+        """Return a link, failing like the kernel for a missing one.
+
+        :param name: interface name
+        :type name: str
+        :return: the link
+        :rtype: Link
+        :raises OSError: if the link does not exist
+        """
+        if (link := self._network.namespace(self._netns).get(name)) is None:
+            msg = f"Cannot find device {name}"
+            raise OSError(msg)
+        return link
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+    def for_netns(self, netns_fd: int) -> SimulatedNetlink:
+        """Return a backend operating in another network namespace.
+
+        :param netns_fd: namespace key, see open_netns()
+        :type netns_fd: int
+        :return: new backend
+        :rtype: SimulatedNetlink
+        """
+        return SimulatedNetlink(self._network, netns_fd)
+
+    def open_netns(self, pid: int) -> int:
+        """Open the network namespace of a container.
+
+        :param pid: PID of the container, see SimulatedDockerClient.get_pid()
+        :type pid: int
+        :return: namespace key
+        :rtype: int
+        :raises OSError: if the container is not running
+        """
+        self._network.calls["netlink.open_netns"] += 1
+        if pid not in self._network.links:
+            raise _error(errno.ENOENT, f"/proc/{pid}/ns/net")
+        return pid
+
+    @staticmethod
+    def close_netns(netns_fd: int) -> None:
+        """Nothing to close, the namespace lives as long as the container.
+
+        :param netns_fd: namespace key
+        :type netns_fd: int
+        """
+
+    def is_netns_of(self, pid: int, netns_fd: int) -> bool:
+        """Check that a container still lives in an opened network namespace.
+
+        :param pid: PID of the container
+        :type pid: int
+        :param netns_fd: namespace key
+        :type netns_fd: int
+        :return: False if the container stopped
+        :rtype: bool
+        """
+        return pid == netns_fd and pid in self._network.links
+
+    def enable_ipv6(self, name: str) -> None:
+        """Enable IPv6 on a link, always enabled in the simulation.
+
+        :param name: interface name
+        :type name: str
+        """
+        self._call("enable_ipv6")
+        self._get(name)
+
+    def links(self) -> list[Link]:
+        """Return all links of the namespace.
+
+        :return: links
+        :rtype: list[Link]
+        """
+        return list(self._call("links").values())
+
+    def link(self, name: str) -> Link | None:
+        """Return a link by name.
+
+        :param name: interface name
+        :type name: str
+        :return: the link, None if it does not exist
+        :rtype: Link | None
+        """
+        return self._call("link").get(name)
+
+    def add_veth(
+        self,
+        name: str,
+        peer: str,
+        *,
+        peer_netns: int | None = None,
+        peer_address: str | None = None,
+    ) -> None:
+        """Create a veth pair.
+
+        :param name: name of the first end
+        :type name: str
+        :param peer: name of the peer end
+        :type peer: str
+        :param peer_netns: Optional, namespace key to create the peer end in
+        :type peer_netns: int | None
+        :param peer_address: Optional, MAC address of the peer end
+        :type peer_address: str | None
+        :raises OSError: EEXIST if a name is taken
+        """
+        self._call("add_veth")
+        peer_ns = self._netns if peer_netns is None else peer_netns
+        if peer in self._network.namespace(peer_ns) or (
+            peer_ns == self._netns and peer == name
+        ):
+            raise _error(errno.EEXIST, peer)
+        link = self._network.new_link(self._netns, name, "veth")
+        peer_link = self._network.new_link(peer_ns, peer, "veth")
+        if peer_address:
+            peer_link.address = peer_address.lower()
+        self._network.peers[link.index] = (peer_ns, peer)
+        self._network.peers[peer_link.index] = (self._netns, name)
+
+    def add_bridge(self, name: str) -> None:
+        """Create a Linux bridge.
+
+        :param name: bridge name
+        :type name: str
+        """
+        self._call("add_bridge")
+        self._network.new_link(self._netns, name, "bridge")
+
+    def delete_link(self, name: str) -> None:
+        """Delete a link, if it exists, and for a veth its peer.
+
+        :param name: interface name
+        :type name: str
+        """
+        self._call("delete_link")
+        self._network.delete_link(self._netns, name)
+
+    def set_link(
+        self,
+        name: str,
+        *,
+        up: bool | None = None,
+        master: str | None = None,
+        vlan_filtering: bool | None = None,
+    ) -> None:
+        """Change the state of a link.
+
+        :param name: interface name
+        :type name: str
+        :param up: Optional, bring the link up (True) or down (False)
+        :type up: bool | None
+        :param master: Optional, bridge to enslave the link to, empty to release it
+        :type master: str | None
+        :param vlan_filtering: Optional, toggle VLAN filtering of a Linux bridge
+        :type vlan_filtering: bool | None
+        :raises OSError: if a link does not exist or the master is not a bridge
+        """
+        self._call("set_link")
+        link = self._get(name)
+        key = (self._netns, name)
+        if master == "":
+            link.master = 0
+            self._network.vlans.pop(key, None)
+            self._network.pvids.pop(key, None)
+        elif master is not None:
+            if (bridge := self._get(master)).kind != "bridge":
+                raise _error(errno.EINVAL, f"{master} is not a bridge")
+            if link.master != bridge.index:
+                link.master = bridge.index
+                self._network.vlans[key] = {DEFAULT_PVID}
+                self._network.pvids[key] = DEFAULT_PVID
+        if vlan_filtering is not None:
+            if link.kind != "bridge":
+                raise _error(errno.EOPNOTSUPP, f"{name} is not a bridge")
+            if vlan_filtering:
+                self._network.vlan_filtering.add(key)
+            else:
+                self._network.vlan_filtering.discard(key)
+        if up is not None:
+            link.up = up
+            self._network.update_operstate(self._netns, name)
+
+    def _bridge_port(self, name: str) -> tuple[int, str]:
+        """Return the key of a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :return: namespace key and port name
+        :rtype: tuple[int, str]
+        :raises OSError: if the link is not enslaved to a bridge
+        """
+        if not self._get(name).master:
+            raise _error(errno.EOPNOTSUPP, f"{name} is not a bridge port")
+        return self._netns, name
+
+    def bridge_vlans(self, name: str) -> list[int]:
+        """Return the VLAN ids configured on a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :return: VLAN ids
+        :rtype: list[int]
+        """
+        self._call("bridge_vlans")
+        return sorted(self._network.vlans.get((self._netns, name), ()))
+
+    def all_bridge_vlans(self) -> dict[int, list[int]]:
+        """Return the VLAN ids of all Linux bridge ports of the namespace.
+
+        :return: VLAN ids by interface index
+        :rtype: dict[int, list[int]]
+        """
+        links = self._call("all_bridge_vlans")
+        return {
+            links[name].index: sorted(vids)
+            for (netns, name), vids in self._network.vlans.items()
+            if netns == self._netns and vids
+        }
+
+    def add_bridge_vlan(self, name: str, vid: int, *, pvid: bool = False) -> None:
+        """Add a VLAN to a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        :param pvid: Optional, also make it the port VLAN id, untagged
+        :type pvid: bool
+        :raises OSError: if the link is not a bridge port or the VLAN id is invalid
+        """
+        self._call("add_bridge_vlan")
+        key = self._bridge_port(name)
+        if not 1 <= vid <= 4094:  # noqa: PLR2004
+            raise _error(errno.EINVAL, f"VLAN id {vid}")
+        self._network.vlans.setdefault(key, set()).add(vid)
+        if pvid:
+            self._network.pvids[key] = vid
+
+    def del_bridge_vlan(self, name: str, vid: int) -> None:
+        """Remove a VLAN from a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        :raises OSError: ENOENT if the VLAN is not configured on the port
+        """
+        self._call("del_bridge_vlan")
+        key = self._bridge_port(name)
+        if vid not in self._network.vlans.get(key, ()):
+            raise _error(errno.ENOENT, f"VLAN {vid} on {name}")
+        self._network.vlans[key].discard(vid)
+        if self._network.pvids.get(key) == vid:
+            del self._network.pvids[key]
+
+    def addresses(
+        self, name: str | None = None, family: int = socket.AF_UNSPEC
+    ) -> list[tuple[int, str]]:
+        """Return addresses of the namespace.
+
+        :param name: Optional, only return the addresses of this interface
+        :type name: str | None
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        :return: interface index and "address/prefix" pairs
+        :rtype: list[tuple[int, str]]
+        """
+        links = self._call("addresses")
+        version = {socket.AF_INET: 4, socket.AF_INET6: 6}.get(family)
+        names = list(links) if name is None else [name] if name in links else []
+        return [
+            (links[link_name].index, addr)
+            for link_name in names
+            for addr in self._network.addresses.get((self._netns, link_name), [])
+            if version in (None, ipaddress.ip_interface(addr).version)
+        ]
+
+    def add_address(self, name: str, addr: str) -> None:
+        """Add an address to a link.
+
+        :param name: interface name
+        :type name: str
+        :param addr: address with prefix, e.g. "10.1.1.1/24"
+        :type addr: str
+        :raises OSError: EEXIST if the link already has the address
+        """
+        self._call("add_address")
+        self._get(name)
+        addr = ipaddress.ip_interface(addr).with_prefixlen
+        addresses = self._network.addresses.setdefault((self._netns, name), [])
+        if addr in addresses:
+            raise _error(errno.EEXIST, addr)
+        addresses.append(addr)
+
+    def flush_addresses(self, name: str, family: int = socket.AF_UNSPEC) -> None:
+        """Remove all addresses of a link, if it exists.
+
+        :param name: interface name
+        :type name: str
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        """
+        for _, addr in self.addresses(name, family):
+            self._call("flush_addresses")
+            self._network.addresses[self._netns, name].remove(addr)
+
+    def add_default_route(self, gateway: str) -> None:
+        """Add a default route through a gateway.
+
+        :param gateway: IPv4 or IPv6 gateway address
+        :type gateway: str
+        :raises OSError: EEXIST if the namespace has a default route already
+        """
+        self._call("add_default_route")
+        address = ipaddress.ip_address(gateway)
+        if (key := (self._netns, address.version)) in self._network.routes:
+            raise _error(errno.EEXIST, f"default via {gateway}")
+        self._network.routes[key] = str(address)
+
+
+class SimulatedOvsBackend:
+    """Stand-in for OvsdbBackend, writes are applied right away."""
+
+    def __init__(self, network: SimulatedNetwork) -> None:
+        """Initialize the backend.
+
+        :param network: simulated state, bridges get a kernel device
+        :type network: SimulatedNetwork
+        """
+        self._network = network
+
+    def _call(self, method: str) -> None:
+        """Count a request.
+
+        :param method: method name
+        :type method: str
+        """
+        self._network.calls[f"ovs.{method}"] += 1
+
+    @staticmethod
+    def _container_key(external_ids: dict[str, str]) -> tuple[str, str] | None:
+        """Return the container interface a port is tagged with.
+
+        :param external_ids: external_ids of the interface
+        :type external_ids: dict[str, str]
+        :return: container name and interface, None if not a container port
+        :rtype: tuple[str, str] | None
+        """
+        if "container_id" in external_ids and "container_iface" in external_ids:
+            return external_ids["container_id"], external_ids["container_iface"]
+        return None
+
+    def _remove_port(self, port: str) -> None:
+        """Remove a port row and its index entry.
+
+        :param port: port name
+        :type port: str
+        """
+        if (removed := self._network.ports.pop(port, None)) is None:
+            return
+        if key := self._container_key(removed.external_ids):
+            self._network.container_ports.pop(key, None)
+
+    async def commit(self) -> None:
+        """Commit the pending writes, nothing is pending."""
+        self._call("commit")
+        await _round_trip()
+
+    async def dump(self) -> OvsState:
+        """Read all bridges and ports at once.
+
+        :return: state of OVS
+        :rtype: OvsState
+        """
+        self._call("dump")
+        await _round_trip()
+        state = OvsState(bridges=set(self._network.bridges))
+        for name, row in self._network.ports.items():
+            state.ports[name] = OvsPort(
+                name=name,
+                bridge=row.bridge,
+                tag=[vid for vid in row.columns.get("tag", "").split(",") if vid],
+                trunks=[vid for vid in row.columns.get("trunks", "").split(",") if vid],
+                vlan_mode=row.columns.get("vlan_mode", ""),
+                external_ids=dict(row.external_ids),
+            )
+        return state
+
+    async def bridge_exists(self, bridge: str) -> bool:
+        """Check if a bridge exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :return: True if the bridge exists
+        :rtype: bool
+        """
+        self._call("bridge_exists")
+        await _round_trip()
+        return bridge in self._network.bridges
+
+    async def add_bridge(self, bridge: str) -> None:
+        """Create a bridge with its internal port, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        self._call("add_bridge")
+        if bridge in self._network.bridges:
+            return
+        self._network.bridges.add(bridge)
+        self._network.ports[bridge] = SimulatedPort(bridge)
+        self._network.new_link(HOST_NETNS, bridge, "openvswitch")
+
+    async def del_bridge(self, bridge: str) -> None:
+        """Delete a bridge with all its ports, if it exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        self._call("del_bridge")
+        if bridge not in self._network.bridges:
+            return
+        self._network.bridges.discard(bridge)
+        for port in [
+            name for name, row in self._network.ports.items() if row.bridge == bridge
+        ]:
+            self._remove_port(port)
+        self._network.delete_link(HOST_NETNS, bridge)
+
+    async def port_to_br(self, port: str) -> str:
+        """Return the bridge a port belongs to.
+
+        :param port: port name
+        :type port: str
+        :return: bridge name, empty if the port does not exist
+        :rtype: str
+        """
+        self._call("port_to_br")
+        await _round_trip()
+        return row.bridge if (row := self._network.ports.get(port)) else ""
+
+    async def add_port(
+        self,
+        bridge: str,
+        port: str,
+        external_ids: dict[str, str] | None = None,
+        **columns: str,
+    ) -> None:
+        """Add a port to a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :param port: port (and interface) name
+        :type port: str
+        :param external_ids: Optional, external_ids of the interface
+        :type external_ids: dict[str, str] | None
+        :param columns: Optional, Port columns e.g. tag="100"
+        :type columns: str
+        :raises ValueError: if the bridge does not exist
+        """
+        self._call("add_port")
+        if port in self._network.ports:
+            return
+        if bridge not in self._network.bridges:
+            msg = f"No bridge named {bridge}"
+            raise ValueError(msg)
+        self._network.ports[port] = SimulatedPort(
+            bridge, dict(external_ids or {}), dict(columns)
+        )
+        if key := self._container_key(external_ids or {}):
+            self._network.container_ports[key] = port
+
+    async def del_port(self, port: str) -> None:
+        """Remove a port from its bridge, if it exists.
+
+        :param port: port name
+        :type port: str
+        """
+        self._call("del_port")
+        self._remove_port(port)
+
+    async def get_port_vlans(self, port: str, column: str) -> list[str]:
+        """Return the VLAN ids held in a Port column.
+
+        :param port: port name
+        :type port: str
+        :param column: "tag" or "trunks"
+        :type column: str
+        :return: VLAN ids, empty if unset or if the port does not exist
+        :rtype: list[str]
+        """
+        self._call("get_port_vlans")
+        await _round_trip()
+        if (row := self._network.ports.get(port)) is None:
+            return []
+        return [vid for vid in row.columns.get(column, "").split(",") if vid]
+
+    async def set_port(self, port: str, **columns: str) -> None:
+        """Set columns of a port.
+
+        :param port: port name
+        :type port: str
+        :param columns: Port columns e.g. vlan_mode="access", tag="100"
+        :type columns: str
+        :raises ValueError: if the port does not exist
+        """
+        self._call("set_port")
+        if (row := self._network.ports.get(port)) is None:
+            msg = f"No port named {port}"
+            raise ValueError(msg)
+        row.columns.update(columns)
+
+    async def clear_port(self, port: str, column: str) -> None:
+        """Clear a set column of a port.
+
+        :param port: port name
+        :type port: str
+        :param column: column name, e.g. "trunks"
+        :type column: str
+        :raises ValueError: if the port does not exist
+        """
+        self._call("clear_port")
+        if (row := self._network.ports.get(port)) is None:
+            msg = f"No port named {port}"
+            raise ValueError(msg)
+        row.columns.pop(column, None)
+
+    async def find_port(self, external_ids: dict[str, str]) -> str:
+        """Return the port whose interface has the given external_ids.
+
+        :param external_ids: external_ids the interface must include
+        :type external_ids: dict[str, str]
+        :return: port name, empty if there is none
+        :rtype: str
+        """
+        self._call("find_port")
+        await _round_trip()
+        key = self._container_key(external_ids)
+        if key and len(external_ids) == len(key):
+            return self._network.container_ports.get(key, "")
+        for name, row in self._network.ports.items():
+            if external_ids.items() <= row.external_ids.items():
+                return name
+        return ""
+
+
+class SimulatedDockerClient:
+    """Stand-in for DockerClient, running the containers of config.json.
+
+    Each container gets its own network namespace, keyed by its PID.
+    Containers can be stopped, started and removed, which destroys or
+    creates their namespace and publishes the events the Docker daemon
+    would.
+    """
+
+    def __init__(self, network: SimulatedNetwork) -> None:
+        """Initialize the daemon, containers are started by refresh().
+
+        :param network: simulated state
+        :type network: SimulatedNetwork
+        """
+        self._network = network
+        self._containers: dict[str, Container] = {}
+        self._stopped: set[str] = set()  # Kept down until started explicitly
+        self._next_pid = FIRST_PID
+        self._generation = 0
+        self._subscribers: list[asyncio.Queue[dict[str, Any]]] = []
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+    def _publish(self, action: str, name: str) -> None:
+        """Publish a container event to the subscribers.
+
+        :param action: event action, e.g. start
+        :type action: str
+        :param name: container name
+        :type name: str
+        """
+        event = {
+            "Type": "container",
+            "Action": action,
+            "Actor": {"Attributes": {"name": name}},
+            "timeNano": time.time_ns(),
+        }
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def start(self, name: str) -> Container:
+        """Start a container in a new network namespace.
+
+        :param name: container name
+        :type name: str
+        :return: the running container
+        :rtype: Container
+        """
+        self._stopped.discard(name)
+        if (container := self._containers.get(name)) is not None:
+            return container
+        pid, self._next_pid = self._next_pid, self._next_pid + 1
+        self._generation += 1
+        self._network.create_namespace(pid)
+        container = Container(id=f"{self._generation:064x}", name=name, pid=pid)
+        self._containers[name] = container
+        self._publish("start", name)
+        return container
+
+    def stop(self, name: str) -> None:
+        """Stop a container, its network namespace goes away with it.
+
+        :param name: container name
+        :type name: str
+        """
+        self._stopped.add(name)
+        if (container := self._containers.pop(name, None)) is None:
+            return
+        self._network.destroy_namespace(container.pid)
+        self._publish("die", name)
+
+    def restart(self, name: str) -> Container:
+        """Restart a container, it gets a new network namespace.
+
+        :param name: container name
+        :type name: str
+        :return: the running container
+        :rtype: Container
+        """
+        self.stop(name)
+        container = self.start(name)
+        self._publish("restart", name)
+        return container
+
+    def remove(self, name: str) -> None:
+        """Stop and remove a container.
+
+        :param name: container name
+        :type name: str
+        """
+        self.stop(name)
+        self._publish("destroy", name)
+
+    async def refresh(self) -> dict[str, Container]:
+        """List the running containers.
+
+        Containers of config.json that were never stopped are started and
+        the parent interfaces of its bridges are plugged, like a test bed
+        brought up for the configuration would have them.
+
+        :return: running containers by name
+        :rtype: dict[str, Container]
+        """
+        self._network.calls["docker.refresh"] += 1
+        await _round_trip()
+        config = get_config()
+        for info in config["bridge"].values():
+            for parent in info.get("parents", []):
+                if not parent.get("iface", "usb:").startswith("usb:"):
+                    self._network.plug(parent["iface"])
+        for name in config["container"]:
+            if name not in self._containers and name not in self._stopped:
+                self.start(name)
+        return self._containers
+
+    def container(self, name: str) -> Container | None:
+        """Return a running container.
+
+        :param name: container name
+        :type name: str
+        :return: the container, None if it is not running
+        :rtype: Container | None
+        """
+        return self._containers.get(name)
+
+    async def get_pid(self, name: str) -> int:
+        """Return the PID of a running container.
+
+        :param name: container name
+        :type name: str
+        :return: PID of the container, also the key of its namespace
+        :rtype: int
+        :raises ValueError: if the container is not running
+        """
+        self._network.calls["docker.get_pid"] += 1
+        await _round_trip()
+        if (container := self.container(name)) is None:
+            msg = f"Container {name} is not running"
+            raise ValueError(msg)
+        return container.pid
+
+    async def events(
+        self, filters: dict[str, list[str]], since: str | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Subscribe to the container events.
+
+        :param filters: Docker event filters, only "event" is applied
+        :type filters: dict[str, list[str]]
+        :param since: Optional, ignored, the stream is never interrupted
+        :type since: str | None
+        :yield: container event
+        """
+        del since
+        queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                if event["Action"] in filters.get("event", [event["Action"]]):
+                    yield event
+        finally:
+            self._subscribers.remove(queue)
+
+
+@cache
+def get_simulated_network() -> SimulatedNetwork:
+    """Return the state shared by the simulated backends.
+
+    :return: simulated network
+    :rtype: SimulatedNetwork
+    """
+    _LOGGER.warning("Using the simulated network, nothing is configured on the host")
+    return SimulatedNetwork()
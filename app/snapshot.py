@@ -0,0 +1,482 @@
+"""Observed state of the network, read in bulk once per reconcile pass.
+
+A Snapshot holds all OVS bridges and ports, host links, addresses and
+Linux bridge VLANs, indexed by name and by the container interface an OVS
+port is tagged with. While a snapshot is in use, see use_snapshot(), the
+backends returned by get_ovs_backend() and get_link_backend() answer the
+probes of ovs_lib from it instead of querying OVS or the kernel.
+
+Writes go through to the real backend. The objects they touch are marked
+stale, later probes of those objects are answered by the real backend,
+which also sees the writes pending in the OVS transaction.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+import socket
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from app.netlink import Link, NetlinkBackend
+    from app.ovs_lib import VsctlBackend
+    from app.ovsdb import OvsdbBackend, OvsPort, OvsState
+    from app.simulated import SimulatedNetlink, SimulatedOvsBackend
+
+# Snapshot of the running reconcile pass
+SNAPSHOT: ContextVar[Snapshot | None] = ContextVar("snapshot", default=None)
+
+# external_ids tagging the bridge port of a container interface
+CONTAINER_KEYS = ("container_id", "container_iface")
+
+
+@dataclass
+class Snapshot:
+    """Bridges, ports and interfaces of the host and of running containers."""
+
+    ovs: OvsState | None  # None with Linux bridges
+    links: dict[str, Link]  # Host interfaces by name
+    addresses: dict[str, list[str]]  # Host addresses by interface name
+    vlans: dict[str, set[str]]  # Linux bridge port VLANs by interface name
+    containers: dict[str, dict[str, Link]]  # Interfaces of running containers
+    # OVS ports by the (container_id, container_iface) they are tagged with
+    container_ports: dict[tuple[str, str], OvsPort] = field(init=False)
+    # Objects written to since the snapshot was taken
+    stale_links: set[str] = field(default_factory=set)
+    stale_ports: set[str | tuple[str, str]] = field(default_factory=set)
+    _views: dict[str, Any] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        """Index the OVS ports by the container interface they are tagged with."""
+        self.container_ports = {}
+        for port in self.ovs.ports.values() if self.ovs else ():
+            key = tuple(port.external_ids.get(name, "") for name in CONTAINER_KEYS)
+            if all(key):
+                self.container_ports[key] = port
+
+    def ovs_view(
+        self, backend: OvsdbBackend | VsctlBackend | SimulatedOvsBackend
+    ) -> SnapshotOvsBackend:
+        """Return the OVS backend answering its reads from the snapshot.
+
+        :param backend: backend the writes and stale reads go to
+        :type backend: OvsdbBackend | VsctlBackend | SimulatedOvsBackend
+        :return: backend view
+        :rtype: SnapshotOvsBackend
+        """
+        if (view := self._views.get("ovs")) is None:
+            view = self._views["ovs"] = SnapshotOvsBackend(backend, self)
+        return view
+
+    def link_view(
+        self, backend: NetlinkBackend | SimulatedNetlink
+    ) -> SnapshotLinkBackend:
+        """Return the netlink backend answering its reads from the snapshot.
+
+        :param backend: backend the writes and stale reads go to
+        :type backend: NetlinkBackend | SimulatedNetlink
+        :return: backend view
+        :rtype: SnapshotLinkBackend
+        """
+        if (view := self._views.get("links")) is None:
+            view = self._views["links"] = SnapshotLinkBackend(backend, self)
+        return view
+
+
+@contextmanager
+def use_snapshot(snapshot: Snapshot) -> Iterator[Snapshot]:
+    """Answer the probes of a block from a snapshot.
+
+    :param snapshot: snapshot taken at the start of the block
+    :type snapshot: Snapshot
+    :yield: the snapshot
+    """
+    token = SNAPSHOT.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        SNAPSHOT.reset(token)
+
+
+class SnapshotOvsBackend:
+    """OVS backend reading from a snapshot, other calls go to the real one."""
+
+    def __init__(
+        self,
+        backend: OvsdbBackend | VsctlBackend | SimulatedOvsBackend,
+        snapshot: Snapshot,
+    ) -> None:
+        """Initialize the view.
+
+        :param backend: OVS backend
+        :type backend: OvsdbBackend | VsctlBackend | SimulatedOvsBackend
+        :param snapshot: snapshot holding the OVS state
+        :type snapshot: Snapshot
+        """
+        self._backend = backend
+        self._snapshot = snapshot
+        self._ovs = snapshot.ovs
+        self._stale = snapshot.stale_ports
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        """Forward calls without a snapshot answer to the real backend.
+
+        :param name: attribute name
+        :type name: str
+        :return: attribute of the real backend
+        :rtype: Any
+        """
+        return getattr(self._backend, name)
+
+    def _touch(self, port: str) -> None:
+        """Mark a port, and the container interface it is tagged with, stale.
+
+        :param port: port name
+        :type port: str
+        """
+        self._stale.add(port)
+        if self._ovs and (row := self._ovs.ports.get(port)) is not None:
+            key = tuple(row.external_ids.get(name, "") for name in CONTAINER_KEYS)
+            self._stale.add(key)
+
+    async def bridge_exists(self, bridge: str) -> bool:
+        """Check if a bridge exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :return: True if the bridge exists
+        :rtype: bool
+        """
+        if self._ovs is None or bridge in self._stale:
+            return await self._backend.bridge_exists(bridge)
+        return bridge in self._ovs.bridges
+
+    async def port_to_br(self, port: str) -> str:
+        """Return the bridge a port belongs to.
+
+        :param port: port name
+        :type port: str
+        :return: bridge name, empty if the port does not exist
+        :rtype: str
+        """
+        if self._ovs is None or port in self._stale:
+            return await self._backend.port_to_br(port)
+        row = self._ovs.ports.get(port)
+        return row.bridge if row is not None else ""
+
+    async def get_port_vlans(self, port: str, column: str) -> list[str]:
+        """Return the VLAN ids held in a Port column.
+
+        :param port: port name
+        :type port: str
+        :param column: "tag" or "trunks"
+        :type column: str
+        :return: VLAN ids, empty if unset or if the port does not exist
+        :rtype: list[str]
+        """
+        if self._ovs is None or port in self._stale:
+            return await self._backend.get_port_vlans(port, column)
+        row = self._ovs.ports.get(port)
+        return list(getattr(row, column)) if row is not None else []
+
+    async def find_port(self, external_ids: dict[str, str]) -> str:
+        """Return the port whose interface has the given external_ids.
+
+        Only container interface lookups are answered from the snapshot.
+
+        :param external_ids: external_ids the interface must include
+        :type external_ids: dict[str, str]
+        :return: port name, empty if there is none
+        :rtype: str
+        """
+        key = tuple(external_ids.get(name, "") for name in CONTAINER_KEYS)
+        if set(external_ids) != set(CONTAINER_KEYS) or key in self._stale:
+            return await self._backend.find_port(external_ids)
+        row = self._snapshot.container_ports.get(key)  # type: ignore[arg-type]
+        if row is not None and row.name in self._stale:
+            return await self._backend.find_port(external_ids)
+        return row.name if row is not None else ""
+
+    async def add_bridge(self, bridge: str) -> None:
+        """Create a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        self._stale.add(bridge)
+        # Its internal interface shows up once committed
+        self._snapshot.stale_links.add(bridge)
+        await self._backend.add_bridge(bridge)
+
+    async def del_bridge(self, bridge: str) -> None:
+        """Delete a bridge, if it exists.
+
+        :param bridge: bridge name
+        :type bridge: str
+        """
+        self._stale.add(bridge)
+        self._snapshot.stale_links.add(bridge)
+        for row in self._ovs.ports.values() if self._ovs else ():
+            if row.bridge == bridge:
+                self._touch(row.name)
+        await self._backend.del_bridge(bridge)
+
+    async def add_port(
+        self,
+        bridge: str,
+        port: str,
+        external_ids: dict[str, str] | None = None,
+        **columns: str,
+    ) -> None:
+        """Add a port to a bridge, if it does not exist.
+
+        :param bridge: bridge name
+        :type bridge: str
+        :param port: port (and interface) name
+        :type port: str
+        :param external_ids: Optional, external_ids of the interface
+        :type external_ids: dict[str, str] | None
+        :param columns: Optional, Port columns e.g. tag="100"
+        :type columns: str
+        """
+        self._touch(port)
+        if external_ids:
+            self._stale.add(
+                tuple(external_ids.get(name, "") for name in CONTAINER_KEYS)
+            )
+        await self._backend.add_port(bridge, port, external_ids, **columns)
+
+    async def del_port(self, port: str) -> None:
+        """Remove a port from its bridge, if it exists.
+
+        :param port: port name
+        :type port: str
+        """
+        self._touch(port)
+        await self._backend.del_port(port)
+
+    async def set_port(self, port: str, **columns: str) -> None:
+        """Set columns of a port.
+
+        :param port: port name
+        :type port: str
+        :param columns: Port columns e.g. vlan_mode="access", tag="100"
+        :type columns: str
+        """
+        self._touch(port)
+        await self._backend.set_port(port, **columns)
+
+    async def clear_port(self, port: str, column: str) -> None:
+        """Clear a set column of a port.
+
+        :param port: port name
+        :type port: str
+        :param column: column name, e.g. "trunks"
+        :type column: str
+        """
+        self._touch(port)
+        await self._backend.clear_port(port, column)
+
+
+class SnapshotLinkBackend:
+    """Netlink backend reading host links from a snapshot.
+
+    Other namespaces, see for_netns(), are served by the real backend.
+    """
+
+    def __init__(
+        self, backend: NetlinkBackend | SimulatedNetlink, snapshot: Snapshot
+    ) -> None:
+        """Initialize the view.
+
+        :param backend: netlink backend of the host namespace
+        :type backend: NetlinkBackend | SimulatedNetlink
+        :param snapshot: snapshot holding the host links
+        :type snapshot: Snapshot
+        """
+        self._backend = backend
+        self._snapshot = snapshot
+        self._stale = snapshot.stale_links
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        """Forward calls without a snapshot answer to the real backend.
+
+        :param name: attribute name
+        :type name: str
+        :return: attribute of the real backend
+        :rtype: Any
+        """
+        return getattr(self._backend, name)
+
+    def link(self, name: str) -> Link | None:
+        """Return a link by name.
+
+        :param name: interface name
+        :type name: str
+        :return: the link, None if it does not exist
+        :rtype: Link | None
+        """
+        if name in self._stale:
+            return self._backend.link(name)
+        return self._snapshot.links.get(name)
+
+    def addresses(
+        self, name: str | None = None, family: int = socket.AF_UNSPEC
+    ) -> list[tuple[int, str]]:
+        """Return addresses, of a single interface from the snapshot.
+
+        :param name: Optional, only return the addresses of this interface
+        :type name: str | None
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        :return: interface index and "address/prefix" pairs
+        :rtype: list[tuple[int, str]]
+        """
+        if name is None or name in self._stale:
+            return self._backend.addresses(name, family)
+        if (link := self._snapshot.links.get(name)) is None:
+            return []
+        version = {socket.AF_INET: 4, socket.AF_INET6: 6}.get(family)
+        return [
+            (link.index, addr)
+            for addr in self._snapshot.addresses.get(name, [])
+            if version in (None, ipaddress.ip_interface(addr).version)
+        ]
+
+    def bridge_vlans(self, name: str) -> list[int]:
+        """Return the VLAN ids of a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :return: VLAN ids
+        :rtype: list[int]
+        """
+        if self._snapshot.ovs is not None or name in self._stale:
+            return self._backend.bridge_vlans(name)  # VLANs were not read
+        return sorted(int(vid) for vid in self._snapshot.vlans.get(name, ()))
+
+    def add_veth(
+        self,
+        name: str,
+        peer: str,
+        *,
+        peer_netns: int | None = None,
+        peer_address: str | None = None,
+    ) -> None:
+        """Create a veth pair.
+
+        :param name: name of the first end
+        :type name: str
+        :param peer: name of the second end
+        :type peer: str
+        :param peer_netns: Optional, namespace file descriptor for the peer
+        :type peer_netns: int | None
+        :param peer_address: Optional, MAC address of the peer
+        :type peer_address: str | None
+        """
+        self._stale.add(name)
+        if peer_netns is None:
+            self._stale.add(peer)
+        self._backend.add_veth(
+            name, peer, peer_netns=peer_netns, peer_address=peer_address
+        )
+
+    def add_bridge(self, name: str) -> None:
+        """Create a Linux bridge.
+
+        :param name: bridge name
+        :type name: str
+        """
+        self._stale.add(name)
+        self._backend.add_bridge(name)
+
+    def delete_link(self, name: str) -> None:
+        """Delete a link, if it exists.
+
+        :param name: interface name
+        :type name: str
+        """
+        self._stale.add(name)
+        if (link := self._snapshot.links.get(name)) is not None:
+            # Ports of a deleted bridge are released
+            self._stale.update(
+                port.name
+                for port in self._snapshot.links.values()
+                if port.master == link.index
+            )
+        self._backend.delete_link(name)
+
+    def set_link(
+        self,
+        name: str,
+        *,
+        up: bool | None = None,
+        master: str | None = None,
+        vlan_filtering: bool | None = None,
+    ) -> None:
+        """Change the state of a link.
+
+        :param name: interface name
+        :type name: str
+        :param up: Optional, bring the link up (True) or down (False)
+        :type up: bool | None
+        :param master: Optional, bridge to enslave to, "" to release
+        :type master: str | None
+        :param vlan_filtering: Optional, VLAN filtering of a Linux bridge
+        :type vlan_filtering: bool | None
+        """
+        self._stale.add(name)
+        self._backend.set_link(
+            name, up=up, master=master, vlan_filtering=vlan_filtering
+        )
+
+    def add_bridge_vlan(self, name: str, vid: int, *, pvid: bool = False) -> None:
+        """Add a VLAN to a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        :param pvid: Optional, make it the port VLAN id, untagged
+        :type pvid: bool
+        """
+        self._stale.add(name)
+        self._backend.add_bridge_vlan(name, vid, pvid=pvid)
+
+    def del_bridge_vlan(self, name: str, vid: int) -> None:
+        """Remove a VLAN from a Linux bridge port.
+
+        :param name: bridge port name
+        :type name: str
+        :param vid: VLAN id
+        :type vid: int
+        """
+        self._stale.add(name)
+        self._backend.del_bridge_vlan(name, vid)
+
+    def add_address(self, name: str, addr: str) -> None:
+        """Add an address to a link.
+
+        :param name: interface name
+        :type name: str
+        :param addr: address with prefix, e.g. "10.1.1.1/24"
+        :type addr: str
+        """
+        self._stale.add(name)
+        self._backend.add_address(name, addr)
+
+    def flush_addresses(self, name: str, family: int = socket.AF_UNSPEC) -> None:
+        """Remove the addresses of a link.
+
+        :param name: interface name
+        :type name: str
+        :param family: Optional, AF_INET or AF_INET6, default is both
+        :type family: int
+        """
+        self._stale.add(name)
+        self._backend.flush_addresses(name, family)
@@ -0,0 +1,133 @@
+"""Trace of the commands executed by the orchestrator.
+
+Every external command, Docker API request, OVSDB request and rtnetlink
+request is recorded in a fixed-size ring buffer, along with the API
+request or reconcile pass that caused it. The buffer is served at
+/debug/commands, so slow or redundant calls can be found without
+enabling DEBUG logging.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+TRACE_SIZE = int(os.environ.get("COMMAND_TRACE_SIZE", "2000"))
+TRACE_STDERR_LIMIT = 512  # Characters of stderr or error kept per entry
+
+# API request, background job or reconcile pass the current task works for
+TRACE_ORIGIN: ContextVar[str] = ContextVar("TRACE_ORIGIN", default="")
+
+_TRACES: deque[CommandTrace] = deque(maxlen=TRACE_SIZE)
+
+
+@dataclass
+class CommandTrace:
+    """A command executed on behalf of an API request or reconcile pass."""
+
+    kind: str  # exec, docker, ovsdb or netlink
+    argv: list[str]
+    origin: str
+    start: float = field(default_factory=time.time)
+    duration: float = 0.0
+    returncode: int | None = None  # Exit code, HTTP status or errno
+    stderr: str = ""
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the entry as reported by the API.
+
+        :return: trace entry
+        :rtype: dict[str, Any]
+        """
+        return asdict(self)
+
+
+@contextmanager
+def trace_command(kind: str, argv: list[str]) -> Iterator[CommandTrace]:
+    """Record a command in the ring buffer once it finishes.
+
+    The caller fills in the return code and stderr. If the block raises,
+    the error is recorded as stderr.
+
+    :param kind: command kind, e.g. exec
+    :type kind: str
+    :param argv: command arguments
+    :type argv: list[str]
+    :yield: the trace entry of the command
+    """
+    entry = CommandTrace(kind=kind, argv=argv, origin=TRACE_ORIGIN.get())
+    start = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as exc:
+        entry.stderr = entry.stderr or f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        entry.duration = time.perf_counter() - start
+        entry.stderr = entry.stderr[:TRACE_STDERR_LIMIT]
+        _TRACES.append(entry)
+
+
+def get_traces(  # noqa: PLR0913
+    *,
+    kind: str | None = None,
+    origin: str | None = None,
+    contains: str | None = None,
+    min_duration: float = 0.0,
+    failed: bool | None = None,
+    limit: int | None = None,
+) -> list[CommandTrace]:
+    """Return the recorded commands matching all given filters, newest first.
+
+    :param kind: Optional, command kind
+    :type kind: str | None
+    :param origin: Optional, prefix of the origin, e.g. "reconcile"
+    :type origin: str | None
+    :param contains: Optional, substring of the joined arguments
+    :type contains: str | None
+    :param min_duration: Optional, minimum duration in seconds
+    :type min_duration: float
+    :param failed: Optional, only failed (True) or successful (False) ones
+    :type failed: bool | None
+    :param limit: Optional, maximum number of entries
+    :type limit: int | None
+    :return: matching entries
+    :rtype: list[CommandTrace]
+    """
+    matches = []
+    for entry in reversed(_TRACES):
+        if kind and entry.kind != kind:
+            continue
+        if origin and not entry.origin.startswith(origin):
+            continue
+        if contains and contains not in " ".join(entry.argv):
+            continue
+        if entry.duration < min_duration:
+            continue
+        if failed is not None and _failed(entry) != failed:
+            continue
+        matches.append(entry)
+        if limit and len(matches) >= limit:
+            break
+    return matches
+
+
+def _failed(entry: CommandTrace) -> bool:
+    """Tell whether a command failed.
+
+    :param entry: trace entry
+    :type entry: CommandTrace
+    :return: True if the command did not complete successfully
+    :rtype: bool
+    """
+    if entry.kind == "docker":
+        return entry.returncode is None or entry.returncode >= 400  # noqa: PLR2004
+    return entry.returncode != 0
@@ -7,6 +7,8 @@ Provides a logger provider function for use in other modules.
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import copy
 import hashlib
 import ipaddress
 import json
@@ -15,15 +17,43 @@ import os
 import sys
 from functools import cache
 from pathlib import Path
-from subprocess import CalledProcessError, CompletedProcess, run
-from typing import Any, TypedDict, TypeVar
+from subprocess import CalledProcessError, CompletedProcess
+from typing import Any, TypedDict, TypeVar, cast
+
+from app.metrics import COMMAND_FAILURES, COMMAND_SECONDS, SUBPROCESSES
+from app.trace import trace_command
 
 # Constants
-DB_JSON_PATH = Path("/tmp/db.json")  # noqa: S108
-MAX_FAIL_COUNT = 2
+CONFIG_JSON_PATH = Path(os.environ.get("CONFIG_JSON_PATH", "/root/config.json"))
+# Optional, *.json files merged over config.json in name order
+CONFIG_FRAGMENTS_DIR = Path(os.environ.get("CONFIG_FRAGMENTS_DIR", "/root/config.d"))
+CONFIG_SECTIONS = ("bridge", "container", "veth_pairs")
+CONFIG_POLL_INTERVAL = 5.0  # Seconds between checks when inotify is unavailable
+CONFIG_RELOAD_DELAY = 0.5  # Seconds to coalesce the writes of an edit
+DB_JSON_PATH = Path(os.environ.get("DB_JSON_PATH", "/tmp/db.json"))  # noqa: S108
+DB_SYNC_DELAY = 1.0  # Seconds to coalesce state changes into a snapshot
+# Failing bridges, container interfaces and veth pairs, see app/retry.py
+RETRY_BASE_DELAY = 5.0  # Seconds before the first retry, doubled per failure
+RETRY_MAX_DELAY = 600.0
+QUARANTINE_THRESHOLD = int(os.environ.get("QUARANTINE_THRESHOLD", "5"))
+# Seconds between full passes, from right after a change to once stable
+MIN_SYNC_INTERVAL = float(os.environ.get("MIN_SYNC_INTERVAL", "1"))
+FULL_SYNC_INTERVAL = int(os.environ.get("FULL_SYNC_INTERVAL", "120"))
 DOCKER_SOCKET = Path("/var/run/docker.sock")
 USE_LINUX_BRIDGE = os.environ.get("USE_LINUX_BRIDGE", "false") in ("true", "1")
-EVENT_LOCK = asyncio.Lock()
+# In-memory kernel, OVS and Docker, see app/simulated.py
+USE_SIMULATION = os.environ.get("USE_SIMULATION", "false") in ("true", "1")
+# Seconds a simulated OVSDB or Docker round trip takes, 0 answers right away
+SIMULATED_LATENCY = float(os.environ.get("SIMULATED_LATENCY", "0"))
+# Empty OVSDB_REMOTE falls back to forking ovs-vsctl
+OVSDB_REMOTE = os.environ.get("OVSDB_REMOTE", "unix:/var/run/openvswitch/db.sock")
+OVSDB_TIMEOUT = 60
+COMMAND_TIMEOUT = float(os.environ.get("COMMAND_TIMEOUT", "60"))
+NETLINK_TIMEOUT = 5.0  # Longest a netlink reply may hold up the event loop
+JOB_HISTORY = 1000  # Finished jobs remembered for polling
+JOB_WAIT_LIMIT = 60.0  # Longest a client may block on GET /jobs/{id}
+# Operations on independent resources applied at once, see app/locks.py
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "8"))
 T = TypeVar("T")
 
 
@@ -92,10 +122,91 @@ def get_logger(name: str = __name__) -> logging.Logger:
 _LOGGER = get_logger("utils")
 
 
-# Cache function to get the OVS database from JSON file
+class StateStore:
+    """JSON document kept in memory and snapshotted atomically to disk.
+
+    Changes are applied to the in-memory document right away. save() only
+    schedules a snapshot, so that a burst of changes results in a single
+    write. A snapshot is written to a temporary file, fsync'ed and renamed
+    over the previous one, hence the file on disk is always complete.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Load the document, starting empty if there is none yet.
+
+        :param path: location of the JSON document
+        :type path: Path
+        """
+        self.path = path
+        self.data: dict[str, Any] = {}
+        self._pending: asyncio.TimerHandle | None = None
+        try:
+            with path.open(encoding="utf-8") as fp:
+                self.data = json.load(fp)
+        except FileNotFoundError:
+            _LOGGER.info("No state found at %s, starting empty", path)
+        except ValueError:
+            _LOGGER.exception("Discarding unreadable state at %s", path)
+
+    def save(self) -> None:
+        """Schedule a snapshot, coalesced with the changes that follow."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._pending is None:
+            self._pending = loop.call_later(DB_SYNC_DELAY, self.flush)
+
+    def flush(self) -> None:
+        """Write a snapshot now.
+
+        A snapshot that cannot be written is logged and, from the event
+        loop, attempted again after DB_SYNC_DELAY.
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+        try:
+            self._write()
+        except OSError:
+            _LOGGER.exception("Failed to write the state to %s", self.path)
+            with contextlib.suppress(RuntimeError):  # No loop, no retry
+                loop = asyncio.get_running_loop()
+                self._pending = loop.call_later(DB_SYNC_DELAY, self.flush)
+
+    def _write(self) -> None:
+        """Write a snapshot, replacing the previous one.
+
+        :raises OSError: If the snapshot cannot be written
+        """
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as fp:
+            json.dump(self.data, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        tmp_path.replace(self.path)
+        # Persist the rename itself
+        dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
 @cache
-def _open_db() -> dict[str, Any]:
-    return json.load(DB_JSON_PATH.open(encoding="utf-8"))
+def get_db_store() -> StateStore:
+    """Return the store backing the OVS database cache.
+
+    :return: state store of DB_JSON_PATH
+    :rtype: StateStore
+    """
+    return StateStore(DB_JSON_PATH)
+
+
+def save_db() -> None:
+    """Schedule a snapshot of the OVS database cache to disk."""
+    get_db_store().save()
 
 
 def get_db(key: str = "", default: T | None = None) -> dict[str, Any] | T:
@@ -113,22 +224,140 @@ def get_db(key: str = "", default: T | None = None) -> dict[str, Any] | T:
     :return: The full OVS database cache or the section specified by the key.
     :rtype: dict[str, Any] | Any
     """
-    db = _open_db()
+    db = get_db_store().data
     if key:
         # Only set to an empty dict if `default` is not provided.
         return db.setdefault(key, default if default is not None else {})
     return db
 
 
+def config_files() -> list[Path]:
+    """List the files the configuration is read from.
+
+    :return: config.json, followed by the fragments in name order
+    :rtype: list[Path]
+    """
+    fragments = []
+    if CONFIG_FRAGMENTS_DIR.is_dir():
+        fragments = sorted(CONFIG_FRAGMENTS_DIR.glob("*.json"))
+    return [CONFIG_JSON_PATH, *fragments]
+
+
+def _read_config_file(path: Path) -> dict[str, Any]:
+    """Read a configuration file and check the shape of its sections.
+
+    :param path: config.json or a fragment
+    :type path: Path
+    :return: the document read
+    :rtype: dict[str, Any]
+    :raises ValueError: If the file is not valid JSON, or it or one of its
+                        sections is not an object
+    """
+    with path.open(encoding="UTF-8") as fp:
+        document = json.load(fp)
+    if not isinstance(document, dict):
+        msg = f"{path.name} does not hold an object"
+        raise ValueError(msg)  # noqa: TRY004
+    for section in CONFIG_SECTIONS:
+        if not isinstance(document.get(section, {}), dict):
+            msg = f"Section {section} of {path.name} is not an object"
+            raise ValueError(msg)  # noqa: TRY004
+    return document
+
+
+def load_config(base: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Read config.json and merge the fragments over it.
+
+    A fragment holds any of the sections of config.json, its bridges,
+    containers and veth pairs replace those of the same name.
+
+    :param base: Optional, document read in place of config.json, e.g. one
+                 about to be saved to it
+    :type base: dict[str, Any] | None
+    :return: The OVS config.
+    :rtype: dict[str, Any]
+    :raises ValueError: If a file is not valid JSON, or it or one of its
+                        sections is not an object
+    """
+    config: dict[str, Any] = {}
+    paths = config_files()
+    if base is not None:
+        config = copy.deepcopy(base)
+        paths = paths[1:]
+    for section in CONFIG_SECTIONS:
+        config.setdefault(section, {})
+    for path in paths:
+        document = _read_config_file(path)
+        if path == CONFIG_JSON_PATH:
+            config.update(document)
+            continue
+        for section in CONFIG_SECTIONS:
+            for name in config[section].keys() & document.get(section, {}).keys():
+                _LOGGER.warning("%s overrides %s %s", path.name, section, name)
+            config[section].update(document.get(section, {}))
+    return config
+
+
 @cache
 def get_config() -> dict[str, Any]:
-    """Return the OVS config.
+    """Return the OVS config, the desired state of the network.
+
+    It is read once and then changed in place by the API and when the
+    files change, see update_config().
 
     :return: The OVS config.
     :rtype: dict[str, Any]
     """
-    with Path("/root/config.json").open(encoding="UTF-8") as fp:
-        return json.load(fp)
+    return load_config()
+
+
+def update_config(
+    config: dict[str, Any], previous: dict[str, Any], document: dict[str, Any]
+) -> None:
+    """Update the items that differ between two versions of the configuration.
+
+    Items equal in both versions are left alone, so are the items added
+    to the configuration at runtime, e.g. through the API.
+
+    :param config: configuration to update in place, e.g. get_config()
+    :type config: dict[str, Any]
+    :param previous: previous version
+    :type previous: dict[str, Any]
+    :param document: new version
+    :type document: dict[str, Any]
+    """
+    for section in CONFIG_SECTIONS:
+        old, new = previous.get(section, {}), document.get(section, {})
+        items = config.setdefault(section, {})
+        for name in old.keys() | new.keys():
+            if old.get(name) == new.get(name):
+                continue
+            if name in new:
+                items[name] = copy.deepcopy(new[name])
+            else:
+                items.pop(name, None)
+
+
+def save_config(document: dict[str, Any]) -> None:
+    """Write config.json, e.g. once the topology was replaced through the API.
+
+    The file is replaced atomically. A file bind mounted into the container
+    cannot be replaced, it is rewritten in place instead.
+
+    :param document: configuration to write
+    :type document: dict[str, Any]
+    """
+    content = json.dumps(document, indent=4)
+    tmp_path = CONFIG_JSON_PATH.with_name(f".{CONFIG_JSON_PATH.name}.tmp")
+    with tmp_path.open("w", encoding="UTF-8") as fp:
+        fp.write(content)
+        fp.flush()
+        os.fsync(fp.fileno())
+    try:
+        tmp_path.replace(CONFIG_JSON_PATH)
+    except OSError:
+        tmp_path.unlink()
+        CONFIG_JSON_PATH.write_text(content, encoding="UTF-8")
 
 
 def hash_string(string: str) -> str:
@@ -142,41 +371,76 @@ def hash_string(string: str) -> str:
     return hashlib.sha256(string.encode()).hexdigest()[:8]
 
 
-def check_container_exists(container_name: str) -> bool:
-    """Check if the container exists.
+def _command_type(args: list[str]) -> str:
+    """Name a command by its program and subcommand, for metrics.
 
-    :param container_name: Name of the container.
-    :type container_name: str
-    :return: True if the container exists, False otherwise.
-    :rtype: bool
+    :param args: command arguments
+    :type args: list[str]
+    :return: e.g. "ovs-vsctl add-port"
+    :rtype: str
     """
-    check = run_command(f"docker ps -f name={container_name}$ -q", check=False)
-    exists = bool(check.stdout.strip())
-    if not exists:
-        _LOGGER.debug("Container %s does not exist!", container_name)
-    else:
-        _LOGGER.debug("Container ID: %s", check.stdout.strip())
-    return exists
+    program = Path(args[0]).name if args else ""
+    # Options and arguments such as paths would explode the label cardinality
+    subcommand = next((arg for arg in args[1:] if not arg.startswith("-")), "")
+    if not subcommand.replace("-", "").isalpha():
+        subcommand = ""
+    return f"{program} {subcommand}".strip()
+
 
+async def run_command(
+    command: str, check: bool = True, time_limit: float = COMMAND_TIMEOUT
+) -> CompletedProcess[str]:
+    """Run a command in a subprocess and capture the output.
 
-def run_command(command: str, check: bool = True) -> CompletedProcess[str]:
-    """Run a command using subprocess and capture the output.
+    The event loop keeps serving other tasks while the command runs.
 
     :param command: The command to run.
     :type command: str
     :param check: Flag to raise an exception on command failure.
     :type check: bool
+    :param time_limit: Optional, seconds after which the command is killed.
+    :type time_limit: float
     :return: The captured output of the command as a string.
     :rtype: CompletedProcess[str]
     :raises CalledProcessError: If the command execution fails.
+    :raises TimeoutError: If the command does not finish in time.
     """
+    args = command.split()
+    command_type = _command_type(args)
+    SUBPROCESSES.inc(command=command_type)
+    with (
+        COMMAND_SECONDS.time(command=command_type),
+        trace_command("exec", args) as trace,
+    ):
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), time_limit)
+        except TimeoutError:
+            process.kill()
+            await process.wait()
+            COMMAND_FAILURES.inc(command=command_type)
+            msg = f"Command timed out after {time_limit}s: {command}"
+            _LOGGER.exception(msg)
+            raise TimeoutError(msg) from None
+        finally:
+            trace.returncode = process.returncode
+        result = CompletedProcess(
+            args, cast("int", process.returncode), stdout.decode(), stderr.decode()
+        )
+        trace.stderr = result.stderr
+
     try:
-        return run(command.split(), check=check, capture_output=True, text=True)
+        if check:
+            result.check_returncode()
     except CalledProcessError as exc:
+        COMMAND_FAILURES.inc(command=command_type)
         _LOGGER.exception("Subprocess error:\nCommand failed: %s", exc.cmd)
         stderr_output = exc.stderr if exc.stderr else None
         _LOGGER.exception("Command stderr output:\n%s", stderr_output)
         raise
+    return result
 
 
 def get_usb_interface(usb_port: str) -> str:
@@ -192,9 +456,12 @@ def get_usb_interface(usb_port: str) -> str:
     :rtype: str
     :raises ValueError: If multiple or no interfaces are found for the specified USB port.
     """
-    devs = run_command("ls -l /sys/class/net", check=False)
-
-    usb_info = [dev for dev in devs.stdout.splitlines() if usb_port in dev]
+    # Each entry is a symlink to the device path, which includes the USB bus
+    usb_info = [
+        dev.name
+        for dev in Path("/sys/class/net").iterdir()
+        if dev.is_symlink() and usb_port in str(dev.readlink())
+    ]
     if len(usb_info) > 1:
         msg = f"Identified more than one interface for USB bus: {usb_port}"
         raise ValueError(msg)
@@ -202,8 +469,228 @@ def get_usb_interface(usb_port: str) -> str:
         err = f"No network interface found for USB port: {usb_port}"
         raise ValueError(err)
 
-    # Assumption 8th section of split of each line shows the interface name.
-    return usb_info[0].split()[8]
+    return usb_info[0]
+
+
+class IpAllocator:
+    """Host address allocator of a bridge IP range.
+
+    IPv4 ranges are tracked in a bitmap, IPv6 ranges, which can be far too
+    large for one, in a set of used host offsets. Allocation pops released
+    addresses first and otherwise advances a cursor over the range, so
+    allocate, reserve and release take constant (amortized) time. The
+    allocations themselves live in the persisted hosts dict of the bridge,
+    mapping holder name to address with prefix.
+    """
+
+    SKIP_HOSTS = 5  # First host addresses are kept for manual use
+
+    def __init__(self, ip_range: str | None, hosts: dict[str, str]) -> None:
+        """Build the allocator from the addresses already handed out.
+
+        :param ip_range: subnet with prefix, e.g. "10.1.1.0/24", None if the
+                         bridge has no range and only static addresses are tracked
+        :type ip_range: str | None
+        :param hosts: holder name to address with prefix, updated in place
+        :type hosts: dict[str, str]
+        """
+        self.ip_range = ip_range
+        self.hosts = hosts
+        self._network = ipaddress.ip_network(ip_range) if ip_range else None
+        self._first = 1 + self.SKIP_HOSTS  # Skip the network address too
+        self._last = -1
+        self._used: bytearray | set[int] = set()
+        if isinstance(self._network, ipaddress.IPv4Network):
+            self._last = self._network.num_addresses - 2  # Before broadcast
+            self._used = bytearray((self._network.num_addresses + 7) // 8)
+        elif self._network is not None:
+            self._last = self._network.num_addresses - 1
+        self._outside: set[str] = set()  # Used addresses not in the range
+        # Released offsets below the cursor, the cursor finds those above it
+        self._free: list[int] = []
+        self._queued: set[int] = set()  # Offsets in _free
+        self._next = self._first
+        for addr in hosts.values():
+            self._mark(addr, used=True)
+
+    def _offset(self, addr: str) -> int | None:
+        """Return the position of an address in the range.
+
+        :param addr: address, with or without prefix
+        :type addr: str
+        :return: offset from the network address, None if outside the range
+        :rtype: int | None
+        """
+        ip = ipaddress.ip_interface(addr).ip
+        if self._network is None or ip not in self._network:
+            return None
+        return int(ip) - int(self._network.network_address)
+
+    def _is_used(self, offset: int) -> bool:
+        """Check if the address at an offset of the range is used.
+
+        :param offset: offset from the network address
+        :type offset: int
+        :return: True if the address is in use
+        :rtype: bool
+        """
+        if isinstance(self._used, bytearray):
+            return bool(self._used[offset >> 3] & (1 << (offset & 7)))
+        return offset in self._used
+
+    def _mark(self, addr: str, *, used: bool) -> None:
+        """Flag an address as used or free.
+
+        :param addr: address, with or without prefix
+        :type addr: str
+        :param used: True to flag the address as used
+        :type used: bool
+        """
+        if (offset := self._offset(addr)) is not None:
+            self._mark_offset(offset, used=used)
+        elif used:
+            self._outside.add(str(ipaddress.ip_interface(addr).ip))
+        else:
+            self._outside.discard(str(ipaddress.ip_interface(addr).ip))
+
+    def _mark_offset(self, offset: int, *, used: bool) -> None:
+        """Flag the address at an offset of the range as used or free.
+
+        :param offset: offset from the network address
+        :type offset: int
+        :param used: True to flag the address as used
+        :type used: bool
+        """
+        if isinstance(self._used, bytearray):
+            if used:
+                self._used[offset >> 3] |= 1 << (offset & 7)
+            else:
+                self._used[offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+        elif used:
+            self._used.add(offset)
+        else:
+            self._used.discard(offset)
+
+        if (
+            not used
+            and self._first <= offset < self._next
+            and offset not in self._queued
+        ):
+            self._queued.add(offset)
+            self._free.append(offset)
+
+    def is_allocated(self, addr: str) -> bool:
+        """Check if an address is held by anyone.
+
+        :param addr: address, with or without prefix
+        :type addr: str
+        :return: True if the address is in use
+        :rtype: bool
+        """
+        if (offset := self._offset(addr)) is None:
+            return str(ipaddress.ip_interface(addr).ip) in self._outside
+        return self._is_used(offset)
+
+    def release(self, holder: str) -> None:
+        """Free the address of a holder, if it has one.
+
+        :param holder: bridge or container name
+        :type holder: str
+        """
+        if (addr := self.hosts.pop(holder, None)) is not None:
+            self._mark(addr, used=False)
+            save_db()
+
+    def reserve(self, holder: str, addr: str) -> None:
+        """Hand out a specific address to a holder.
+
+        :param holder: bridge or container name
+        :type holder: str
+        :param addr: address with prefix
+        :type addr: str
+        :raises ValueError: if the address is held by someone else
+        """
+        if self.hosts.get(holder) == addr:
+            return
+        self.release(holder)
+        if self.is_allocated(addr):
+            msg = f"IP {addr} already allocated to someone else"
+            raise ValueError(msg)
+        self.hosts[holder] = addr
+        self._mark(addr, used=True)
+        save_db()
+
+    def allocate(self, holder: str) -> str:
+        """Hand out the next free address to a holder.
+
+        A previous address of the holder is released first, so that it gets
+        the same address back if nobody took it in the meantime.
+
+        :param holder: bridge or container name
+        :type holder: str
+        :return: allocated address with prefix
+        :rtype: str
+        :raises IndexError: if no address is left in the range
+        """
+        self.release(holder)
+        while self._free:
+            offset = self._free.pop()
+            self._queued.discard(offset)
+            if not self._is_used(offset):
+                return self._take(holder, offset)
+        while self._next <= self._last:
+            offset, self._next = self._next, self._next + 1
+            if not self._is_used(offset):
+                return self._take(holder, offset)
+        msg = f"No IP address left in range {self.ip_range}"
+        raise IndexError(msg)
+
+    def _take(self, holder: str, offset: int) -> str:
+        """Hand out the address at an offset of the range.
+
+        :param holder: bridge or container name
+        :type holder: str
+        :param offset: offset from the network address
+        :type offset: int
+        :return: address with prefix
+        :rtype: str
+        """
+        network = cast("ipaddress.IPv4Network | ipaddress.IPv6Network", self._network)
+        addr = f"{network.network_address + offset}/{network.prefixlen}"
+        self.hosts[holder] = addr
+        self._mark_offset(offset, used=True)
+        save_db()
+        return addr
+
+
+# IP allocators by (bridge name, family)
+_IP_ALLOCATORS: dict[tuple[str, str], IpAllocator] = {}
+
+
+def get_ip_allocator(bridge_name: str, family: str = "ip") -> IpAllocator:
+    """Return the IP allocator of a bridge range.
+
+    The allocator is rebuilt whenever the range or its hosts section in the
+    database was replaced.
+
+    :param bridge_name: The bridge name.
+    :type bridge_name: str
+    :param family: The IP family ("ip" for IPv4 or "ip6" for IPv6).
+    :type family: str
+    :return: the allocator
+    :rtype: IpAllocator
+    """
+    db_cache = get_db(bridge_name)
+    ip_range = db_cache.get(f"{family}range")
+    hosts = db_cache.setdefault(f"{family}range_hosts", {})
+    allocator = _IP_ALLOCATORS.get((bridge_name, family))
+    if (
+        allocator is None
+        or allocator.ip_range != ip_range
+        or allocator.hosts is not hosts
+    ):
+        allocator = _IP_ALLOCATORS[bridge_name, family] = IpAllocator(ip_range, hosts)
+    return allocator
 
 
 def auto_allocate_ip(bridge_name: str, container_name: str, family: str = "ip") -> str:
@@ -220,24 +707,15 @@ def auto_allocate_ip(bridge_name: str, container_name: str, family: str = "ip")
     :return: The allocated IP address with the correct prefix.
     :rtype: str
     """
-    db_cache = get_db(bridge_name)
-    ip_range = db_cache.get(f"{family}range", "/24")
-    hosts = db_cache.get(f"{family}range_hosts", {})
-
-    network_hosts = ipaddress.ip_network(str(ip_range)).hosts()
-    _ = [next(network_hosts) for _ in range(5)]  # Skip first 5 addresses
-
-    for host in network_hosts:
-        ipaddr = f"{host}/{ip_range.split('/')[-1]}"
-        if ipaddr not in hosts.values():
-            _LOGGER.debug(
-                "Automatic IP allocation (%s) to container: %s", ipaddr, container_name
-            )
-            hosts[container_name] = ipaddr
-            return ipaddr
-
-    msg = f"Failed to automatically allocate an IP to container: {container_name}"
-    raise IndexError(msg)
+    try:
+        ipaddr = get_ip_allocator(bridge_name, family).allocate(container_name)
+    except IndexError as exc:
+        msg = f"Failed to automatically allocate an IP to container: {container_name}"
+        raise IndexError(msg) from exc
+    _LOGGER.debug(
+        "Automatic IP allocation (%s) to container: %s", ipaddr, container_name
+    )
+    return ipaddr
 
 
 def validate_bridge(bridge_name: str, info: BridgeInfoDict) -> bool:
@@ -327,3 +805,60 @@ def validate_veth_pair(veth_pair_id: str, info: dict) -> bool:
         )
         return False
     return True
+
+
+def _shared_parents(bridges: dict[str, BridgeInfoDict]) -> list[str]:
+    """Find the parent interfaces listed by more than one bridge.
+
+    :param bridges: bridges of a topology
+    :type bridges: dict[str, BridgeInfoDict]
+    :return: a problem per parent listed again
+    :rtype: list[str]
+    """
+    owners: dict[str, str] = {}
+    problems = []
+    for bridge_name, info in bridges.items():
+        for parent in info.get("parents") or []:
+            owner = owners.setdefault(parent["iface"], bridge_name)
+            if owner != bridge_name:
+                problems.append(
+                    f"Parent {parent['iface']} of bridge {bridge_name} is a parent "
+                    f"of bridge {owner} too"
+                )
+    return problems
+
+
+def validate_topology(document: dict[str, Any]) -> list[str]:
+    """Validate that the items of a topology are consistent with each other.
+
+    Container interfaces and veth pairs must be attached to bridges of the
+    topology, a container interface and a parent interface be listed once.
+
+    :param document: topology, in the schema of config.json
+    :type document: dict[str, Any]
+    :return: the problems found, empty if the topology is valid
+    :rtype: list[str]
+    """
+    bridges = document.get("bridge", {})
+    problems = _shared_parents(bridges)
+    for container_id, ifaces in document.get("container", {}).items():
+        seen: set[str] = set()
+        for info in ifaces:
+            name = f"{container_id}:{info['iface']}"
+            if info["iface"] in seen:
+                problems.append(f"Interface {name} is repeated")
+            seen.add(info["iface"])
+            if info.get("bridge") not in bridges:
+                problems.append(
+                    f"Interface {name} is attached to unknown bridge "
+                    f"{info.get('bridge')}"
+                )
+    prefix_length_limit = 8
+    for veth_pair_id, info in document.get("veth_pairs", {}).items():
+        if len(veth_pair_id) > prefix_length_limit:
+            problems.append(f"VETH prefix ID {veth_pair_id} is more than 8 chars")
+        if info["on"] not in bridges:
+            problems.append(
+                f"VETH pair {veth_pair_id} is attached to unknown bridge {info['on']}"
+            )
+    return problems
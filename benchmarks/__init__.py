@@ -0,0 +1 @@
+"""Benchmarks of the orchestrator, run without privileges."""
@@ -0,0 +1,289 @@
+"""Reconcile benchmark against the simulated network backends.
+
+Generates a topology of N containers, runs a cold reconcile pass followed
+by warm passes and reports wall time, backend operation counts and memory.
+Each topology size runs in its own interpreter, so that caches and memory
+of one size do not leak into the next. Topologies are generated from a
+fixed seed and hash randomization is disabled, hence operation counts are
+identical from run to run and only timings vary.
+
+Usage::
+
+    python -m benchmarks.reconcile --sizes 10 100 500 2000
+    python -m benchmarks.reconcile --linux-bridge --output baseline.json
+    python -m benchmarks.reconcile --compare baseline.json
+    python -m benchmarks.reconcile --latency 0.002 --max-concurrency 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+DEFAULT_SIZES = (10, 100, 500, 2000)
+CONTAINERS_PER_BRIDGE = 50
+CONTAINERS_PER_VETH_PAIR = 100
+VLANS = (None, 100, 200, 300, 400)
+# Slowdown tolerated by --compare before a size is reported as a regression
+TIME_TOLERANCE = 0.25
+TIME_NOISE_FLOOR = 0.01  # Seconds, absolute jitter ignored on small topologies
+
+
+def generate_topology(size: int, seed: int) -> dict[str, Any]:
+    """Generate a config.json with the given number of containers.
+
+    :param size: number of containers
+    :type size: int
+    :param seed: random seed
+    :type seed: int
+    :return: orchestrator configuration
+    :rtype: dict[str, Any]
+    """
+    rng = random.Random(seed)  # noqa: S311
+    bridges = {
+        f"br{index}": {
+            "iprange": f"10.{index}.0.0/16",
+            "ipaddress": f"10.{index}.0.1/16",
+            "parents": [{"iface": f"eth{index}", "trunk": "100,200,300,400"}],
+        }
+        for index in range(max(1, size // CONTAINERS_PER_BRIDGE))
+    }
+    containers: dict[str, list[dict[str, str]]] = {}
+    for index in range(size):
+        ifaces = []
+        for iface in range(rng.choice((1, 1, 2))):
+            info = {"iface": f"eth{iface + 1}", "bridge": rng.choice(list(bridges))}
+            if vlan := rng.choice(VLANS):
+                info["vlan"] = str(vlan)
+            if iface == 0:
+                info["gateway"] = f"10.{info['bridge'][2:]}.0.1"
+            ifaces.append(info)
+        containers[f"c{index}"] = ifaces
+    veth_pairs = {
+        f"vp{index}": {"on": rng.choice(list(bridges)), "map": "100:200"}
+        for index in range(size // CONTAINERS_PER_VETH_PAIR)
+    }
+    return {"bridge": bridges, "container": containers, "veth_pairs": veth_pairs}
+
+
+async def _run_passes(warm_passes: int, memory: bool) -> list[dict[str, Any]]:
+    """Run a cold pass and the warm passes, like the orchestrator loop does.
+
+    :param warm_passes: number of warm passes
+    :type warm_passes: int
+    :param memory: trace Python allocations, slows the passes down
+    :type memory: bool
+    :return: per pass results
+    :rtype: list[dict[str, Any]]
+    """
+    from app.locks import get_lock_manager  # noqa: PLC0415
+    from app.orchestrator import reconcile_all  # noqa: PLC0415
+    from app.ovs_lib import ovs_transaction  # noqa: PLC0415
+    from app.simulated import get_simulated_network  # noqa: PLC0415
+    from app.utils import get_db_store  # noqa: PLC0415
+
+    network = get_simulated_network()
+    results = []
+    if memory:
+        tracemalloc.start()
+    for index in range(warm_passes + 1):
+        before = network.calls.copy()
+        if memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        async with get_lock_manager().hold_all(), ovs_transaction():
+            await reconcile_all()
+        elapsed = time.perf_counter() - start
+        calls = network.calls - before
+        results.append(
+            {
+                "pass": "cold" if index == 0 else "warm",
+                "seconds": elapsed,
+                "operations": sum(calls.values()),
+                "calls": dict(sorted(calls.items())),
+                "peak_bytes": tracemalloc.get_traced_memory()[1] if memory else None,
+            }
+        )
+    get_db_store().flush()
+    return results
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    """Benchmark a single topology size and print the results as JSON.
+
+    :param args: command line arguments
+    :type args: argparse.Namespace
+    """
+    logging.disable(logging.WARNING)
+    passes = asyncio.run(_run_passes(args.warm_passes, args.memory))
+    json.dump(
+        {
+            "passes": passes,
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        sys.stdout,
+    )
+
+
+def benchmark_size(size: int, args: argparse.Namespace) -> dict[str, Any]:
+    """Benchmark a topology size in fresh interpreters.
+
+    Timings and memory are measured in separate runs, since tracing the
+    allocations slows the passes down.
+
+    :param size: number of containers
+    :type size: int
+    :param args: command line arguments
+    :type args: argparse.Namespace
+    :return: summary of the size
+    :rtype: dict[str, Any]
+    """
+    topology = generate_topology(size, args.seed)
+    runs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp, "config.json")
+        config_path.write_text(json.dumps(topology), encoding="utf-8")
+        for mode in ("timing", "memory"):
+            Path(tmp, "db.json").unlink(missing_ok=True)
+            env = {
+                **os.environ,
+                "PYTHONHASHSEED": "0",
+                "CONFIG_JSON_PATH": str(config_path),
+                "DB_JSON_PATH": str(Path(tmp, "db.json")),
+                "USE_LINUX_BRIDGE": "true" if args.linux_bridge else "false",
+                "USE_SIMULATION": "true",
+                "SIMULATED_LATENCY": str(args.latency),
+                "MAX_CONCURRENCY": str(args.max_concurrency),
+            }
+            command = [sys.executable, "-m", "benchmarks.reconcile", "--worker"]
+            command += ["--warm-passes", str(args.warm_passes)]
+            if mode == "memory":
+                command.append("--memory")
+            output = subprocess.run(  # noqa: PLW1510
+                command, env=env, capture_output=True, text=True
+            )
+            if output.returncode:
+                sys.stderr.write(output.stderr)
+                msg = f"Benchmark of {size} containers failed"
+                raise RuntimeError(msg)
+            runs[mode] = json.loads(output.stdout)
+
+    timing, memory = runs["timing"]["passes"], runs["memory"]["passes"]
+    warm = timing[1:] or timing
+    return {
+        "containers": size,
+        "interfaces": sum(len(ifaces) for ifaces in topology["container"].values()),
+        "cold_seconds": timing[0]["seconds"],
+        "warm_seconds": statistics.median(run["seconds"] for run in warm),
+        "cold_operations": timing[0]["operations"],
+        "warm_operations": warm[-1]["operations"],
+        "cold_calls": timing[0]["calls"],
+        "warm_calls": warm[-1]["calls"],
+        "cold_peak_bytes": memory[0]["peak_bytes"],
+        "warm_peak_bytes": max(run["peak_bytes"] for run in memory[1:] or memory),
+        "max_rss_kib": runs["timing"]["max_rss_kib"],
+    }
+
+
+def compare(results: list[dict[str, Any]], baseline_path: Path) -> list[str]:
+    """Compare results with a previous run.
+
+    Operation counts are deterministic and must not grow, timings may
+    vary within TIME_TOLERANCE.
+
+    :param results: results of this run
+    :type results: list[dict[str, Any]]
+    :param baseline_path: JSON file written with --output
+    :type baseline_path: Path
+    :return: description of each regression
+    :rtype: list[str]
+    """
+    baseline = {
+        entry["containers"]: entry
+        for entry in json.loads(baseline_path.read_text(encoding="utf-8"))
+    }
+    regressions = []
+    for result in results:
+        if (previous := baseline.get(result["containers"])) is None:
+            continue
+        regressions.extend(
+            f"{result['containers']} containers: {key} {previous[key]} -> {result[key]}"
+            for key in ("cold_operations", "warm_operations")
+            if result[key] > previous[key]
+        )
+        regressions.extend(
+            f"{result['containers']} containers: {key} "
+            f"{previous[key]:.3f} -> {result[key]:.3f}"
+            for key in ("cold_seconds", "warm_seconds")
+            if result[key] > previous[key] * (1 + TIME_TOLERANCE) + TIME_NOISE_FLOOR
+        )
+    return regressions
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--warm-passes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--linux-bridge", action="store_true")
+    parser.add_argument(
+        "--latency", type=float, default=0, help="seconds per OVSDB/Docker request"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.environ.get("MAX_CONCURRENCY", "8")),
+        help="operations applied at once",
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="fail on regressions")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--memory", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    header = (
+        f"{'containers':>10} {'ifaces':>7} {'cold s':>8} {'warm s':>8} "
+        f"{'cold ops':>9} {'warm ops':>9} {'cold MiB':>9} {'warm MiB':>9} "
+        f"{'rss MiB':>8}"
+    )
+    print(header)  # noqa: T201
+    results = []
+    for size in args.sizes:
+        result = benchmark_size(size, args)
+        results.append(result)
+        print(  # noqa: T201
+            f"{result['containers']:>10} {result['interfaces']:>7} "
+            f"{result['cold_seconds']:>8.3f} {result['warm_seconds']:>8.3f} "
+            f"{result['cold_operations']:>9} {result['warm_operations']:>9} "
+            f"{result['cold_peak_bytes'] / 2**20:>9.1f} "
+            f"{result['warm_peak_bytes'] / 2**20:>9.1f} "
+            f"{result['max_rss_kib'] / 2**10:>8.1f}"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare and (regressions := compare(results, args.compare)):
+        print("Regressions:", *regressions, sep="\n  ")  # noqa: T201
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
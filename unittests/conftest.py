@@ -0,0 +1,102 @@
+"""Shared fixtures of the unit tests.
+
+The tests run against the simulated network backends, with config.json,
+its fragments and the state cache in a temporary directory. The paths are
+set before the app is imported, its modules read them at import time.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+_TMP = Path(tempfile.mkdtemp(prefix="raikou-tests-"))
+os.environ["CONFIG_JSON_PATH"] = str(_TMP / "config.json")
+os.environ["CONFIG_FRAGMENTS_DIR"] = str(_TMP / "config.d")
+os.environ["DB_JSON_PATH"] = str(_TMP / "db.json")
+os.environ["USE_SIMULATION"] = "true"
+os.environ["USE_LINUX_BRIDGE"] = "false"
+
+# pylint: disable=wrong-import-position
+from app import (  # noqa: E402
+    docker_client,
+    jobs,
+    locks,
+    orchestrator,
+    ovs_lib,
+    retry,
+    simulated,
+    utils,
+)
+
+TOPOLOGY: dict[str, Any] = {
+    "bridge": {
+        "br0": {
+            "parents": [{"iface": "eth9", "trunk": "100,200"}],
+            "iprange": "10.0.0.0/24",
+            "ipaddress": "10.0.0.1/24",
+        },
+        "br1": {"parents": [{"iface": "eth8"}]},
+    },
+    "container": {
+        "a": [{"iface": "eth1", "bridge": "br0", "vlan": "100"}],
+        "b": [
+            {"iface": "eth1", "bridge": "br0", "trunk": "100,200"},
+            {"iface": "eth2", "bridge": "br1"},
+        ],
+    },
+    "veth_pairs": {"vp": {"on": "br0", "map": "100:200"}},
+}
+
+
+def _reset() -> None:
+    """Forget the state kept by the app between calls."""
+    for cached in (
+        utils.get_config,
+        utils.get_db_store,
+        simulated.get_simulated_network,
+        ovs_lib._get_ovs_backend,
+        ovs_lib._get_link_backend,
+        docker_client.get_docker_client,
+        jobs.get_job_queue,
+        retry.get_failure_tracker,
+        locks.get_lock_manager,
+        orchestrator.get_event_queue,
+    ):
+        cached.cache_clear()
+    orchestrator._CONTAINER_HANDLES.clear()
+    orchestrator._LOADED_CONFIG.clear()
+    shutil.rmtree(_TMP, ignore_errors=True)
+    _TMP.mkdir()
+
+
+@pytest.fixture(autouse=True)
+def clean_state() -> Iterator[None]:
+    """Start each test without files, caches or simulated network."""
+    _reset()
+    yield
+    _reset()
+
+
+@pytest.fixture
+def write_config() -> Callable[[dict[str, Any]], Path]:
+    """Return a function writing config.json, the configuration is read anew."""
+
+    def _write(document: dict[str, Any]) -> Path:
+        utils.CONFIG_JSON_PATH.write_text(json.dumps(document), encoding="utf-8")
+        utils.get_config.cache_clear()
+        return utils.CONFIG_JSON_PATH
+
+    return _write
+
+
+@pytest.fixture
+def topology(write_config: Callable[[dict[str, Any]], Path]) -> dict[str, Any]:
+    """Write the sample topology to config.json."""
+    write_config(TOPOLOGY)
+    return json.loads(json.dumps(TOPOLOGY))
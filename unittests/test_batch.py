@@ -0,0 +1,98 @@
+"""Unit tests of the bulk API, against the simulated network."""
+
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from app import ovs_lib
+from app.routers.batch import run_batch
+from app.routers.bridge import init_bridges_api
+from app.schemas import BridgeItem
+from app.simulated import get_simulated_network
+from app.utils import get_config
+
+
+async def _succeed() -> None:
+    await ovs_lib.get_ovs_backend().add_bridge("br9")
+
+
+async def _fail() -> None:
+    msg = "no such parent"
+    raise OSError(msg)
+
+
+def test_failing_item_does_not_stop_others() -> None:
+    result = asyncio.run(
+        run_batch(
+            [("x", "", _fail), ("y", "listed twice", _succeed), ("z", "", _succeed)],
+            bridges=["br9"],
+        )
+    )
+
+    assert result == {
+        "status": "partial",
+        "results": [
+            {"id": "x", "status": "failed", "detail": "no such parent"},
+            {"id": "y", "status": "failed", "detail": "listed twice"},
+            {"id": "z", "status": "success"},
+        ],
+    }
+    assert "br9" in get_simulated_network().bridges
+
+
+def test_failed_commit_fails_applied_items(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def _commit() -> None:
+        msg = "OVSDB transaction failed"
+        raise ValueError(msg)
+
+    monkeypatch.setattr(ovs_lib.get_ovs_backend(), "commit", _commit)
+
+    result = asyncio.run(run_batch([("x", "", _succeed)], bridges=["br9"]))
+
+    assert result["status"] == "failed"
+    assert result["results"][0]["detail"] == "Commit failed: OVSDB transaction failed"
+
+
+@pytest.mark.usefixtures("topology")
+def test_failed_commit_leaves_config_alone(monkeypatch: pytest.MonkeyPatch) -> None:
+    backend = ovs_lib.get_ovs_backend()
+    commit = backend.commit
+
+    async def _commit() -> None:
+        msg = "OVSDB transaction failed"
+        raise ValueError(msg)
+
+    monkeypatch.setattr(backend, "commit", _commit)
+    items = [BridgeItem(bridge_name="br5", bridge_info={"parents": []})]
+
+    result = asyncio.run(init_bridges_api(items, Response()))
+
+    assert result["status"] == "failed"
+    assert "br5" not in get_config()["bridge"]
+
+    # Applied again once OVSDB is back
+    monkeypatch.setattr(backend, "commit", commit)
+    assert asyncio.run(init_bridges_api(items, Response()))["status"] == "success"
+    assert "br5" in get_config()["bridge"]
+    assert "br5" in get_simulated_network().bridges
+
+
+@pytest.mark.usefixtures("topology")
+def test_add_bridges_rejects_duplicates() -> None:
+    items = [
+        BridgeItem(bridge_name="br5", bridge_info={"parents": []}),
+        BridgeItem(bridge_name="br5", bridge_info={"parents": []}),
+        BridgeItem(bridge_name="br6", bridge_info={"parents": []}),
+    ]
+
+    result = asyncio.run(init_bridges_api(items, Response()))
+
+    assert [item["status"] for item in result["results"]] == [
+        "success",
+        "failed",
+        "success",
+    ]
+    assert {"br5", "br6"} <= get_simulated_network().bridges
+    # All bridges are created by a single commit
+    assert get_simulated_network().calls["ovs.commit"] == 1
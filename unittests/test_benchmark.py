@@ -0,0 +1,55 @@
+"""Unit tests of the reconcile benchmark helpers."""
+
+import asyncio
+import json
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from app.utils import validate_topology
+from benchmarks.reconcile import _run_passes, compare, generate_topology
+
+
+def _result(**values: float) -> dict[str, Any]:
+    return {
+        "containers": 10,
+        "cold_operations": 100,
+        "warm_operations": 10,
+        "cold_seconds": 1.0,
+        "warm_seconds": 0.1,
+        **values,
+    }
+
+
+def test_generated_topology_is_deterministic_and_valid() -> None:
+    topology = generate_topology(120, seed=7)
+
+    assert topology == generate_topology(120, seed=7)
+    assert topology != generate_topology(120, seed=8)
+    assert len(topology["container"]) == 120
+    assert len(topology["bridge"]) == 2
+    assert len(topology["veth_pairs"]) == 1
+    assert validate_topology(topology) == []
+
+
+def test_compare_reports_regressions(tmp_path: Path) -> None:
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps([_result()]))
+
+    assert compare([_result(cold_seconds=1.2, warm_seconds=0.11)], baseline) == []
+    assert compare([_result(warm_operations=11, cold_seconds=2.0)], baseline) == [
+        "10 containers: warm_operations 10 -> 11",
+        "10 containers: cold_seconds 1.000 -> 2.000",
+    ]
+    # Sizes missing from the baseline are not compared
+    assert compare([_result(containers=20, cold_operations=500)], baseline) == []
+
+
+def test_warm_pass_makes_no_changes(write_config: Callable[..., Path]) -> None:
+    write_config(generate_topology(20, seed=1))
+
+    cold, warm = asyncio.run(_run_passes(1, memory=False))
+
+    assert cold["calls"]["netlink.add_veth"] > 0
+    assert warm["operations"] < cold["operations"]
+    assert not [call for call in warm["calls"] if ".add_" in call or ".del_" in call]
@@ -0,0 +1,90 @@
+"""Unit tests of the configuration file watcher."""
+
+import asyncio
+import json
+from collections.abc import Callable
+
+import pytest
+
+from app import config_watch
+from app.config_watch import is_config_path, watch_config
+from app.utils import CONFIG_FRAGMENTS_DIR, CONFIG_JSON_PATH
+
+
+def test_is_config_path() -> None:
+    assert is_config_path(CONFIG_JSON_PATH)
+    assert is_config_path(CONFIG_FRAGMENTS_DIR)
+    assert is_config_path(CONFIG_FRAGMENTS_DIR / "extra.json")
+    assert not is_config_path(CONFIG_FRAGMENTS_DIR / "extra.json.swp")
+    assert not is_config_path(CONFIG_JSON_PATH.with_name("db.json"))
+    assert not is_config_path(CONFIG_FRAGMENTS_DIR / "sub" / "extra.json")
+
+
+async def _watch(edit: Callable[[], None]) -> int:
+    """Watch the files while an edit is made, count the changes reported."""
+    changes = 0
+
+    def _on_change() -> None:
+        nonlocal changes
+        changes += 1
+
+    watcher = asyncio.create_task(watch_config(_on_change))
+    await asyncio.sleep(0.05)  # The files are watched
+    edit()
+    await asyncio.sleep(0.3)
+    watcher.cancel()
+    return changes
+
+
+def _write_fragment() -> None:
+    """Write a fragment in several steps, as an editor would."""
+    path = CONFIG_FRAGMENTS_DIR / "extra.json"
+    path.write_text("{")
+    path.write_text(json.dumps({"bridge": {}}))
+    path.with_name(".extra.json.tmp").write_text("{}")
+    path.with_name(".extra.json.tmp").replace(path)
+
+
+def test_edit_reported_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config_watch, "CONFIG_RELOAD_DELAY", 0.05)
+    CONFIG_FRAGMENTS_DIR.mkdir()
+    CONFIG_JSON_PATH.write_text("{}")
+
+    assert asyncio.run(_watch(_write_fragment)) == 1
+    assert asyncio.run(_watch(lambda: CONFIG_JSON_PATH.write_text("{ }"))) == 1
+    assert asyncio.run(_watch(lambda: None)) == 0
+
+
+def test_other_files_ignored(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config_watch, "CONFIG_RELOAD_DELAY", 0.05)
+    CONFIG_FRAGMENTS_DIR.mkdir()
+
+    def _edit() -> None:
+        (CONFIG_FRAGMENTS_DIR / "notes.txt").write_text("")
+        CONFIG_JSON_PATH.with_name("db.json").write_text("{}")
+
+    assert asyncio.run(_watch(_edit)) == 0
+
+
+def test_polled_without_inotify(monkeypatch: pytest.MonkeyPatch) -> None:
+    def _unavailable() -> None:
+        raise OSError(38, "Function not implemented")
+
+    monkeypatch.setattr(config_watch, "Inotify", _unavailable)
+    monkeypatch.setattr(config_watch, "CONFIG_POLL_INTERVAL", 0.02)
+    CONFIG_JSON_PATH.write_text("{}")
+
+    def _edit() -> None:
+        CONFIG_FRAGMENTS_DIR.mkdir()
+        (CONFIG_FRAGMENTS_DIR / "extra.json").write_text("{}")
+
+    assert asyncio.run(_watch(_edit)) == 1
+    assert asyncio.run(_watch(lambda: None)) == 0
+
+
+def test_fragment_directory_created_later(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The fragments directory shows up next to config.json
+    monkeypatch.setattr(config_watch, "CONFIG_RELOAD_DELAY", 0.05)
+    CONFIG_JSON_PATH.write_text("{}")
+
+    assert asyncio.run(_watch(CONFIG_FRAGMENTS_DIR.mkdir)) == 1
@@ -0,0 +1,163 @@
+"""Unit tests of the Docker Engine API client, against a fake daemon."""
+
+import asyncio
+import json
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app import docker_client
+from app.docker_client import DockerClient, _iter_chunks, stream_events
+
+CONTAINERS = [{"Id": "c1", "Names": ["/a"]}, {"Id": "c2", "Names": ["/b"]}]
+INSPECT = {"State": {"Pid": 4242}}
+
+
+def _response(body: bytes, *, chunked: bool = False, close: bool = False) -> bytes:
+    headers = ["HTTP/1.1 200 OK", "Content-Type: application/json"]
+    if close:
+        headers.append("Connection: close")
+    if chunked:
+        headers.append("Transfer-Encoding: chunked")
+        half = len(body) // 2
+        body = b"".join(
+            f"{len(part):x}\r\n".encode() + part + b"\r\n"
+            for part in (body[:half], body[half:])
+        )
+        body += b"0\r\n\r\n"
+    else:
+        headers.append(f"Content-Length: {len(body)}")
+    return "\r\n".join(headers).encode() + b"\r\n\r\n" + body
+
+
+@pytest.fixture
+def daemon(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> Callable[..., list[list[str]]]:
+    """Return a function running a coroutine against a fake Docker daemon.
+
+    The daemon answers /containers/json chunked and inspect requests with
+    a Content-Length, closing the connection after each `close_after`
+    requests. The paths requested are returned, by connection.
+    """
+    path = tmp_path / "docker.sock"
+    monkeypatch.setattr(docker_client, "DOCKER_SOCKET", path)
+
+    def _run(coroutine: Callable[[], Any], close_after: int = 0) -> list[list[str]]:
+        connections: list[list[str]] = []
+
+        async def _serve(
+            reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+        ) -> None:
+            requests: list[str] = []
+            connections.append(requests)
+            while request := await reader.read(4096):
+                requests.append(request.split()[1].decode())
+                close = len(requests) == close_after
+                if requests[-1] == "/containers/json":
+                    body = _response(json.dumps(CONTAINERS).encode(), chunked=True)
+                else:
+                    body = _response(json.dumps(INSPECT).encode(), close=close)
+                writer.write(body)
+                await writer.drain()
+                if close:
+                    writer.close()
+                    return
+
+        async def _main() -> None:
+            server = await asyncio.start_unix_server(_serve, path)
+            try:
+                await coroutine()
+            finally:
+                server.close()
+
+        asyncio.run(_main())
+        return connections
+
+    return _run
+
+
+def test_requests_share_one_connection(daemon: Callable[..., list[list[str]]]) -> None:
+    client = DockerClient()
+    pids: list[int] = []
+
+    async def _lookup() -> None:
+        containers = await client.refresh()
+        assert containers.keys() == {"a", "b"}
+        pids.append(await client.get_pid("a"))
+        pids.append(await client.get_pid("a"))  # Cached
+        client.close()
+
+    assert daemon(_lookup) == [["/containers/json", "/containers/c1/json"]]
+    assert pids == [4242, 4242]
+
+
+def test_closed_connection_reopened(daemon: Callable[..., list[list[str]]]) -> None:
+    client = DockerClient()
+
+    async def _lookup() -> None:
+        await client.refresh()
+        await client.get_pid("a")  # The daemon closes the connection after it
+        await client.refresh()
+        client.close()
+
+    assert daemon(_lookup, close_after=2) == [
+        ["/containers/json", "/containers/c1/json"],
+        ["/containers/json"],
+    ]
+
+
+def test_pid_of_stopped_container() -> None:
+    with pytest.raises(ValueError, match="not running"):
+        asyncio.run(DockerClient().get_pid("a"))
+
+
+def test_chunks_reassembled() -> None:
+    async def _read() -> list[bytes]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"3\r\nabc\r\n2;ext=1\r\nde\r\n0\r\n\r\n")
+        return [chunk async for chunk in _iter_chunks(reader)]
+
+    assert asyncio.run(_read()) == [b"abc", b"de"]
+
+
+def test_truncated_chunk() -> None:
+    async def _read() -> list[bytes]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"8\r\nabc")
+        reader.feed_eof()
+        return [chunk async for chunk in _iter_chunks(reader)]
+
+    with pytest.raises(asyncio.IncompleteReadError):
+        asyncio.run(_read())
+
+
+def test_events_split_across_chunks(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    path = tmp_path / "docker.sock"
+    monkeypatch.setattr(docker_client, "DOCKER_SOCKET", path)
+    events = b'{"Action": "start"}\n{"Action":' + b' "die"}\n'
+    requested: list[bytes] = []
+
+    async def _serve(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        requested.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(_response(events, chunked=True))
+        await writer.drain()
+        writer.close()
+
+    async def _subscribe() -> list[dict[str, Any]]:
+        server = await asyncio.start_unix_server(_serve, path)
+        try:
+            return [
+                event async for event in stream_events({"type": ["container"]}, "1.5")
+            ]
+        finally:
+            server.close()
+
+    assert asyncio.run(_subscribe()) == [{"Action": "start"}, {"Action": "die"}]
+    assert b"&since=1.5 " in requested[0]
@@ -0,0 +1,116 @@
+"""Unit tests of the background job queue and its API."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from fastapi import HTTPException, Response
+
+from app.jobs import JobQueue, get_job_queue
+from app.orchestrator import WAKE_ACTION, get_event_queue
+from app.routers.jobs import accept_job, get_job_api
+
+
+def test_jobs_applied_in_order() -> None:
+    applied: list[str] = []
+
+    def _job(name: str, *, fail: bool = False) -> Callable[[], Awaitable[dict]]:
+        async def _apply() -> dict:
+            await asyncio.sleep(0)
+            applied.append(name)
+            if fail:
+                msg = f"{name} failed"
+                raise ValueError(msg)
+            return {"status": "success"}
+
+        return _apply
+
+    async def _run() -> list[dict]:
+        queue = JobQueue()
+        queued = [
+            queue.submit("add_bridge", _job("first")),
+            queue.submit("add_bridge", _job("second", fail=True)),
+            queue.submit("add_bridge", _job("third")),
+        ]
+        assert [job.status for job in queued] == ["queued"] * 3
+        queue.start()
+        await queued[-1].done.wait()
+        await queue.stop()
+        return [job.as_dict() for job in queued]
+
+    first, second, third = asyncio.run(_run())
+    assert applied == ["first", "second", "third"]
+    assert (first["status"], first["result"]) == ("done", {"status": "success"})
+    assert (second["status"], second["detail"]) == ("failed", "second failed")
+    assert third["started"] >= second["finished"]
+
+
+def test_unexpected_error_fails_the_job_only() -> None:
+    async def _crash() -> dict:
+        msg = "unexpected"
+        raise RuntimeError(msg)
+
+    async def _reject() -> dict:
+        raise HTTPException(status_code=400, detail="Invalid bridge")
+
+    async def _apply() -> dict:
+        return {"status": "success"}
+
+    async def _run() -> list[dict]:
+        queue = JobQueue()
+        queue.start()
+        queued = [
+            queue.submit("add_bridge", _crash),
+            queue.submit("add_bridge", _reject),
+            queue.submit("add_bridge", _apply),
+        ]
+        async with asyncio.timeout(1):
+            await queued[-1].done.wait()
+        await queue.stop()
+        return [job.as_dict() for job in queued]
+
+    crashed, rejected, applied = asyncio.run(_run())
+    assert (crashed["status"], crashed["detail"]) == ("failed", "unexpected")
+    assert (rejected["status"], rejected["detail"]) == ("failed", "Invalid bridge")
+    assert applied["status"] == "done"
+
+
+def test_finished_jobs_forgotten_beyond_history() -> None:
+    async def _apply() -> dict:
+        return {}
+
+    async def _run() -> tuple[JobQueue, list[str]]:
+        queue = JobQueue(history=2)
+        queue.start()
+        ids = []
+        for _ in range(3):
+            job = queue.submit("add_bridge", _apply)
+            await job.done.wait()
+            ids.append(job.id)
+        await queue.stop()
+        return queue, ids
+
+    queue, ids = asyncio.run(_run())
+    assert queue.get(ids[0]) is None
+    assert queue.get(ids[2]) is not None
+
+
+def test_accepted_job_polled_until_done() -> None:
+    async def _apply() -> dict:
+        return {"status": "success"}
+
+    async def _run() -> tuple[Response, dict, dict]:
+        response = Response()
+        accepted = accept_job(response, "add_bridge", _apply)
+        get_job_queue().start()
+        try:
+            polled = await get_job_api(accepted["job_id"], wait=1)
+        finally:
+            await get_job_queue().stop()
+        return response, accepted, polled
+
+    response, accepted, polled = asyncio.run(_run())
+    assert response.status_code == 202
+    assert response.headers["Location"] == f"/jobs/{accepted['job_id']}"
+    assert polled["status"] == "done"
+    # The main loop is woken up to check the result
+    assert get_event_queue().get_nowait() == (WAKE_ACTION, "job add_bridge")
@@ -0,0 +1,154 @@
+"""Unit tests of the resource locks."""
+
+import asyncio
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+
+import pytest
+
+from app.locks import GLOBAL_KEY, LockManager, SharedLock
+
+
+async def _run(
+    holds: dict[str, Callable[[], AbstractAsyncContextManager[None]]],
+) -> list[str]:
+    """Enter the holds in order, each keeps its locks until the next one waits.
+
+    :return: "+name" when a hold is entered and "-name" when it is left
+    """
+    events: list[str] = []
+
+    async def _task(name: str, hold: AbstractAsyncContextManager[None]) -> None:
+        async with hold:
+            events.append(f"+{name}")
+            for _ in range(5):  # Let the other tasks queue up
+                await asyncio.sleep(0)
+        events.append(f"-{name}")
+
+    tasks = []
+    for name, hold in holds.items():
+        tasks.append(asyncio.create_task(_task(name, hold())))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return events
+
+
+def test_shared_bridge_used_in_parallel() -> None:
+    async def _holds() -> list[str]:
+        manager = LockManager()
+        return await _run(
+            {
+                "a": lambda: manager.hold(containers=["a"], uses=["br0"]),
+                "b": lambda: manager.hold(containers=["b"], uses=["br0"]),
+            }
+        )
+
+    assert asyncio.run(_holds()) == ["+a", "+b", "-a", "-b"]
+
+
+def test_changed_bridge_waits_for_users() -> None:
+    async def _holds() -> list[str]:
+        manager = LockManager()
+        return await _run(
+            {
+                "a": lambda: manager.hold(containers=["a"], uses=["br0"]),
+                "br0": lambda: manager.hold(bridges=["br0"]),
+                "b": lambda: manager.hold(containers=["b"], uses=["br0"]),
+            }
+        )
+
+    # The waiting change of br0 goes before the later user
+    assert asyncio.run(_holds()) == ["+a", "-a", "+br0", "-br0", "+b", "-b"]
+
+
+def test_same_container_serialized() -> None:
+    async def _holds() -> list[str]:
+        manager = LockManager()
+        return await _run(
+            {
+                "first": lambda: manager.hold(containers=["a"]),
+                "second": lambda: manager.hold(containers=["a"]),
+            }
+        )
+
+    assert asyncio.run(_holds()) == ["+first", "-first", "+second", "-second"]
+
+
+def test_hold_all_excludes_operations() -> None:
+    async def _holds() -> list[str]:
+        manager = LockManager()
+        return await _run(
+            {
+                "a": lambda: manager.hold(containers=["a"]),
+                "all": manager.hold_all,
+                "vp": lambda: manager.hold(veth_pairs=["vp"]),
+            }
+        )
+
+    assert asyncio.run(_holds()) == ["+a", "-a", "+all", "-all", "+vp", "-vp"]
+
+
+def test_concurrency_limited() -> None:
+    async def _holds() -> list[str]:
+        manager = LockManager(limit=1)
+        return await _run(
+            {
+                "a": lambda: manager.hold(containers=["a"]),
+                "b": lambda: manager.hold(containers=["b"]),
+            }
+        )
+
+    assert asyncio.run(_holds()) == ["+a", "-a", "+b", "-b"]
+
+
+def test_resource_locks_forgotten() -> None:
+    manager = LockManager()
+
+    async def _hold() -> set[str]:
+        async with manager.hold(bridges=["br0"], containers=["a"], uses=["br1"]):
+            return set(manager._locks)
+
+    assert asyncio.run(_hold()) == {
+        GLOBAL_KEY,
+        "bridge:br0",
+        "bridge:br1",
+        "container:a",
+    }
+    assert set(manager._locks) == {GLOBAL_KEY}
+
+
+def test_locks_released_on_error() -> None:
+    manager = LockManager()
+
+    async def _fail() -> None:
+        async with manager.hold(containers=["a"]):
+            msg = "attach failed"
+            raise ValueError(msg)
+
+    async def _retry() -> bool:
+        with pytest.raises(ValueError, match="attach failed"):
+            await _fail()
+        async with asyncio.timeout(1), manager.hold(containers=["a"]):
+            return True
+
+    assert asyncio.run(_retry())
+    assert manager._locks[GLOBAL_KEY].is_free()
+
+
+def test_shared_lock_state() -> None:
+    lock = SharedLock()
+
+    async def _use() -> list[tuple[bool, int]]:
+        states = []
+        await lock.acquire(exclusive=False)
+        await lock.acquire(exclusive=False)
+        states.append((lock.owned, lock.sharers))
+        await lock.release(exclusive=False)
+        await lock.release(exclusive=False)
+        await lock.acquire(exclusive=True)
+        states.append((lock.owned, lock.sharers))
+        await lock.release(exclusive=True)
+        return states
+
+    assert asyncio.run(_use()) == [(False, 2), (True, 0)]
+    assert lock.is_free()
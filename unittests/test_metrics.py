@@ -0,0 +1,67 @@
+"""Unit tests of the metrics registry and its text exposition."""
+
+import asyncio
+
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Render only the metrics created by the test."""
+    monkeypatch.setattr(metrics, "_METRICS", [])
+
+
+def test_counter_and_gauge_render() -> None:
+    counter = metrics.Counter("test_total", "Things counted", ("command",))
+    counter.inc(command='ovs "vsctl"')
+    counter.inc(2, command='ovs "vsctl"')
+    gauge = metrics.Gauge("test_items", "Items")
+    gauge.set(3)
+    gauge.set(1)
+
+    assert metrics.render() == (
+        "# HELP test_total Things counted\n"
+        "# TYPE test_total counter\n"
+        'test_total{command="ovs \\"vsctl\\""} 3\n'
+        "# HELP test_items Items\n"
+        "# TYPE test_items gauge\n"
+        "test_items 1\n"
+    )
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = metrics.Histogram("test_seconds", "Durations", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert list(histogram.samples()) == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 5.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_timed_observes_sync_and_async_calls() -> None:
+    histogram = metrics.Histogram("test_op_seconds", "Operations", ("operation",))
+
+    @metrics.timed(histogram)
+    def probe() -> int:
+        return 1
+
+    @metrics.timed(histogram)
+    async def apply() -> int:
+        msg = "failed"
+        raise ValueError(msg)
+
+    assert probe() == 1
+    with pytest.raises(ValueError, match="failed"):
+        asyncio.run(apply())
+
+    samples = list(histogram.samples())
+    # Failed calls are observed too
+    assert 'test_op_seconds_count{operation="probe"} 1' in samples
+    assert 'test_op_seconds_count{operation="apply"} 1' in samples
@@ -0,0 +1,159 @@
+"""Unit tests of the rtnetlink backend."""
+
+import errno
+import socket
+import struct
+
+import pytest
+
+from app.netlink import (
+    _IFINFOMSG,
+    _NLMSGERR,
+    _NLMSGHDR,
+    IFF_UP,
+    IFLA_ADDRESS,
+    IFLA_IFNAME,
+    IFLA_INFO_KIND,
+    IFLA_LINKINFO,
+    IFLA_MASTER,
+    IFLA_MTU,
+    IFLA_OPERSTATE,
+    NLMSG_DONE,
+    NLMSG_ERROR,
+    RTM_NEWLINK,
+    Link,
+    NetlinkBackend,
+    _attr,
+    _parse_attrs,
+    _str_attr,
+)
+from app.utils import NETLINK_TIMEOUT
+
+
+@pytest.fixture
+def backend() -> NetlinkBackend:
+    """Return a backend of the current namespace, if netlink is available."""
+    netlink = NetlinkBackend()
+    try:
+        netlink.links()
+    except OSError as exc:
+        pytest.skip(f"rtnetlink unavailable: {exc}")
+    return netlink
+
+
+def _message(msg_type: int, seq: int, payload: bytes) -> bytes:
+    return _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type, 0, seq, 0) + payload
+
+
+def _link_payload() -> bytes:
+    return (
+        _IFINFOMSG.pack(socket.AF_UNSPEC, 1, 7, IFF_UP, 0)
+        + _str_attr(IFLA_IFNAME, "veth0")
+        + _attr(IFLA_MASTER, struct.pack("=I", 3))
+        + _attr(IFLA_ADDRESS, bytes.fromhex("020000000001"))
+        + _attr(IFLA_MTU, struct.pack("=I", 1500))
+        + _attr(IFLA_OPERSTATE, bytes([6]))
+        + _attr(IFLA_LINKINFO, _str_attr(IFLA_INFO_KIND, "veth"))
+    )
+
+
+class _Replay:
+    """Socket answering every request with canned messages."""
+
+    def __init__(self, *messages: bytes) -> None:
+        """Hold the messages, each returned by its own recv()."""
+        self.messages = list(messages)
+        self.sent: list[bytes] = []
+
+    def send(self, data: bytes) -> int:
+        """Record a request."""
+        self.sent.append(data)
+        return len(data)
+
+    def recv(self, _size: int) -> bytes:
+        """Return the next canned message."""
+        return self.messages.pop(0)
+
+
+def test_attributes_round_trip() -> None:
+    data = _attr(1, b"abc") + _str_attr(3, "eth0") + _attr(18, _attr(1, b"x"))
+
+    # Each attribute is padded to 4 bytes
+    assert len(data) % 4 == 0
+    assert list(_parse_attrs(data)) == [
+        (1, b"abc"),
+        (3, b"eth0\0"),
+        (18, _attr(1, b"x")),
+    ]
+    # Trailing bytes too short for an attribute header are ignored
+    assert list(_parse_attrs(data[:-10])) == [(1, b"abc"), (3, b"eth0\0")]
+
+
+def test_parse_link() -> None:
+    assert NetlinkBackend._parse_link(_link_payload()) == Link(
+        index=7,
+        name="veth0",
+        up=True,
+        kind="veth",
+        master=3,
+        address="02:00:00:00:00:01",
+        mtu=1500,
+        operstate="up",
+    )
+
+
+def test_dump_spanning_reads_skips_stale_replies(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    backend = NetlinkBackend()
+    link = _link_payload()
+    sock = _Replay(
+        _message(RTM_NEWLINK, 0, link),  # Of an interrupted request
+        _message(RTM_NEWLINK, 1, link) + _message(RTM_NEWLINK, 1, link),
+        _message(NLMSG_DONE, 1, b""),
+    )
+    monkeypatch.setattr(backend, "_socket", lambda: sock)
+
+    assert [link.name for link in backend.links()] == ["veth0", "veth0"]
+    assert len(sock.sent) == 1
+
+
+def test_error_reply_raises(monkeypatch: pytest.MonkeyPatch) -> None:
+    backend = NetlinkBackend()
+    sock = _Replay(_message(NLMSG_ERROR, 1, _NLMSGERR.pack(-errno.EEXIST)))
+    monkeypatch.setattr(backend, "_socket", lambda: sock)
+
+    with pytest.raises(FileExistsError):
+        backend.add_bridge("br0")
+
+
+def test_reply_wait_is_bounded(backend: NetlinkBackend) -> None:
+    assert backend._socket().gettimeout() == NETLINK_TIMEOUT
+
+
+def test_missing_reply_times_out(
+    backend: NetlinkBackend, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sock = backend._socket()
+    sock.settimeout(0.01)
+    # The request is dropped, its reply never arrives
+    monkeypatch.setattr(backend, "_socket", lambda: _Unsent(sock))
+
+    with pytest.raises(TimeoutError):
+        backend.links()
+
+
+class _Unsent:
+    """Socket dropping what is sent to it."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        """Wrap a socket."""
+        self._sock = sock
+
+    def send(self, data: bytes) -> int:
+        """Pretend to send."""
+        return len(data)
+
+    def recv(self, size: int) -> bytes:
+        """Receive from the wrapped socket."""
+        return self._sock.recv(size)
@@ -0,0 +1,287 @@
+"""Unit tests of the reconcile passes, against the simulated network."""
+
+import asyncio
+import copy
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from app import orchestrator, simulated
+from app.docker_client import get_docker_client
+from app.planner import ATTACH_CONTAINER_IFACE, INIT_BRIDGE, Operation
+from app.retry import get_failure_tracker
+from app.utils import CONFIG_FRAGMENTS_DIR, get_config
+
+
+@pytest.mark.usefixtures("topology")
+def test_reconcile_all_goes_on_without_unresolved_container(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    docker = get_docker_client()
+    get_pid = docker.get_pid
+
+    async def _get_pid(name: str) -> int:
+        if name == "a":
+            msg = f"Container {name} is not running"
+            raise ValueError(msg)
+        return await get_pid(name)
+
+    monkeypatch.setattr(docker, "get_pid", _get_pid)
+
+    operations = asyncio.run(orchestrator.reconcile_all())
+
+    items = {operation.item for operation in operations}
+    assert "container:b:eth1" in items
+    assert not any(item.startswith("container:a:") for item in items)
+    failures = {failure.item: failure for failure in get_failure_tracker().failures()}
+    assert list(failures) == ["container:a:eth1"]
+    assert "not running" in failures["container:a:eth1"].error
+
+    # The failure is kept by the next pass, it backs off as any other item
+    asyncio.run(orchestrator.reconcile_all())
+    assert get_failure_tracker().failures()[0].failures == 1
+
+
+@pytest.mark.usefixtures("topology")
+def test_reconcile_container_records_unresolved_container(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    def _open_netns(_pid: int) -> Any:
+        raise FileNotFoundError(2, "No such process")
+
+    asyncio.run(get_docker_client().refresh())
+    monkeypatch.setattr(orchestrator.get_link_backend(), "open_netns", _open_netns)
+
+    asyncio.run(orchestrator.reconcile_container("b"))
+
+    assert sorted(failure.item for failure in get_failure_tracker().failures()) == [
+        "container:b:eth1",
+        "container:b:eth2",
+    ]
+
+
+@pytest.mark.parametrize(
+    "error",
+    [asyncio.IncompleteReadError(b"", 8), IndexError("chunk"), EOFError()],
+)
+def test_event_watcher_reconnects(
+    monkeypatch: pytest.MonkeyPatch, error: BaseException
+) -> None:
+    since: list[str | None] = []
+
+    async def _events(
+        _filters: dict[str, list[str]], after: str | None
+    ) -> AsyncIterator[dict[str, Any]]:
+        since.append(after)
+        if len(since) == 1:
+            yield {
+                "Action": "die",
+                "Actor": {"Attributes": {"name": "a"}},
+                "timeNano": 1_500_000_000,
+            }
+            raise error
+        yield {"Action": "start", "Actor": {"Attributes": {"name": "a"}}}
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(get_docker_client(), "events", _events)
+    monkeypatch.setattr(orchestrator, "EVENT_RETRY_DELAY", 0)
+
+    async def _watch() -> list[tuple[str, str]]:
+        queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        watcher = asyncio.create_task(orchestrator._watch_container_events(queue))
+        try:
+            return [await queue.get(), await queue.get()]
+        finally:
+            watcher.cancel()
+
+    assert asyncio.run(_watch()) == [("die", "a"), ("start", "a")]
+    # The events missed while reconnecting are replayed
+    assert since == [None, "1.500000000"]
+
+
+def test_watcher_exit_logged(caplog: pytest.LogCaptureFixture) -> None:
+    async def _fail() -> None:
+        msg = "unexpected"
+        raise RuntimeError(msg)
+
+    async def _run() -> None:
+        task = asyncio.create_task(_fail(), name="docker-events")
+        task.add_done_callback(orchestrator._log_watcher_exit)
+        await asyncio.wait([task])
+        await asyncio.sleep(0)  # Done callbacks are scheduled
+
+    asyncio.run(_run())
+    assert "Watcher docker-events stopped" in caplog.text
+    assert "RuntimeError: unexpected" in caplog.text
+
+
+@pytest.mark.usefixtures("topology")
+def test_main_loop_goes_on_after_unexpected_error(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    passes = 0
+    second = asyncio.Event()
+
+    async def _reconcile_all() -> list[Operation]:
+        nonlocal passes
+        passes += 1
+        if passes == 1:
+            msg = "unexpected"
+            raise RuntimeError(msg)
+        second.set()
+        return []
+
+    monkeypatch.setattr(orchestrator, "reconcile_all", _reconcile_all)
+    monkeypatch.setattr(orchestrator, "backoff_delay", lambda _failures: 0)
+
+    async def _run() -> None:
+        loop = asyncio.create_task(orchestrator.main())
+        try:
+            await asyncio.wait_for(second.wait(), 1)
+        finally:
+            loop.cancel()
+            await asyncio.gather(loop, return_exceptions=True)
+
+    asyncio.run(_run())
+    assert "Reconcile pass failed 1 time(s)" in caplog.text
+    assert "RuntimeError: unexpected" in caplog.text
+
+
+@pytest.mark.usefixtures("topology")
+def test_event_burst_coalesced_per_container(monkeypatch: pytest.MonkeyPatch) -> None:
+    handled: list[tuple[str, str]] = []
+
+    async def _handle(name: str, action: str) -> None:
+        handled.append((name, action))
+
+    monkeypatch.setattr(orchestrator, "_handle_container_event", _handle)
+
+    async def _serve() -> bool:
+        queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        for event in (("start", "a"), ("die", "a"), ("start", "x"), ("start", "b")):
+            queue.put_nowait(event)
+        return await orchestrator._handle_container_events(queue, 0.05)
+
+    assert asyncio.run(_serve())
+    # Only the latest action counts, containers not configured are ignored
+    assert sorted(handled) == [("a", "die"), ("b", "start")]
+
+
+def test_event_wait_ends_on_request_or_silence() -> None:
+    async def _serve(*events: tuple[str, str]) -> bool:
+        queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        for event in events:
+            queue.put_nowait(event)
+        return await orchestrator._handle_container_events(queue, 0.05)
+
+    assert asyncio.run(_serve((orchestrator.WAKE_ACTION, "api")))
+    assert not asyncio.run(_serve())
+
+
+@pytest.mark.usefixtures("topology")
+def test_restart_event_reattaches_container() -> None:
+    docker = get_docker_client()
+
+    async def _restart() -> list[str]:
+        await orchestrator.reconcile_all()
+        docker.restart("a")
+        await orchestrator._handle_container_event("a", "restart")
+        handle = await orchestrator.get_container_handle("a")
+        assert handle is not None
+        return sorted(orchestrator.get_container_links(handle.netns_fd))
+
+    assert asyncio.run(_restart()) == ["eth1", "lo"]
+
+
+@pytest.mark.usefixtures("topology")
+def test_container_handle_cached_until_restart() -> None:
+    docker = get_docker_client()
+    network = simulated.get_simulated_network()
+
+    async def _resolve() -> None:
+        await docker.refresh()
+        first = await orchestrator.get_container_handle("a")
+        assert await orchestrator.get_container_handle("a") is first
+        assert network.calls["docker.get_pid"] == 1
+
+        # Re-created under the same name, the namespace is opened again
+        docker.restart("a")
+        second = await orchestrator.get_container_handle("a")
+        assert second is not None
+        assert first is not None
+        assert (second.id, second.pid) != (first.id, first.pid)
+        assert network.calls["docker.get_pid"] == 2
+
+        docker.stop("a")
+        assert await orchestrator.get_container_handle("a") is None
+        assert "a" not in orchestrator._CONTAINER_HANDLES
+
+    asyncio.run(_resolve())
+
+
+def test_failing_items_deferred_with_dependents() -> None:
+    operations = [
+        Operation(INIT_BRIDGE, ("br0",), "missing"),
+        Operation(ATTACH_CONTAINER_IFACE, ("a", "eth1"), "missing"),
+        Operation(INIT_BRIDGE, ("br1",), "missing"),
+        Operation(ATTACH_CONTAINER_IFACE, ("b", "eth2"), "missing"),
+    ]
+    get_failure_tracker().failed("bridge:br0", OSError("no such device"))
+
+    kept, dependencies = orchestrator._defer_failing(
+        operations, [set(), {0}, set(), {2}]
+    )
+
+    # Indexes of the dependencies follow the operations kept
+    assert kept == operations[2:]
+    assert dependencies == [set(), {0}]
+
+
+def test_interval_grows_while_nothing_changes() -> None:
+    interval = orchestrator.MIN_SYNC_INTERVAL
+    waits = []
+    for _ in range(20):
+        interval = orchestrator._next_interval(interval, changed=False)
+        waits.append(interval)
+
+    assert waits[0] == 2 * orchestrator.MIN_SYNC_INTERVAL
+    assert waits == sorted(waits)
+    assert waits[-1] == orchestrator.FULL_SYNC_INTERVAL
+    # A change, or an attempt, brings the next pass close again
+    assert (
+        orchestrator._next_interval(waits[-1], changed=True)
+        == orchestrator.MIN_SYNC_INTERVAL
+    )
+    assert (
+        orchestrator._next_interval(0, changed=False) == orchestrator.MIN_SYNC_INTERVAL
+    )
+
+
+@pytest.mark.usefixtures("topology")
+def test_reload_applies_changed_files_only(caplog: pytest.LogCaptureFixture) -> None:
+    fragment = CONFIG_FRAGMENTS_DIR / "extra.json"
+
+    async def _reload() -> list[list[str]]:
+        await orchestrator.reconcile_all()
+        orchestrator._LOADED_CONFIG.update(copy.deepcopy(get_config()))
+        CONFIG_FRAGMENTS_DIR.mkdir()
+        fragment.write_text(json.dumps({"veth_pairs": {"vq": {"on": "br1"}}}))
+        first = await orchestrator.reload_config()
+        unchanged = await orchestrator.reload_config()
+        fragment.write_text("{")
+        unreadable = await orchestrator.reload_config()
+        fragment.write_text(json.dumps({"bridge": None}))
+        malformed = await orchestrator.reload_config()
+        return [
+            [operation.item for operation in operations]
+            for operations in (first, unchanged, unreadable, malformed)
+        ]
+
+    assert asyncio.run(_reload()) == [["veth:vq"], [], [], []]
+    assert "Section bridge of extra.json is not an object" in caplog.text
+    assert "Failed to reload the configuration" in caplog.text
+    assert get_config()["veth_pairs"].keys() == {"vp", "vq"}
+    assert get_failure_tracker().failures() == []
+    assert "vq" in orchestrator._LOADED_CONFIG["veth_pairs"]
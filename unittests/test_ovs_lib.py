@@ -0,0 +1,246 @@
+"""Unit tests of the ovs-vsctl backend and the OVS transaction helpers."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import ovs_lib, simulated
+from app.docker_client import get_docker_client
+from app.ovsdb import OVS_TRANSACTION, PendingWrites
+
+CONTAINER_IDS = {"container_id": "a", "container_iface": "eth1"}
+
+
+@pytest.fixture
+def vsctl(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Run ovs-vsctl against a bridge holding the port old0 of a:eth1."""
+    commands: list[str] = []
+
+    async def _run_command(command: str, **_kwargs: object) -> SimpleNamespace:
+        commands.append(command)
+        stdout = ""
+        if " find interface " in command:
+            stdout = "old0\n"
+        elif "port-to-br old0" in command:
+            stdout = "br0\n"
+        return SimpleNamespace(stdout=stdout, returncode=0)
+
+    monkeypatch.setattr(ovs_lib, "run_command", _run_command)
+    return commands
+
+
+def test_find_port_sees_pending_writes(vsctl: list[str]) -> None:
+    backend = ovs_lib.VsctlBackend()
+
+    async def _recreate() -> list[str]:
+        token = OVS_TRANSACTION.set(PendingWrites())
+        try:
+            found = [await backend.find_port(CONTAINER_IDS)]
+            await backend.del_port("old0")
+            found.append(await backend.find_port(CONTAINER_IDS))
+            await backend.add_port("br0", "new0", external_ids=CONTAINER_IDS)
+            found.append(await backend.find_port(CONTAINER_IDS))
+            await backend.commit()
+        finally:
+            OVS_TRANSACTION.reset(token)
+        return found
+
+    assert asyncio.run(_recreate()) == ["old0", "", "new0"]
+    assert vsctl[-1] == (
+        "ovs-vsctl -- --if-exists del-port old0 -- --may-exist add-port br0 new0 "
+        "-- set interface new0 external_ids:container_id=a "
+        "external_ids:container_iface=eth1"
+    )
+
+
+@pytest.mark.usefixtures("vsctl")
+def test_restarted_container_port_recreated_in_one_transaction(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    backend = ovs_lib.VsctlBackend()
+    deleted: list[str] = []
+    monkeypatch.setattr(ovs_lib, "get_ovs_backend", lambda: backend)
+    monkeypatch.setattr(
+        ovs_lib,
+        "get_link_backend",
+        lambda: SimpleNamespace(delete_link=deleted.append),
+    )
+
+    async def _restart() -> str:
+        token = OVS_TRANSACTION.set(PendingWrites())
+        try:
+            # The restarted container lost eth1, its stale port is detached
+            assert not await ovs_lib.check_interface_exists("br0", "a", "eth1", 0, {})
+            return await ovs_lib.get_container_port("a", "eth1")
+        finally:
+            OVS_TRANSACTION.reset(token)
+
+    # add_container_port() finds no port left to conflict with
+    assert asyncio.run(_restart()) == ""
+    assert deleted == ["old0"]
+
+
+@pytest.fixture
+def vsctl_backend(
+    monkeypatch: pytest.MonkeyPatch, vsctl: list[str]
+) -> ovs_lib.VsctlBackend:
+    """Use the ovs-vsctl backend, whatever the environment selects."""
+    backend = ovs_lib.VsctlBackend()
+    monkeypatch.setattr(ovs_lib, "_get_ovs_backend", lambda: backend)
+    vsctl.clear()
+    return backend
+
+
+def test_transaction_commits_writes_once(
+    vsctl: list[str], vsctl_backend: ovs_lib.VsctlBackend
+) -> None:
+    order: list[str] = []
+
+    async def _after() -> None:
+        order.append(f"after {len(vsctl)} commit(s)")
+
+    async def _writes() -> None:
+        async with ovs_lib.ovs_transaction():
+            await vsctl_backend.add_bridge("br0")
+            async with ovs_lib.ovs_transaction():  # Joins the outer one
+                await vsctl_backend.set_port("new0", tag="100")
+            await ovs_lib.run_after_commit(_after)
+            assert vsctl == []
+
+    asyncio.run(_writes())
+    assert len(vsctl) == 1
+    assert vsctl[0].startswith("ovs-vsctl -- --may-exist add-br br0")
+    assert "set port new0 tag=100" in vsctl[0]
+    assert order == ["after 1 commit(s)"]
+
+
+def test_transaction_commits_writes_before_error(
+    vsctl: list[str], vsctl_backend: ovs_lib.VsctlBackend
+) -> None:
+    async def _writes() -> None:
+        async with ovs_lib.ovs_transaction():
+            await vsctl_backend.del_port("old0")
+            msg = "probe failed"
+            raise ValueError(msg)
+
+    with pytest.raises(ValueError, match="probe failed"):
+        asyncio.run(_writes())
+    assert vsctl == ["ovs-vsctl -- --if-exists del-port old0"]
+
+
+def test_write_without_transaction_runs_right_away(
+    vsctl: list[str], vsctl_backend: ovs_lib.VsctlBackend
+) -> None:
+    asyncio.run(vsctl_backend.del_port("old0"))
+
+    assert vsctl == ["ovs-vsctl --if-exists del-port old0"]
+
+
+def test_lxbr_port_name_matches_lxbr_docker() -> None:
+    # sha1 of "aeth1\n", as lxbr-docker computed it
+    assert ovs_lib.lxbr_port_name("a", "eth1") == "82de9e614d3cc_l"
+
+
+@pytest.mark.usefixtures("topology")
+def test_container_port_attached_and_detached() -> None:
+    network = simulated.get_simulated_network()
+    info = {
+        "iface": "eth1",
+        "bridge": "br0",
+        "vlan": "100",
+        "macaddress": "02:00:00:00:00:01",
+        "ipaddress": "10.0.0.5/24",
+        "gateway": "10.0.0.1",
+    }
+
+    async def _attach() -> str:
+        container = get_docker_client().start("a")
+        netns_fd = ovs_lib.get_link_backend().open_netns(container.pid)
+        await ovs_lib.add_container_port("a", info, netns_fd)
+        with pytest.raises(ValueError, match="already attached"):
+            await ovs_lib.add_container_port("a", info, netns_fd)
+        return await ovs_lib.get_container_port("a", "eth1")
+
+    port = asyncio.run(_attach())
+    pid = get_docker_client().container("a").pid
+    link = network.namespace(pid)["eth1"]
+    assert (link.up, link.address) == (True, "02:00:00:00:00:01")
+    assert network.addresses[pid, "eth1"] == ["10.0.0.5/24"]
+    assert network.routes[pid, 4] == "10.0.0.1"
+    assert network.ports[port].bridge == "br0"
+    assert network.ports[port].columns == {"tag": "100"}
+    assert network.namespace(simulated.HOST_NETNS)[port].up
+
+    asyncio.run(ovs_lib.del_container_port("a", "eth1"))
+    assert port not in network.ports
+    assert "eth1" not in network.namespace(pid)
+    assert asyncio.run(ovs_lib.get_container_port("a", "eth1")) == ""
+
+
+@pytest.mark.usefixtures("topology")
+def test_failed_attach_removes_veth() -> None:
+    network = simulated.get_simulated_network()
+    info = {"iface": "eth1", "bridge": "br0", "gateway": "not-an-address"}
+
+    async def _attach() -> None:
+        container = get_docker_client().start("a")
+        netns_fd = ovs_lib.get_link_backend().open_netns(container.pid)
+        await ovs_lib.add_container_port("a", info, netns_fd)
+
+    with pytest.raises(ValueError, match="does not appear to be"):
+        asyncio.run(_attach())
+    pid = get_docker_client().container("a").pid
+    assert "eth1" not in network.namespace(pid)
+    assert not network.container_ports
+
+
+@pytest.fixture
+def attached() -> tuple[int, int]:
+    """Attach eth1 of the running container a to br0.
+
+    :return: PID and namespace file descriptor of the container
+    """
+    container = get_docker_client().start("a")
+    netns_fd = ovs_lib.get_link_backend().open_netns(container.pid)
+    info = {"iface": "eth1", "bridge": "br0"}
+    asyncio.run(ovs_lib.add_container_port("a", info, netns_fd))
+    return container.pid, netns_fd
+
+
+def _check(netns_fd: int) -> bool:
+    links = ovs_lib.get_container_links(netns_fd)
+    return asyncio.run(
+        ovs_lib.check_interface_exists("br0", "a", "eth1", netns_fd, links)
+    )
+
+
+@pytest.mark.usefixtures("topology")
+def test_attached_interface_found(attached: tuple[int, int]) -> None:
+    _, netns_fd = attached
+
+    assert set(ovs_lib.get_container_links(netns_fd)) == {"lo", "eth1"}
+    assert _check(netns_fd)
+
+
+@pytest.mark.usefixtures("topology")
+def test_interface_without_port_removed(attached: tuple[int, int]) -> None:
+    pid, netns_fd = attached
+    network = simulated.get_simulated_network()
+    # The orchestrator restarted with a fresh OVS database
+    network.ports.clear()
+    network.container_ports.clear()
+
+    assert not _check(netns_fd)
+    assert "eth1" not in network.namespace(pid)
+
+
+@pytest.mark.usefixtures("topology")
+def test_port_without_interface_removed(attached: tuple[int, int]) -> None:
+    pid, netns_fd = attached
+    network = simulated.get_simulated_network()
+    # Deleted inside the container, the OVS port is left behind
+    network.delete_link(pid, "eth1")
+
+    assert not _check(netns_fd)
+    assert not network.container_ports
@@ -0,0 +1,242 @@
+"""Unit tests of the OVSDB backend, against an in-memory ovsdb-server."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from app.ovsdb import (
+    OVS_TRANSACTION,
+    OvsdbBackend,
+    OvsdbClient,
+    PendingWrites,
+    _atoms,
+    _map,
+    _map_atoms,
+    _MessageFramer,
+    _port_row,
+    ovs_state,
+)
+
+CONTAINER_IDS = {"container_id": "a", "container_iface": "eth1"}
+
+
+class FakeOvsdbClient:
+    """Answers the selects of OvsdbBackend from committed interfaces."""
+
+    def __init__(self, interfaces: dict[str, dict[str, str]]) -> None:
+        """Hold committed interfaces, by port name."""
+        self.interfaces = interfaces  # Port name to its external_ids, on br0
+        self.transactions: list[tuple[dict[str, Any], ...]] = []
+
+    async def select(
+        self, table: str, where: list[list[Any]], _columns: list[str]
+    ) -> list[dict[str, Any]]:
+        """Select ports by name, bridges and interfaces by external_ids."""
+        if table == "Port":
+            name = where[0][2]
+            return [{"_uuid": ["uuid", name]}] if name in self.interfaces else []
+        if table == "Bridge":
+            return [{"name": "br0"}]
+        if table == "Interface":
+            wanted = _map_atoms(where[0][2]).items()
+            return [
+                {"name": name}
+                for name, ids in self.interfaces.items()
+                if wanted <= ids.items()
+            ]
+        return [{"cur_cfg": len(self.transactions)}]
+
+    async def transact(self, *operations: dict[str, Any]) -> list[dict[str, Any]]:
+        """Record a transaction, it is applied right away."""
+        self.transactions.append(operations)
+        results: list[dict[str, Any]] = [{"count": 1} for _ in operations]
+        results[-1] = {"rows": [{"next_cfg": len(self.transactions)}]}
+        return results
+
+
+def test_find_port_sees_pending_writes() -> None:
+    client = FakeOvsdbClient({"old0": CONTAINER_IDS})
+    backend = OvsdbBackend(client)  # type: ignore[arg-type]
+
+    async def _recreate() -> list[str]:
+        token = OVS_TRANSACTION.set(PendingWrites())
+        try:
+            found = [await backend.find_port(CONTAINER_IDS)]
+            await backend.del_port("old0")
+            found.append(await backend.find_port(CONTAINER_IDS))
+            await backend.add_port("br0", "new0", external_ids=CONTAINER_IDS)
+            found.append(await backend.find_port(CONTAINER_IDS))
+            await backend.commit()
+        finally:
+            OVS_TRANSACTION.reset(token)
+        return found
+
+    assert asyncio.run(_recreate()) == ["old0", "", "new0"]
+    # The delete and the add are committed together
+    assert len(client.transactions) == 1
+
+
+def test_find_port_without_transaction() -> None:
+    backend = OvsdbBackend(FakeOvsdbClient({"old0": CONTAINER_IDS}))  # type: ignore[arg-type]
+
+    assert asyncio.run(backend.find_port(CONTAINER_IDS)) == "old0"
+    assert asyncio.run(backend.find_port({"container_id": "b"})) == ""
+
+
+def test_write_waits_for_vswitchd() -> None:
+    client = FakeOvsdbClient({"old0": {}})
+    backend = OvsdbBackend(client)  # type: ignore[arg-type]
+
+    async def _writes() -> str:
+        await backend.add_port("br0", "old0")  # Exists already
+        await backend.add_port("br0", "new0", external_ids={"a": "1"}, tag="100")
+        return await backend.port_to_br("old0")
+
+    assert asyncio.run(_writes()) == "br0"
+    (operations,) = client.transactions
+    assert operations[1]["row"]["tag"] == ["set", [100]]
+    assert operations[-1]["columns"] == ["next_cfg"]
+
+
+def test_port_row_encodes_vlan_columns() -> None:
+    assert _port_row({"trunks": "100,200", "tag": "5", "vlan_mode": "trunk"}) == {
+        "trunks": ["set", [100, 200]],
+        "tag": ["set", [5]],
+        "vlan_mode": "trunk",
+    }
+    assert _port_row({"trunks": ""}) == {"trunks": ["set", []]}
+
+
+def test_value_decoding() -> None:
+    assert _atoms(["set", []]) == []
+    assert _atoms(["set", [1, 2]]) == [1, 2]
+    assert _atoms(7) == [7]
+    assert _map_atoms(_map({"a": "1"})) == {"a": "1"}
+    assert _map_atoms(["set", []]) == {}
+
+
+def test_ovs_state_from_rows() -> None:
+    state = ovs_state(
+        bridges=[{"name": "br0", "ports": ["set", [["uuid", "p1"], ["uuid", "p2"]]]}],
+        ports=[
+            {
+                "_uuid": ["uuid", "p1"],
+                "name": "br0",
+                "interfaces": ["uuid", "i1"],
+                "tag": ["set", []],
+                "trunks": ["set", []],
+                "vlan_mode": ["set", []],
+            },
+            {
+                "_uuid": ["uuid", "p2"],
+                "name": "new0",
+                "interfaces": ["uuid", "i2"],
+                "tag": 100,
+                "trunks": ["set", [100, 200]],
+                "vlan_mode": "trunk",
+            },
+            {  # Left behind by a deleted bridge
+                "_uuid": ["uuid", "p3"],
+                "name": "gone",
+                "interfaces": ["set", []],
+                "tag": ["set", []],
+                "trunks": ["set", []],
+                "vlan_mode": ["set", []],
+            },
+        ],
+        interfaces=[
+            {"_uuid": ["uuid", "i1"], "external_ids": ["map", []]},
+            {"_uuid": ["uuid", "i2"], "external_ids": _map(CONTAINER_IDS)},
+        ],
+    )
+
+    assert state.bridges == {"br0"}
+    assert state.ports.keys() == {"br0", "new0"}
+    port = state.ports["new0"]
+    assert (port.bridge, port.tag, port.trunks, port.vlan_mode) == (
+        "br0",
+        ["100"],
+        ["100", "200"],
+        "trunk",
+    )
+    assert port.external_ids == CONTAINER_IDS
+
+
+def test_messages_framed_across_reads() -> None:
+    messages = [
+        {"id": 1, "result": [{"rows": [{"name": "br{0}"}]}], "error": None},
+        {"method": "echo", "params": ['quote " and \\ }'], "id": "e"},
+        {"id": 2, "result": "caf\u00e9 \u2192 {", "error": None},
+    ]
+    stream = "\n".join(json.dumps(m, ensure_ascii=False) for m in messages).encode()
+
+    for size in range(1, len(stream) + 1):
+        framer = _MessageFramer()
+        framed = [
+            json.loads(message)
+            for start in range(0, len(stream), size)
+            for message in framer.feed(stream[start : start + size])
+        ]
+        assert framed == messages, f"split every {size} bytes"
+
+
+def test_client_over_unix_socket(tmp_path: Path) -> None:
+    # Replies split across reads are reassembled, echo requests answered
+    path = tmp_path / "db.sock"
+    received: list[dict[str, Any]] = []
+
+    async def _serve(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        decoder = json.JSONDecoder()
+        buffer = ""
+        while data := await reader.read(65536):
+            buffer += data.decode()
+            while buffer:
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    break
+                buffer = buffer[end:]
+                received.append(message)
+                if message.get("method") == "transact":
+                    writer.write(b'{"method": "echo", "params": [], "id": "e"}')
+                    reply = json.dumps(
+                        {"id": message["id"], "result": [{"rows": []}], "error": None}
+                    ).encode()
+                    writer.write(reply[:10])
+                    await writer.drain()
+                    writer.write(reply[10:])
+                else:
+                    writer.write(
+                        json.dumps(
+                            {"id": message["id"], "result": None, "error": "bad"}
+                        ).encode()
+                    )
+
+    async def _talk() -> list[dict[str, Any]]:
+        server = await asyncio.start_unix_server(_serve, path)
+        client = OvsdbClient(f"unix:{path}")
+        try:
+            rows = await client.select("Bridge", [], ["name"])
+            with pytest.raises(ValueError, match="OVSDB request failed"):
+                await client.call("monitor", [])
+        finally:
+            client._disconnect()
+            server.close()
+        return rows
+
+    assert asyncio.run(_talk()) == []
+    assert [message.get("method") for message in received] == [
+        "transact",
+        None,  # Reply to the echo
+        "monitor",
+    ]
+
+
+def test_unsupported_remote() -> None:
+    with pytest.raises(ValueError, match="Unsupported OVSDB remote"):
+        asyncio.run(OvsdbClient("ssl:host:6640").call("list_dbs", []))
@@ -0,0 +1,138 @@
+"""Unit tests of the reconcile planner, against the simulated network."""
+
+import asyncio
+import json
+from typing import Any
+
+import pytest
+
+from app import orchestrator
+from app.docker_client import get_docker_client
+from app.ovs_lib import take_snapshot
+from app.planner import plan, plan_changes
+from app.simulated import HOST_NETNS, get_simulated_network
+from app.snapshot import Snapshot
+from app.utils import get_config
+
+
+async def _snapshot() -> Snapshot:
+    running = await get_docker_client().refresh()
+    netns_fds = {}
+    for name in running:
+        if (handle := await orchestrator.get_container_handle(name)) is not None:
+            netns_fds[name] = handle.netns_fd
+    return await take_snapshot(netns_fds)
+
+
+def _plan() -> list[tuple[str, tuple[str, ...], str]]:
+    operations = plan(get_config(), asyncio.run(_snapshot()))
+    return [(op.action, op.target, op.reason) for op in operations]
+
+
+@pytest.fixture
+def reconciled(topology: dict[str, Any]) -> dict[str, Any]:
+    """Bring the simulated network in line with the sample topology."""
+    asyncio.run(orchestrator.reconcile_all())
+    return topology
+
+
+@pytest.mark.usefixtures("topology")
+def test_cold_plan_creates_everything() -> None:
+    assert _plan() == [
+        ("init_bridge", ("br0",), "missing"),
+        ("init_bridge", ("br1",), "missing"),
+        ("attach_container_iface", ("a", "eth1"), "missing"),
+        ("attach_container_iface", ("b", "eth1"), "missing"),
+        ("attach_container_iface", ("b", "eth2"), "missing"),
+        ("create_veth_pair", ("vp",), "missing"),
+    ]
+
+
+@pytest.mark.usefixtures("reconciled")
+def test_nothing_planned_once_applied() -> None:
+    assert _plan() == []
+
+
+@pytest.mark.usefixtures("reconciled")
+def test_vlan_drift_reconfigured_in_place() -> None:
+    network = get_simulated_network()
+    port = network.container_ports["a", "eth1"]
+    network.ports[port].columns["tag"] = "200"
+
+    assert _plan() == [
+        ("configure_container_vlan", ("a", "eth1"), "VLANs differ"),
+    ]
+
+
+@pytest.mark.usefixtures("reconciled")
+def test_port_on_wrong_bridge_recreated() -> None:
+    network = get_simulated_network()
+    network.ports[network.container_ports["b", "eth2"]].bridge = "br0"
+
+    assert _plan() == [
+        ("detach_container_iface", ("b", "eth2"), "port of br0"),
+        ("attach_container_iface", ("b", "eth2"), "port of br0"),
+    ]
+
+
+@pytest.mark.usefixtures("reconciled")
+def test_parent_down_reattached() -> None:
+    get_simulated_network().namespace(HOST_NETNS)["eth8"].up = False
+
+    assert _plan() == [("attach_parent", ("br1", "eth8"), "down")]
+
+
+@pytest.mark.usefixtures("reconciled")
+def test_port_of_stopped_container_removed() -> None:
+    get_docker_client().stop("a")
+    orchestrator.invalidate_container("a")
+
+    assert _plan() == [
+        ("remove_stale_port", ("a", "eth1"), "container end is gone"),
+    ]
+
+
+def _changes(
+    previous: dict[str, Any], document: dict[str, Any]
+) -> list[tuple[str, tuple[str, ...], str]]:
+    return [
+        (op.action, op.target, op.reason) for op in plan_changes(previous, document)
+    ]
+
+
+def test_unchanged_configuration_plans_nothing(topology: dict[str, Any]) -> None:
+    assert _changes(topology, json.loads(json.dumps(topology))) == []
+
+
+def test_changed_items_recreated_removals_first(topology: dict[str, Any]) -> None:
+    document = json.loads(json.dumps(topology))
+    document["container"]["a"][0]["vlan"] = "200"
+    del document["container"]["b"]
+    document["veth_pairs"]["vp"]["map"] = "100:300"
+    document["bridge"]["br1"]["parents"] = [{"iface": "eth7"}]
+    document["bridge"]["br2"] = {}
+
+    assert _changes(topology, document) == [
+        ("remove_container_iface", ("a", "eth1"), "changed"),
+        ("remove_container_iface", ("b", "eth1"), "removed"),
+        ("remove_container_iface", ("b", "eth2"), "removed"),
+        ("remove_veth_pair", ("vp",), "changed"),
+        ("detach_parent", ("br1", "eth8"), "removed"),
+        ("attach_parent", ("br1", "eth7"), "added"),
+        ("init_bridge", ("br2",), "added"),
+        ("attach_container_iface", ("a", "eth1"), "changed"),
+        ("create_veth_pair", ("vp",), "changed"),
+    ]
+
+
+def test_removed_bridge_after_its_users(topology: dict[str, Any]) -> None:
+    document = json.loads(json.dumps(topology))
+    del document["bridge"]["br0"]["iprange"]
+    del document["bridge"]["br1"]
+    document["container"]["b"].pop()
+
+    assert _changes(topology, document) == [
+        ("remove_container_iface", ("b", "eth2"), "removed"),
+        ("remove_bridge", ("br1",), "removed"),
+        ("init_bridge", ("br0",), "changed"),
+    ]
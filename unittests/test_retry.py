@@ -0,0 +1,92 @@
+"""Unit tests of the failure tracking, backoff and quarantine of items."""
+
+import pytest
+
+from app import retry
+from app.retry import FailureTracker, backoff_delay, item_key
+from app.utils import RETRY_BASE_DELAY, RETRY_MAX_DELAY
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """Stop the monotonic clock of the tracker, it moves when set."""
+    now = [1000.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_item_key() -> None:
+    assert item_key("bridge", "br0") == "bridge:br0"
+    assert item_key("container", "wan", "eth1") == "container:wan:eth1"
+
+
+def test_backoff_doubles_up_to_max() -> None:
+    assert backoff_delay(1) == RETRY_BASE_DELAY
+    assert backoff_delay(2) == 2 * RETRY_BASE_DELAY
+    assert backoff_delay(3) == 4 * RETRY_BASE_DELAY
+    assert backoff_delay(100) == RETRY_MAX_DELAY
+
+
+def test_failed_item_waits_for_retry(clock: list[float]) -> None:
+    tracker = FailureTracker()
+    entry = tracker.failed("bridge:br0", OSError("no such device"))
+
+    assert (entry.failures, entry.error) == (1, "no such device")
+    assert not tracker.is_due("bridge:br0")
+    assert tracker.is_due("bridge:br1")
+    assert tracker.next_retry() == RETRY_BASE_DELAY
+    assert entry.as_dict()["retry_in"] == RETRY_BASE_DELAY
+
+    clock[0] += RETRY_BASE_DELAY
+    assert tracker.is_due("bridge:br0")
+    assert tracker.next_retry() == 0.0
+
+    tracker.failed("bridge:br0", ValueError())
+    assert entry.failures == 2
+    assert entry.error == "ValueError"  # Errors without a message
+    assert tracker.next_retry() == 2 * RETRY_BASE_DELAY
+
+
+@pytest.mark.usefixtures("clock")
+def test_quarantine_after_threshold() -> None:
+    tracker = FailureTracker(threshold=2)
+    tracker.failed("veth:vp", OSError("busy"))
+    assert not tracker.is_quarantined("veth:vp")
+
+    entry = tracker.failed("veth:vp", OSError("busy"))
+    assert entry.quarantined
+    assert tracker.is_quarantined("veth:vp")
+    assert entry.as_dict()["retry_in"] is None
+    assert tracker.next_retry() is None
+    assert [failure.item for failure in tracker.failures(quarantined=True)] == [
+        "veth:vp"
+    ]
+    assert tracker.failures(quarantined=False) == []
+
+
+def test_quarantined_item_never_due(clock: list[float]) -> None:
+    tracker = FailureTracker(threshold=1)
+    tracker.failed("veth:vp", OSError("busy"))
+
+    clock[0] += RETRY_MAX_DELAY
+    assert not tracker.is_due("veth:vp")
+    assert tracker.release("veth:vp")
+    assert tracker.is_due("veth:vp")
+    assert not tracker.release("veth:vp")
+
+
+@pytest.mark.usefixtures("clock")
+def test_success_and_retain_forget_items() -> None:
+    tracker = FailureTracker()
+    for item in ("bridge:br0", "bridge:br1", "container:a:eth1"):
+        tracker.failed(item, OSError("failed"))
+
+    tracker.succeeded("bridge:br0")
+    tracker.succeeded("bridge:br9")  # Was not failing
+    assert [failure.item for failure in tracker.failures()] == [
+        "bridge:br1",
+        "container:a:eth1",
+    ]
+
+    tracker.retain(["container:a:eth1", "veth:vp"])
+    assert [failure.item for failure in tracker.failures()] == ["container:a:eth1"]
@@ -0,0 +1,130 @@
+"""Unit tests of the task graph scheduler and the plan dependencies."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+
+from app.planner import (
+    ATTACH_CONTAINER_IFACE,
+    ATTACH_PARENT,
+    CREATE_VETH_PAIR,
+    DETACH_PARENT,
+    INIT_BRIDGE,
+    REMOVE_BRIDGE,
+    REMOVE_CONTAINER_IFACE,
+    Operation,
+    plan_dependencies,
+)
+from app.scheduler import GraphResult, run_graph
+
+CONFIG: dict[str, Any] = {
+    "bridge": {"br0": {}, "br1": {}},
+    "container": {
+        "a": [{"iface": "eth1", "bridge": "br0"}, {"iface": "eth2", "bridge": "br1"}],
+        "b": [{"iface": "eth1", "bridge": "br0"}],
+    },
+    "veth_pairs": {"vp": {"on": "br1"}},
+}
+
+
+def _graph(
+    dependencies: list[set[int]], failing: frozenset[int] = frozenset(), limit: int = 8
+) -> tuple[GraphResult, list[str]]:
+    """Run tasks recording when they start and end, some of them fail."""
+    events: list[str] = []
+
+    def _task(index: int) -> Callable[[], Awaitable[None]]:
+        async def _run() -> None:
+            events.append(f"+{index}")
+            await asyncio.sleep(0)
+            events.append(f"-{index}")
+            if index in failing:
+                msg = f"task {index} failed"
+                raise ValueError(msg)
+
+        return _run
+
+    tasks = [_task(index) for index in range(len(dependencies))]
+    result = asyncio.run(run_graph(tasks, dependencies, limit))
+    return result, events
+
+
+def test_independent_tasks_run_in_parallel() -> None:
+    result, events = _graph([set(), set(), set()])
+
+    assert events == ["+0", "+1", "+2", "-0", "-1", "-2"]
+    assert result == GraphResult()
+
+
+def test_task_waits_for_dependencies() -> None:
+    _, events = _graph([set(), set(), {0, 1}])
+
+    assert events.index("+2") > max(events.index("-0"), events.index("-1"))
+
+
+def test_tasks_limited() -> None:
+    _, events = _graph([set(), set(), set()], limit=1)
+
+    assert events == ["+0", "-0", "+1", "-1", "+2", "-2"]
+
+
+def test_failure_skips_dependents_only() -> None:
+    result, events = _graph([set(), {0}, {1}, set()], failing=frozenset({0}))
+
+    assert set(result.errors) == {0}
+    assert str(result.errors[0]) == "task 0 failed"
+    assert result.skipped == {1, 2}
+    assert "+1" not in events
+    assert "+2" not in events
+    assert result.succeeded(3)
+    assert not result.succeeded(0)
+    assert not result.succeeded(2)
+
+
+def test_dependency_must_precede() -> None:
+    with pytest.raises(ValueError, match="not earlier tasks"):
+        _graph([{1}, set()])
+    with pytest.raises(ValueError, match="not earlier tasks"):
+        _graph([{0}])
+
+
+def test_bridge_setup_before_users() -> None:
+    operations = [
+        Operation(INIT_BRIDGE, ("br0",), "missing"),
+        Operation(ATTACH_PARENT, ("br0", "eth9"), "missing"),
+        Operation(INIT_BRIDGE, ("br1",), "missing"),
+        Operation(ATTACH_CONTAINER_IFACE, ("a", "eth1"), "missing"),
+        Operation(ATTACH_CONTAINER_IFACE, ("b", "eth1"), "missing"),
+        Operation(ATTACH_CONTAINER_IFACE, ("a", "eth2"), "missing"),
+        Operation(CREATE_VETH_PAIR, ("vp",), "missing"),
+    ]
+
+    assert plan_dependencies(operations, CONFIG) == [
+        set(),
+        {0},
+        set(),
+        {0, 1},
+        {0, 1},
+        {2, 3},  # After br1 and the other interface of a
+        {2},
+    ]
+
+
+def test_bridge_removed_after_users() -> None:
+    operations = [
+        Operation(REMOVE_CONTAINER_IFACE, ("a", "eth1"), "removed"),
+        Operation(REMOVE_CONTAINER_IFACE, ("b", "eth1"), "removed"),
+        Operation(DETACH_PARENT, ("br0", "eth9"), "removed"),
+        Operation(REMOVE_BRIDGE, ("br0",), "removed"),
+        Operation(REMOVE_BRIDGE, ("br1",), "removed"),
+    ]
+
+    assert plan_dependencies(operations, CONFIG) == [
+        set(),
+        set(),
+        set(),
+        {0, 1, 2},
+        set(),
+    ]
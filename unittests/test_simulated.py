@@ -0,0 +1,103 @@
+"""Unit tests of the simulated network backends, which stand in for the kernel."""
+
+import asyncio
+import errno
+
+import pytest
+
+from app.simulated import (
+    HOST_NETNS,
+    SimulatedDockerClient,
+    SimulatedNetlink,
+    SimulatedNetwork,
+    SimulatedOvsBackend,
+)
+
+
+@pytest.fixture
+def network() -> SimulatedNetwork:
+    """Return a network with a container namespace, 100."""
+    network = SimulatedNetwork()
+    network.create_namespace(100)
+    return network
+
+
+def test_veth_peer_goes_with_its_end(network: SimulatedNetwork) -> None:
+    host = SimulatedNetlink(network)
+    host.add_veth("p0", "eth1", peer_netns=100, peer_address="02:AA:00:00:00:01")
+    container = host.for_netns(100)
+    container.add_address("eth1", "10.0.0.5/24")
+    container.add_default_route("10.0.0.1")
+
+    assert container.link("eth1").address == "02:aa:00:00:00:01"
+    with pytest.raises(FileExistsError):
+        container.add_address("eth1", "10.0.0.5/24")
+
+    host.delete_link("p0")
+    assert container.link("eth1") is None
+    # The route through the deleted link is gone as well
+    assert (100, 4) not in network.routes
+
+
+def test_operstate_follows_both_ends(network: SimulatedNetwork) -> None:
+    host = SimulatedNetlink(network)
+    host.add_veth("p0", "eth1", peer_netns=100)
+    host.set_link("p0", up=True)
+    assert host.link("p0").operstate == "lowerlayerdown"
+
+    host.for_netns(100).set_link("eth1", up=True)
+    assert host.link("p0").operstate == "up"
+
+
+def test_linux_bridge_vlans(network: SimulatedNetwork) -> None:
+    host = SimulatedNetlink(network)
+    host.add_bridge("br0")
+    host.add_veth("p0", "p1")
+    with pytest.raises(OSError, match="not a bridge port") as error:
+        host.add_bridge_vlan("p0", 100)
+    assert error.value.errno == errno.EOPNOTSUPP
+
+    host.set_link("p0", master="br0")
+    host.add_bridge_vlan("p0", 100, pvid=True)
+    assert host.bridge_vlans("p0") == [1, 100]
+    host.del_bridge_vlan("p0", 1)
+    assert host.all_bridge_vlans() == {host.link("p0").index: [100]}
+    with pytest.raises(OSError, match="VLAN id 5000"):
+        host.add_bridge_vlan("p0", 5000)
+
+
+def test_ovs_ports_indexed_by_container(network: SimulatedNetwork) -> None:
+    ovs = SimulatedOvsBackend(network)
+    ids = {"container_id": "a", "container_iface": "eth1"}
+
+    async def _ports() -> list[str]:
+        with pytest.raises(ValueError, match="No bridge named br0"):
+            await ovs.add_port("br0", "p0")
+        await ovs.add_bridge("br0")
+        await ovs.add_port("br0", "p0", ids, tag="100")
+        found = [await ovs.find_port(ids), await ovs.port_to_br("p0")]
+        await ovs.del_bridge("br0")
+        found.append(await ovs.find_port(ids))
+        return found
+
+    assert asyncio.run(_ports()) == ["p0", "br0", ""]
+
+
+def test_stopped_container_loses_its_namespace(network: SimulatedNetwork) -> None:
+    docker = SimulatedDockerClient(network)
+    events: asyncio.Queue = asyncio.Queue()
+    docker._subscribers.append(events)
+    container = docker.start("a")
+    host = SimulatedNetlink(network)
+    host.add_veth("p0", "eth1", peer_netns=host.open_netns(container.pid))
+
+    docker.restart("a")
+
+    assert container.pid not in network.links
+    assert host.link("p0") is None
+    assert docker.container("a").pid != container.pid
+    actions = [events.get_nowait()["Action"] for _ in range(events.qsize())]
+    assert actions == ["start", "die", "start", "restart"]
+    with pytest.raises(FileNotFoundError):
+        host.open_netns(container.pid)
+    assert HOST_NETNS in network.links
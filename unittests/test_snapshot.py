@@ -0,0 +1,141 @@
+"""Unit tests of the snapshot views, against the simulated network."""
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from app import orchestrator, ovs_lib
+from app.ovs_lib import take_snapshot
+from app.simulated import get_simulated_network
+from app.snapshot import (
+    Snapshot,
+    SnapshotLinkBackend,
+    SnapshotOvsBackend,
+    use_snapshot,
+)
+
+CONTAINER_IDS = {"container_id": "a", "container_iface": "eth1"}
+
+
+@pytest.fixture
+def snapshot(topology: dict[str, Any]) -> Snapshot:  # noqa: ARG001
+    """Reconcile the sample topology and take a snapshot of the host."""
+    asyncio.run(orchestrator.reconcile_all())
+    return asyncio.run(take_snapshot({}))
+
+
+def _ovs_calls() -> int:
+    return sum(
+        count
+        for method, count in get_simulated_network().calls.items()
+        if method.startswith("ovs.")
+    )
+
+
+def test_views_shared_per_snapshot(snapshot: Snapshot) -> None:
+    backend = ovs_lib._get_ovs_backend()
+
+    assert isinstance(snapshot.ovs_view(backend), SnapshotOvsBackend)
+    assert snapshot.ovs_view(backend) is snapshot.ovs_view(backend)
+    links = ovs_lib._get_link_backend()
+    assert isinstance(snapshot.link_view(links), SnapshotLinkBackend)
+    assert snapshot.link_view(links) is snapshot.link_view(links)
+
+
+def test_ovs_reads_answered_from_snapshot(snapshot: Snapshot) -> None:
+    view = snapshot.ovs_view(ovs_lib._get_ovs_backend())
+    port = get_simulated_network().container_ports["a", "eth1"]
+    calls = _ovs_calls()
+
+    async def _read() -> tuple[Any, ...]:
+        return (
+            await view.bridge_exists("br0"),
+            await view.bridge_exists("br9"),
+            await view.find_port(CONTAINER_IDS),
+            await view.find_port({"container_id": "c", "container_iface": "eth1"}),
+            await view.port_to_br(port),
+            await view.get_port_vlans(port, "tag"),
+        )
+
+    assert asyncio.run(_read()) == (True, False, port, "", "br0", ["100"])
+    assert _ovs_calls() == calls
+
+
+def test_other_lookups_go_to_backend(snapshot: Snapshot) -> None:
+    view = snapshot.ovs_view(ovs_lib._get_ovs_backend())
+    calls = _ovs_calls()
+
+    assert asyncio.run(view.find_port({"container_id": "a"})) != ""
+    assert _ovs_calls() == calls + 1
+
+
+def test_written_port_read_from_backend(snapshot: Snapshot) -> None:
+    network = get_simulated_network()
+    view = snapshot.ovs_view(ovs_lib._get_ovs_backend())
+    port = network.container_ports["a", "eth1"]
+
+    async def _recreate() -> list[str]:
+        await view.del_port(port)
+        found = [await view.find_port(CONTAINER_IDS), await view.port_to_br(port)]
+        await view.add_port("br1", "new0", external_ids=CONTAINER_IDS)
+        found += [await view.find_port(CONTAINER_IDS), await view.port_to_br("new0")]
+        return found
+
+    assert asyncio.run(_recreate()) == ["", "", "new0", "br1"]
+    assert {port, "new0", ("a", "eth1")} <= snapshot.stale_ports
+    # The snapshot itself is left as taken
+    assert snapshot.container_ports["a", "eth1"].name == port
+
+
+def test_deleted_bridge_stales_its_ports(snapshot: Snapshot) -> None:
+    view = snapshot.ovs_view(ovs_lib._get_ovs_backend())
+    port = get_simulated_network().container_ports["b", "eth2"]
+
+    async def _delete() -> tuple[bool, str, str]:
+        await view.del_bridge("br1")
+        return (
+            await view.bridge_exists("br1"),
+            await view.find_port({"container_id": "b", "container_iface": "eth2"}),
+            await view.port_to_br(port),
+        )
+
+    assert asyncio.run(_delete()) == (False, "", "")
+    assert "br1" in snapshot.stale_links
+
+
+def test_host_links_answered_from_snapshot(snapshot: Snapshot) -> None:
+    network = get_simulated_network()
+    view = snapshot.link_view(ovs_lib._get_link_backend())
+    calls = network.calls["netlink.link"]
+
+    assert view.link("br0") == snapshot.links["br0"]
+    assert view.link("missing") is None
+    assert view.addresses("br0") == [(snapshot.links["br0"].index, "10.0.0.1/24")]
+    assert view.addresses("missing") == []
+    assert network.calls["netlink.link"] == calls
+
+    view.flush_addresses("br0")
+    assert view.addresses("br0") == []
+    assert snapshot.addresses["br0"] == ["10.0.0.1/24"]
+
+
+def test_deleted_bridge_releases_its_links(snapshot: Snapshot) -> None:
+    view = snapshot.link_view(ovs_lib._get_link_backend())
+    enslaved = {
+        link.name
+        for link in snapshot.links.values()
+        if link.master == snapshot.links["br0"].index
+    }
+
+    view.delete_link("br0")
+    assert view.link("br0") is None
+    assert {"br0", *enslaved} <= snapshot.stale_links
+
+
+def test_probes_use_views_within_block(snapshot: Snapshot) -> None:
+    with use_snapshot(snapshot):
+        assert isinstance(ovs_lib.get_ovs_backend(), SnapshotOvsBackend)
+        assert isinstance(ovs_lib.get_link_backend(), SnapshotLinkBackend)
+    assert not isinstance(ovs_lib.get_ovs_backend(), SnapshotOvsBackend)
+    assert not isinstance(ovs_lib.get_link_backend(), SnapshotLinkBackend)
@@ -0,0 +1,94 @@
+"""Unit tests of the topology API, against the simulated network."""
+
+import asyncio
+import json
+from typing import Any
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app import orchestrator
+from app.jobs import get_job_queue
+from app.routers import topology as topology_router
+from app.routers.jobs import get_job_api
+from app.routers.topology import get_topology_api, put_topology_api
+from app.schemas import Topology
+from app.utils import CONFIG_FRAGMENTS_DIR, CONFIG_JSON_PATH, get_config
+
+FRAGMENT = {"container": {"c": [{"iface": "eth1", "bridge": "br1"}]}}
+
+
+def _put(document: dict[str, Any]) -> dict:
+    return asyncio.run(put_topology_api(Topology(**document), Response()))
+
+
+def test_put_topology_keeps_fragments(topology: dict[str, Any]) -> None:
+    CONFIG_FRAGMENTS_DIR.mkdir()
+    (CONFIG_FRAGMENTS_DIR / "extra.json").write_text(json.dumps(FRAGMENT))
+    get_config.cache_clear()
+    del topology["container"]["b"]
+
+    result = _put(topology)
+
+    # The container of the fragment is not taken for removed
+    assert result["status"] == "success"
+    assert [operation["target"] for operation in result["operations"]] == [
+        ["b", "eth1"],
+        ["b", "eth2"],
+    ]
+    # The fragment stays out of config.json but in the desired state
+    assert json.loads(CONFIG_JSON_PATH.read_text())["container"].keys() == {"a"}
+    assert get_config()["container"].keys() == {"a", "c"}
+    # Reading the files again finds nothing to change
+    assert asyncio.run(orchestrator.reload_config()) == []
+    assert get_config()["container"].keys() == {"a", "c"}
+
+
+@pytest.mark.usefixtures("topology")
+def test_put_topology_rejects_inconsistent_items() -> None:
+    document = {"container": {"a": [{"iface": "eth1", "bridge": "missing"}]}}
+
+    with pytest.raises(HTTPException) as error:
+        _put(document)
+
+    assert error.value.status_code == 400
+    assert not CONFIG_JSON_PATH.read_text().count("missing")
+
+
+def test_put_topology_failure_reported(
+    monkeypatch: pytest.MonkeyPatch, topology: dict[str, Any]
+) -> None:
+    async def _apply_topology(_document: dict[str, Any]) -> list:
+        msg = "No space left on device"
+        raise OSError(msg)
+
+    monkeypatch.setattr(topology_router, "apply_topology", _apply_topology)
+
+    with pytest.raises(HTTPException) as error:
+        _put(topology)
+    assert error.value.status_code == 500
+    assert error.value.detail == "No space left on device"
+
+    async def _queue() -> dict:
+        accepted = await put_topology_api(
+            Topology(**topology), Response(), background=True
+        )
+        get_job_queue().start()
+        try:
+            return await get_job_api(accepted["job_id"], wait=1)
+        finally:
+            await get_job_queue().stop()
+
+    # The job records the error itself
+    job = asyncio.run(_queue())
+    assert (job["status"], job["detail"]) == ("failed", "No space left on device")
+
+
+def test_get_topology_shows_desired_state(topology: dict[str, Any]) -> None:
+    get_config()["veth_pairs"]["vq"] = {"on": "br1"}  # Added through the API
+
+    shown = asyncio.run(get_topology_api())
+
+    assert shown.keys() == {"bridge", "container", "veth_pairs"}
+    assert shown["bridge"] == topology["bridge"]
+    assert shown["veth_pairs"].keys() == {"vp", "vq"}
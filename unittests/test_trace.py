@@ -0,0 +1,68 @@
+"""Unit tests of the command trace ring buffer."""
+
+from collections import deque
+
+import pytest
+
+from app import trace
+from app.trace import TRACE_ORIGIN, get_traces, trace_command
+
+
+@pytest.fixture(autouse=True)
+def traces(monkeypatch: pytest.MonkeyPatch) -> deque[trace.CommandTrace]:
+    """Start each test with an empty ring buffer of 3 entries."""
+    buffer: deque[trace.CommandTrace] = deque(maxlen=3)
+    monkeypatch.setattr(trace, "_TRACES", buffer)
+    return buffer
+
+
+def test_commands_recorded_with_origin() -> None:
+    token = TRACE_ORIGIN.set("reconcile:1")
+    try:
+        with trace_command("exec", ["ovs-vsctl", "add-br", "br0"]) as entry:
+            entry.returncode = 0
+        msg = "gone"
+        with pytest.raises(OSError, match=msg), trace_command("netlink", ["x"]):
+            raise OSError(msg)
+    finally:
+        TRACE_ORIGIN.reset(token)
+    with trace_command("docker", ["GET", "/containers/json"]) as entry:
+        entry.returncode = 500
+
+    newest, failed, first = get_traces()
+    assert (first.kind, first.origin, first.returncode) == ("exec", "reconcile:1", 0)
+    assert failed.stderr == "OSError: gone"
+    assert newest.origin == ""
+    assert first.duration >= 0
+    assert first.as_dict()["argv"] == ["ovs-vsctl", "add-br", "br0"]
+
+
+def test_filters() -> None:
+    for kind, argv, returncode in (
+        ("exec", ["ip", "link"], 0),
+        ("docker", ["GET", "/containers/a/json"], 404),
+        ("docker", ["GET", "/containers/json"], 200),
+    ):
+        with trace_command(kind, argv) as entry:
+            entry.returncode = returncode
+
+    assert [entry.argv[0] for entry in get_traces(kind="exec")] == ["ip"]
+    assert [entry.returncode for entry in get_traces(failed=True)] == [404]
+    assert len(get_traces(contains="/containers")) == 2
+    assert len(get_traces(limit=1)) == 1
+    assert get_traces(min_duration=60) == []
+
+
+def test_ring_buffer_keeps_newest(traces: deque[trace.CommandTrace]) -> None:
+    for index in range(5):
+        with trace_command("exec", [str(index)]) as entry:
+            entry.returncode = 0
+
+    assert [entry.argv for entry in traces] == [["2"], ["3"], ["4"]]
+
+
+def test_stderr_truncated() -> None:
+    with trace_command("exec", ["cmd"]) as entry:
+        entry.stderr = "x" * (trace.TRACE_STDERR_LIMIT + 10)
+
+    assert len(get_traces()[0].stderr) == trace.TRACE_STDERR_LIMIT
@@ -0,0 +1,304 @@
+"""Unit tests of the configuration and state helpers."""
+
+import asyncio
+import json
+from collections.abc import Callable
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import Any
+
+import pytest
+
+from app import utils
+
+
+def test_state_store_retries_failed_flush(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(utils, "DB_SYNC_DELAY", 0.01)
+    store = utils.StateStore(tmp_path / "missing" / "db.json")
+    store.data["failed"] = 1
+
+    async def _flush() -> bool:
+        store.flush()  # The directory does not exist yet
+        retried = store._pending is not None
+        store.path.parent.mkdir()
+        await asyncio.sleep(0.05)
+        return retried
+
+    assert asyncio.run(_flush())
+    assert json.loads(store.path.read_text()) == {"failed": 1}
+    assert store._pending is None
+
+
+def test_state_store_flush_without_loop_logs(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    store = utils.StateStore(tmp_path / "missing" / "db.json")
+
+    store.save()
+
+    assert "Failed to write the state" in caplog.text
+    assert store._pending is None
+
+
+def test_ip_allocator_skips_first_hosts_and_exhausts() -> None:
+    allocator = utils.IpAllocator("10.0.0.0/29", {})
+
+    assert allocator.allocate("a") == "10.0.0.6/29"
+    # .7 is the broadcast address
+    with pytest.raises(IndexError, match="No IP address left"):
+        allocator.allocate("b")
+    assert allocator.hosts == {"a": "10.0.0.6/29"}
+
+
+def test_ip_allocator_reuses_released_addresses() -> None:
+    allocator = utils.IpAllocator("10.0.0.0/24", {})
+    first = [allocator.allocate(name) for name in "abc"]
+
+    allocator.release("b")
+    assert not allocator.is_allocated(first[1])
+    assert allocator.allocate("d") == first[1]
+    # A holder allocating again keeps its address
+    assert allocator.allocate("a") == first[0]
+    assert allocator.allocate("e") == "10.0.0.9/24"
+
+
+def test_ip_allocator_queues_released_addresses_once() -> None:
+    allocator = utils.IpAllocator("10.0.0.0/24", {})
+    first = allocator.allocate("a")
+
+    for _ in range(100):
+        allocator.release("a")
+        allocator.reserve("a", first)
+    # Addresses above the cursor are left to it
+    allocator.reserve("b", "10.0.0.200/24")
+    allocator.release("b")
+
+    assert allocator._free == [6]
+    assert allocator.allocate("c") == "10.0.0.7/24"
+    allocator.release("a")
+    assert allocator.allocate("d") == first
+    assert allocator._free == []
+
+
+def test_ip_allocator_reserve() -> None:
+    allocator = utils.IpAllocator("10.0.0.0/24", {"br0": "10.0.0.6/24"})
+
+    # Addresses handed out before are skipped
+    assert allocator.allocate("a") == "10.0.0.7/24"
+    with pytest.raises(ValueError, match="already allocated"):
+        allocator.reserve("b", "10.0.0.7/24")
+    # Static addresses outside the range are tracked as well
+    allocator.reserve("b", "192.168.1.1/24")
+    assert allocator.is_allocated("192.168.1.1")
+    allocator.reserve("b", "10.0.0.100/24")
+    assert not allocator.is_allocated("192.168.1.1")
+    assert allocator.hosts == {
+        "br0": "10.0.0.6/24",
+        "a": "10.0.0.7/24",
+        "b": "10.0.0.100/24",
+    }
+
+
+def test_ip_allocator_large_ipv6_range() -> None:
+    allocator = utils.IpAllocator("2001:db8::/64", {})
+
+    assert allocator.allocate("a") == "2001:db8::6/64"
+    allocator.release("a")
+    assert allocator.allocate("b") == "2001:db8::6/64"
+
+
+def test_ip_allocator_rebuilt_when_range_changes() -> None:
+    db = utils.get_db("br0")
+    db["iprange"] = "10.0.0.0/24"
+    assert utils.auto_allocate_ip("br0", "a") == "10.0.0.6/24"
+    assert utils.get_ip_allocator("br0") is utils.get_ip_allocator("br0")
+
+    db["iprange"] = "10.0.1.0/24"
+    db["iprange_hosts"] = {}
+    assert utils.auto_allocate_ip("br0", "a") == "10.0.1.6/24"
+
+    db["iprange"] = "10.0.2.0/30"
+    with pytest.raises(IndexError, match="container: b"):
+        utils.auto_allocate_ip("br0", "b")
+
+
+def test_state_store_coalesces_saves(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setattr(utils, "DB_SYNC_DELAY", 0.01)
+    store = utils.StateStore(tmp_path / "db.json")
+    writes: list[dict] = []
+    write = store._write
+
+    def _write() -> None:
+        writes.append(json.loads(json.dumps(store.data)))
+        write()
+
+    monkeypatch.setattr(store, "_write", _write)
+
+    async def _burst() -> None:
+        for count in range(3):
+            store.data["count"] = count
+            store.save()
+        assert not store.path.exists()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_burst())
+    assert writes == [{"count": 2}]
+    assert utils.StateStore(store.path).data == {"count": 2}
+    # No temporary file is left behind
+    assert [path.name for path in tmp_path.iterdir()] == ["db.json"]
+
+
+def test_state_store_discards_unreadable_state(tmp_path: Path) -> None:
+    path = tmp_path / "db.json"
+    path.write_text('{"truncated": ')
+
+    assert utils.StateStore(path).data == {}
+
+
+def test_run_command_does_not_block_the_loop() -> None:
+    async def _run() -> float:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(
+            utils.run_command("sleep 0.2"), utils.run_command("echo done")
+        )
+        assert results[1].stdout == "done\n"
+        return loop.time() - started
+
+    # Both commands run at once
+    assert asyncio.run(_run()) < 0.4
+
+
+def test_run_command_failure_and_timeout() -> None:
+    with pytest.raises(CalledProcessError):
+        asyncio.run(utils.run_command("false"))
+    assert asyncio.run(utils.run_command("false", check=False)).returncode == 1
+    with pytest.raises(TimeoutError, match="timed out"):
+        asyncio.run(utils.run_command("sleep 5", time_limit=0.05))
+
+
+@pytest.mark.parametrize(
+    ("command", "label"),
+    [
+        ("ovs-vsctl --may-exist add-br br0", "ovs-vsctl add-br"),
+        ("/usr/sbin/ip -o link show", "ip link"),
+        ("ovs-vsctl -- --if-exists del-port p0", "ovs-vsctl del-port"),
+        ("sysctl -w net.ipv4.ip_forward=1", "sysctl"),
+        ("sleep 0.2", "sleep"),
+    ],
+)
+def test_command_type(command: str, label: str) -> None:
+    assert utils._command_type(command.split()) == label
+
+
+def _write(path: Path, document: Any) -> None:
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(json.dumps(document))
+
+
+def test_fragments_merged_over_config(caplog: pytest.LogCaptureFixture) -> None:
+    _write(utils.CONFIG_JSON_PATH, {"bridge": {"br0": {}, "br1": {}}})
+    _write(utils.CONFIG_FRAGMENTS_DIR / "a.json", {"bridge": {"br1": {"stp": 1}}})
+    _write(utils.CONFIG_FRAGMENTS_DIR / "b.json", {"veth_pairs": {"vp": {}}})
+    (utils.CONFIG_FRAGMENTS_DIR / "c.json.bak").write_text("{")
+
+    assert utils.load_config() == {
+        "bridge": {"br0": {}, "br1": {"stp": 1}},
+        "container": {},
+        "veth_pairs": {"vp": {}},
+    }
+    assert "a.json overrides bridge br1" in caplog.text
+
+    # A document about to be saved stands in for config.json
+    assert utils.load_config({"bridge": {"br2": {}}})["bridge"] == {
+        "br2": {},
+        "br1": {"stp": 1},
+    }
+
+
+def test_invalid_fragment_fails_loading() -> None:
+    _write(utils.CONFIG_JSON_PATH, {})
+    _write(utils.CONFIG_FRAGMENTS_DIR / "a.json", {})
+    (utils.CONFIG_FRAGMENTS_DIR / "a.json").write_text("{")
+
+    with pytest.raises(ValueError, match="Expecting"):
+        utils.load_config()
+
+
+@pytest.mark.parametrize(
+    ("document", "error"),
+    [
+        ([], "a.json does not hold an object"),
+        ({"bridge": None}, "Section bridge of a.json is not an object"),
+        ({"container": ["a"]}, "Section container of a.json is not an object"),
+    ],
+)
+def test_malformed_fragment_fails_loading(document: Any, error: str) -> None:
+    _write(utils.CONFIG_JSON_PATH, {})
+    _write(utils.CONFIG_FRAGMENTS_DIR / "a.json", document)
+
+    with pytest.raises(ValueError, match=error):
+        utils.load_config()
+
+
+def test_update_config_changes_differing_items() -> None:
+    previous = {"bridge": {"br0": {}, "br1": {}}, "container": {"a": []}}
+    document = {"bridge": {"br0": {}, "br2": {}}, "container": {"a": [{}]}}
+    config = {
+        "bridge": {"br0": {"added": "api"}, "br1": {}, "br9": {}},
+        "container": {"a": []},
+    }
+
+    utils.update_config(config, previous, document)
+
+    # Unchanged and runtime items are left alone
+    assert config == {
+        "bridge": {"br0": {"added": "api"}, "br2": {}, "br9": {}},
+        "container": {"a": [{}]},
+        "veth_pairs": {},
+    }
+    assert config["container"]["a"] is not document["container"]["a"]
+
+
+def test_valid_topology(topology: dict) -> None:
+    assert utils.validate_topology(topology) == []
+    assert utils.validate_topology({}) == []
+
+
+@pytest.mark.parametrize(
+    ("change", "problem"),
+    [
+        (
+            lambda doc: doc["bridge"]["br1"]["parents"].append({"iface": "eth9"}),
+            "Parent eth9 of bridge br1 is a parent of bridge br0 too",
+        ),
+        (
+            lambda doc: doc["container"]["a"].append(
+                {"iface": "eth1", "bridge": "br1"}
+            ),
+            "Interface a:eth1 is repeated",
+        ),
+        (
+            lambda doc: doc["bridge"].pop("br1"),
+            "Interface b:eth2 is attached to unknown bridge br1",
+        ),
+        (
+            lambda doc: doc["veth_pairs"].update(longprefix={"on": "br0"}),
+            "VETH prefix ID longprefix is more than 8 chars",
+        ),
+        (
+            lambda doc: doc["veth_pairs"]["vp"].update(on="br9"),
+            "VETH pair vp is attached to unknown bridge br9",
+        ),
+    ],
+)
+def test_inconsistent_topology(
+    topology: dict, change: Callable[[dict], object], problem: str
+) -> None:
+    change(topology)
+
+    assert utils.validate_topology(topology) == [problem]